@@ -97,12 +97,45 @@ namespace isr {
         );
 
 
+    /// Compute the mean and standard deviation of each row of an image
+    ///
+    /// Pixels with any of the 'badMask' bits set, or with non-finite
+    /// values, are excluded.  Rows are split between 'nThreads' threads
+    /// (all available cores if 0); small images are processed in the
+    /// calling thread.
+    ///
+    /// @return Array of shape (3, height) holding the mean, the sample
+    ///         standard deviation and the number of pixels used for each
+    ///         row.  The mean of a row with no pixels used, and the
+    ///         standard deviation of a row with fewer than two, are NaN.
+    template <typename ImagePixelT, typename MaskPixelT>
+    ndarray::Array<double, 2, 2> computeRowStatistics(
+        ndarray::Array<ImagePixelT const, 2, 1> const& image, ///< Image pixel values
+        ndarray::Array<MaskPixelT const, 2, 1> const& mask, ///< Mask values, with the shape of image
+        MaskPixelT badMask, ///< Bit mask of the pixels to exclude
+        int nThreads=0 ///< Number of threads to use (0 for all available cores)
+        );
+
+    /// Compute the mean and standard deviation of each row of a masked image
+    ///
+    /// @return Array of shape (3, height) holding the mean, the sample
+    ///         standard deviation and the number of pixels used for each
+    ///         row.
+    template <typename ImagePixelT>
+    ndarray::Array<double, 2, 2> computeRowStatistics(
+        afw::image::MaskedImage<ImagePixelT> const& image, ///< Input image
+        afw::image::MaskPixel badMask=0, ///< Bit mask of the pixels to exclude
+        int nThreads=0 ///< Number of threads to use (0 for all available cores)
+        );
+
     template<typename ImagePixelT, typename FunctionT>
     void fitOverscanImage(
         std::shared_ptr<lsst::afw::math::Function1<FunctionT> > &overscanFunction,
         lsst::afw::image::MaskedImage<ImagePixelT> const& overscan,
         double ssize=1.,
-        int sigma=1
+        int sigma=1,
+        afw::image::MaskPixel badMask=0,
+        int nThreads=0
         );
 
 }}} // namespace lsst::ip::isr
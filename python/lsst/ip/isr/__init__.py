@@ -38,3 +38,7 @@ from .isrQa import *
 from .isrMock import *
 from .ptcDataset import *
 from .defects import *
+from .stageTimer import *
+from .calibCache import *
+from .ampPlan import *
+from .ampStatistics import *
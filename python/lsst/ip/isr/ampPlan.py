@@ -0,0 +1,304 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Precomputed amplifier geometry for ISR processing.
+"""
+import threading
+import weakref
+
+import lsst.geom
+from lsst.afw.cameraGeom import ReadoutCorner
+
+__all__ = ["AmplifierPlan", "DetectorPlan", "getDetectorPlan"]
+
+
+class AmplifierPlan:
+    """Bounding boxes and array slices of one amplifier, derived once from
+    the camera geometry and the ISR configuration.
+
+    Parameters
+    ----------
+    amp : `lsst.afw.cameraGeom.Amplifier`
+        Amplifier to describe.
+    config : `lsst.ip.isr.IsrTaskConfig`
+        Configuration setting the overscan columns to skip and the bias
+        jump location.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if ``config.doOverscan`` is set and the overscan
+        configuration is inconsistent with the amplifier geometry.
+
+    Notes
+    -----
+    The overscan boxes are in the same coordinates as the raw boxes:
+    - ``imageBBoxes``, ``overscanBBoxes`` : `list` [`lsst.geom.Box2I`]
+        Data and overscan regions to fit together, with the configured
+        overscan columns skipped.
+    - ``jumpImageBBoxes``, ``jumpOverscanBBoxes`` : `list` [`lsst.geom.Box2I`] or `None`
+        The same, split at ``config.overscanBiasJumpLocation``, for use
+        on devices with a bias jump.  `None` if no split is configured.
+    - ``jumpError`` : `str` or `None`
+        Why the configured split is inconsistent with the amplifier.
+        Only devices with a bias jump are split, so this is raised by
+        `lsst.ip.isr.IsrTask.prepareOverscanRegions` for those alone.
+    The overscan boxes are `None` if the amplifier has no overscan, or if
+    the configuration is inconsistent with it and ``config.doOverscan``
+    is not set.
+
+    Only the geometry derived from ``amp`` is kept; the amplifier itself
+    should be looked up by ``name`` in the detector being processed.
+    """
+
+    def __init__(self, amp, config):
+        self.name = amp.getName()
+        self.bbox = amp.getBBox()
+        self.rawBBox = amp.getRawBBox()
+        self.rawDataBBox = amp.getRawDataBBox()
+        self.rawOverscanBBox = amp.getRawHorizontalOverscanBBox()
+        self.rawPrescanBBox = amp.getRawPrescanBBox()
+        self.hasOverscan = not self.rawOverscanBBox.isEmpty()
+
+        self.imageBBoxes = None
+        self.overscanBBoxes = None
+        self.jumpImageBBoxes = None
+        self.jumpOverscanBBoxes = None
+        self.jumpError = None
+        if self.hasOverscan:
+            self._makeOverscanBBoxes(amp, config)
+
+        self._slices = dict()
+
+    def _makeOverscanBBoxes(self, amp, config):
+        """Derive the overscan fitting regions.
+        """
+        dataBBox = self.rawDataBBox
+        oscanBBox = self.rawOverscanBBox
+        if oscanBBox.getBeginX() > self.rawPrescanBBox.getBeginX():  # amp is at the right
+            dx0 = config.overscanNumLeadingColumnsToSkip
+            dx1 = -config.overscanNumTrailingColumnsToSkip
+        else:
+            dx0 = config.overscanNumTrailingColumnsToSkip
+            dx1 = -config.overscanNumLeadingColumnsToSkip
+        width = oscanBBox.getWidth() - dx0 + dx1
+        if width <= 0:
+            self._configError(config, f"Amplifier {self.name} overscan of width {oscanBBox.getWidth()} "
+                              f"has no columns left after skipping {dx0 - dx1}.")
+            return
+
+        self.imageBBoxes = [lsst.geom.Box2I(dataBBox)]
+        self.overscanBBoxes = [lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, 0),
+                                               lsst.geom.Extent2I(width, oscanBBox.getHeight()))]
+
+        if not (config.overscanBiasJump and config.overscanBiasJumpLocation):
+            return
+        if amp.getReadoutCorner() in (ReadoutCorner.LL, ReadoutCorner.LR):
+            yLower = config.overscanBiasJumpLocation
+            yUpper = dataBBox.getHeight() - yLower
+        else:
+            yUpper = config.overscanBiasJumpLocation
+            yLower = dataBBox.getHeight() - yUpper
+        if yLower <= 0 or yUpper <= 0:
+            self.jumpError = (f"Bias jump location {config.overscanBiasJumpLocation} is outside "
+                              f"amplifier {self.name} of height {dataBBox.getHeight()}.")
+            return
+
+        self.jumpImageBBoxes = [
+            lsst.geom.Box2I(dataBBox.getBegin(), lsst.geom.Extent2I(dataBBox.getWidth(), yLower)),
+            lsst.geom.Box2I(dataBBox.getBegin() + lsst.geom.Extent2I(0, yLower),
+                            lsst.geom.Extent2I(dataBBox.getWidth(), yUpper)),
+        ]
+        self.jumpOverscanBBoxes = [
+            lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, 0),
+                            lsst.geom.Extent2I(width, yLower)),
+            lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, yLower),
+                            lsst.geom.Extent2I(width, yUpper)),
+        ]
+
+    @staticmethod
+    def _configError(config, message):
+        """Raise an overscan configuration error if the overscan is to be
+        corrected.
+        """
+        if config.doOverscan:
+            raise RuntimeError(message)
+
+    def getArraySlices(self, bboxName, xy0):
+        """Return the numpy index of one of the amplifier bounding boxes.
+
+        Parameters
+        ----------
+        bboxName : `str`
+            Name of the bounding box attribute, e.g. ``"rawDataBBox"``.
+        xy0 : `lsst.geom.Point2I`
+            Origin of the image to be indexed.
+
+        Returns
+        -------
+        slices : `tuple` [`slice`, `slice`]
+            Row and column slices selecting the box from the array of an
+            image with origin ``xy0``.
+        """
+        key = (bboxName, xy0.getX(), xy0.getY())
+        slices = self._slices.get(key)
+        if slices is None:
+            bbox = getattr(self, bboxName)
+            slices = (slice(bbox.getBeginY() - xy0.getY(), bbox.getEndY() - xy0.getY()),
+                      slice(bbox.getBeginX() - xy0.getX(), bbox.getEndX() - xy0.getX()))
+            self._slices[key] = slices
+        return slices
+
+
+class DetectorPlan:
+    """Amplifier plans for all the amplifiers of a detector.
+
+    Parameters
+    ----------
+    detector : `lsst.afw.cameraGeom.Detector` or `list`
+        Detector, or list of amplifier-like objects, to describe.
+    config : `lsst.ip.isr.IsrTaskConfig`
+        ISR configuration.
+    """
+
+    def __init__(self, detector, config):
+        self.amps = [AmplifierPlan(amp, config) for amp in detector]
+        self.ampsByName = {ampPlan.name: ampPlan for ampPlan in self.amps}
+
+    def __iter__(self):
+        return iter(self.amps)
+
+    def __len__(self):
+        return len(self.amps)
+
+    def __getitem__(self, name):
+        return self.ampsByName[name]
+
+
+_planCache = dict()
+_planCacheLock = threading.Lock()
+_maxCachedPlans = 256
+
+# Plans of the detector objects seen, by object id, as
+# ``(weakref, serial, {configKey: plan})``.
+_detectorPlans = dict()
+
+
+def _boxKey(bbox):
+    return (bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY())
+
+
+def _makeAmpKey(amp):
+    """Identify every amplifier property an `AmplifierPlan` is derived
+    from.
+    """
+    return (amp.getName(), _boxKey(amp.getBBox()), _boxKey(amp.getRawBBox()),
+            _boxKey(amp.getRawDataBBox()), _boxKey(amp.getRawHorizontalOverscanBBox()),
+            _boxKey(amp.getRawPrescanBBox()), amp.getReadoutCorner())
+
+
+def _makeConfigKey(config):
+    """Identify the configuration an `AmplifierPlan` is derived with.
+    """
+    return (config.doOverscan,
+            config.overscanNumLeadingColumnsToSkip, config.overscanNumTrailingColumnsToSkip,
+            config.overscanBiasJump, config.overscanBiasJumpLocation)
+
+
+def _getGeometryPlan(detector, config, configKey):
+    """Return the plan of a detector geometry, reusing the plan of any
+    detector object with the same geometry.
+    """
+    geometry = tuple(_makeAmpKey(amp) for amp in detector)
+    key = (detector.getName(), detector.getSerial(), geometry, configKey)
+    with _planCacheLock:
+        plan = _planCache.get(key)
+    if plan is None:
+        plan = DetectorPlan(detector, config)
+        with _planCacheLock:
+            if len(_planCache) >= _maxCachedPlans:
+                _planCache.pop(next(iter(_planCache)))
+            _planCache[key] = plan
+    return plan
+
+
+def _forgetDetector(ref, detectorId):
+    """Drop the plans of a detector object that no longer exists.
+    """
+    entry = _detectorPlans.get(detectorId)
+    if entry is not None and entry[0] is ref:
+        _detectorPlans.pop(detectorId, None)
+
+
+def getDetectorPlan(detector, config):
+    """Return the amplifier plans of a detector, reusing the plans of
+    earlier exposures.
+
+    Parameters
+    ----------
+    detector : `lsst.afw.cameraGeom.Detector` or `list`
+        Detector, or list of amplifier-like objects, to describe.
+    config : `lsst.ip.isr.IsrTaskConfig`
+        ISR configuration.
+
+    Returns
+    -------
+    plan : `lsst.ip.isr.DetectorPlan`
+        Plans for the amplifiers of the detector.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if ``config.doOverscan`` is set and the overscan
+        configuration is inconsistent with the amplifier geometry.
+
+    Notes
+    -----
+    Plans are cached by detector object, serial number and the
+    configuration used to derive them, so looking up the plan of a
+    detector seen before does not read its amplifiers.  The first
+    lookup for a new detector object reads the amplifier boxes and
+    readout corners, and reuses the plan of any earlier detector with
+    the same geometry.  Lists of amplifiers without a detector are not
+    cached.
+    """
+    if not hasattr(detector, "getSerial"):
+        return DetectorPlan(detector, config)
+    configKey = _makeConfigKey(config)
+    serial = detector.getSerial()
+    detectorId = id(detector)
+    entry = _detectorPlans.get(detectorId)
+    if entry is not None and entry[0]() is detector and entry[1] == serial:
+        plan = entry[2].get(configKey)
+        if plan is not None:
+            return plan
+    else:
+        try:
+            ref = weakref.ref(detector, lambda ref: _forgetDetector(ref, detectorId))
+        except TypeError:
+            entry = None
+        else:
+            entry = (ref, serial, dict())
+            _detectorPlans[detectorId] = entry
+
+    plan = _getGeometryPlan(detector, config, configKey)
+    if entry is not None:
+        entry[2][configKey] = plan
+    return plan
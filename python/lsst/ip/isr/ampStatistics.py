@@ -0,0 +1,175 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Statistics of amplifier regions shared between ISR stages.
+"""
+import numpy as np
+
+import lsst.afw.math as afwMath
+
+__all__ = ["AmpStatisticsCache"]
+
+
+def _boxKey(bbox):
+    if bbox is None:
+        return None
+    return (bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY())
+
+
+def _controlKey(statControl):
+    if statControl is None:
+        return None
+    # Every setting that can change the result; the mask propagation
+    # thresholds are those of the bits of a MaskPixel.
+    return (statControl.getNumSigmaClip(), statControl.getNumIter(), statControl.getAndMask(),
+            statControl.getNoGoodPixelsMask(), statControl.getNanSafe(), statControl.getWeighted(),
+            statControl.getWeightedIsSet(), statControl.getCalcErrorFromInputVariance(),
+            tuple(statControl.getMaskPropagationThreshold(bit) for bit in range(32)))
+
+
+def _boxesOverlap(key1, key2):
+    if key1 is None or key2 is None:
+        return True
+    return not (key1[2] < key2[0] or key2[2] < key1[0] or key1[3] < key2[1] or key2[3] < key1[1])
+
+
+class AmpStatisticsCache:
+    """Statistics of the amplifiers of an image, each computed once per
+    state of the pixels.
+
+    Parameters
+    ----------
+    maskedImage : `lsst.afw.image.MaskedImage`
+        Image to measure.
+
+    Notes
+    -----
+    The cache cannot see the pixels change.  Code that modifies the
+    image must call `invalidate`, or declare a new state of the image
+    with `setState`; `lsst.ip.isr.IsrTask` invalidates the cache before
+    each stage that reads it.
+    """
+    planes = (None, "image", "mask", "variance")
+
+    def __init__(self, maskedImage):
+        self.maskedImage = maskedImage
+        self.state = None
+        self.numComputed = 0
+        self._cache = dict()
+
+    def setState(self, state):
+        """Declare the state of the pixels, discarding the statistics
+        of any other state.
+
+        Parameters
+        ----------
+        state : hashable
+            Identifier of the state of the pixels, e.g. the number of
+            processing stages applied so far.
+        """
+        if state != self.state:
+            self._cache.clear()
+            self.state = state
+
+    def invalidate(self, planes=None, bbox=None):
+        """Discard the statistics of modified pixels.
+
+        Parameters
+        ----------
+        planes : `list` [`str`], optional
+            Planes that were modified; any of ``"image"``, ``"mask"`` and
+            ``"variance"``.  All planes if not set.  Statistics of the
+            masked image depend on every plane and are always discarded.
+        bbox : `lsst.geom.Box2I`, optional
+            Region that was modified.  The whole image if not set.
+        """
+        boxKey = _boxKey(bbox)
+        for key in list(self._cache):
+            plane, entryBox = key[:2]
+            if (planes is None or plane is None or plane in planes) and _boxesOverlap(boxKey, entryBox):
+                del self._cache[key]
+
+    def _getImage(self, plane, bbox):
+        image = self.maskedImage if bbox is None else self.maskedImage[bbox]
+        if plane is None:
+            return image
+        if plane not in self.planes:
+            raise RuntimeError(f"Unknown image plane {plane}.")
+        return getattr(image, plane)
+
+    def getStatistics(self, flags, bbox=None, plane=None, statControl=None):
+        """Return statistics of a region of the image.
+
+        Parameters
+        ----------
+        flags : `int`
+            Statistics to compute, e.g.
+            ``lsst.afw.math.MEDIAN | lsst.afw.math.STDEVCLIP``.
+        bbox : `lsst.geom.Box2I`, optional
+            Region to measure, in the parent frame.  The whole image if
+            not set.
+        plane : `str`, optional
+            Plane to measure; one of ``"image"``, ``"mask"`` or
+            ``"variance"``.  The masked image if not set.
+        statControl : `lsst.afw.math.StatisticsControl`, optional
+            Statistics control object.  Statistics are shared only
+            between controls with identical settings.
+
+        Returns
+        -------
+        statistics : `lsst.afw.math.Statistics`
+            Statistics of the region.
+        """
+        key = (plane, _boxKey(bbox), "afw", flags, _controlKey(statControl))
+        statistics = self._cache.get(key)
+        if statistics is None:
+            image = self._getImage(plane, bbox)
+            if statControl is None:
+                statistics = afwMath.makeStatistics(image, flags)
+            else:
+                statistics = afwMath.makeStatistics(image, flags, statControl)
+            self._cache[key] = statistics
+            self.numComputed += 1
+        return statistics
+
+    def getArrayMedian(self, bbox=None, plane="image"):
+        """Return the median of all the pixels of a region, masked or
+        not.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`, optional
+            Region to measure, in the parent frame.  The whole image if
+            not set.
+        plane : `str`, optional
+            Plane to measure; ``"image"`` or ``"variance"``.
+
+        Returns
+        -------
+        median : `float`
+            Median computed with `numpy.median`.
+        """
+        key = (plane, _boxKey(bbox), "numpy")
+        median = self._cache.get(key)
+        if median is None:
+            median = np.median(self._getImage(plane, bbox).getArray())
+            self._cache[key] = median
+            self.numComputed += 1
+        return median
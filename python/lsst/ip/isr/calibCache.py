@@ -0,0 +1,281 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Process-level cache of calibration products.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy
+
+import lsst.afw.image as afwImage
+import lsst.pipe.base as pipeBase
+
+__all__ = ["CalibCache", "getCalibCache", "estimateCalibSize", "copyCalib"]
+
+
+def estimateCalibSize(calib):
+    """Estimate the memory used by a calibration product.
+
+    Parameters
+    ----------
+    calib : `object`
+        Calibration product: an exposure, image, array, struct, list,
+        or any other object.
+
+    Returns
+    -------
+    nBytes : `int`
+        Estimated size in bytes.  Pixel data, and objects with an
+        ``nbytes`` attribute, are counted exactly; other objects are
+        counted by their shallow Python size.
+    """
+    if isinstance(calib, afwImage.Exposure):
+        return estimateCalibSize(calib.getMaskedImage())
+    if isinstance(calib, afwImage.MaskedImage):
+        return sum(estimateCalibSize(plane) for plane in
+                   (calib.getImage(), calib.getMask(), calib.getVariance()))
+    if isinstance(calib, (afwImage.Image, afwImage.Mask)):
+        return calib.getArray().nbytes
+    if isinstance(calib, numpy.ndarray) or isinstance(getattr(calib, "nbytes", None), int):
+        return calib.nbytes
+    if isinstance(calib, pipeBase.Struct):
+        return estimateCalibSize(list(calib.getDict().values()))
+    if isinstance(calib, (list, tuple)):
+        return sys.getsizeof(calib) + sum(estimateCalibSize(item) for item in calib)
+    return sys.getsizeof(calib)
+
+
+def copyCalib(calib):
+    """Copy the pixel data of a calibration product.
+
+    Parameters
+    ----------
+    calib : `object`
+        Calibration product, as for `estimateCalibSize`.
+
+    Returns
+    -------
+    copy : `object`
+        Product with deep copies of its exposures, images and arrays.
+        Other objects are returned as they are, and are shared.
+    """
+    if isinstance(calib, (afwImage.Exposure, afwImage.MaskedImage, afwImage.Image, afwImage.Mask)):
+        return calib.Factory(calib, True)
+    if isinstance(calib, numpy.ndarray):
+        return calib.copy()
+    if isinstance(calib, pipeBase.Struct):
+        return pipeBase.Struct(**{name: copyCalib(value) for name, value in calib.getDict().items()})
+    if isinstance(calib, (list, tuple)):
+        return type(calib)(copyCalib(item) for item in calib)
+    return calib
+
+
+class CalibCache:
+    """Least recently used cache of calibration products with a byte
+    budget.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Maximum total size of the cached products, in bytes.  Zero
+        disables caching.
+    copyProducts : `bool`, optional
+        Return a copy of the pixel data of the products, made with
+        `copyCalib`, so callers may modify them without changing the
+        cached product.
+
+    Notes
+    -----
+    Unless ``copyProducts`` is set, cached products are shared by every
+    caller that reads them, and must not be modified.  Products larger
+    than the whole budget are returned but not stored.
+    """
+
+    def __init__(self, maxBytes, copyProducts=False):
+        self.maxBytes = maxBytes
+        self.copyProducts = copyProducts
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def find(self, key):
+        """Return a cached product without reading it.
+
+        Parameters
+        ----------
+        key : hashable or `None`
+            Key identifying the product.
+
+        Returns
+        -------
+        calib : `object` or `None`
+            The calibration product, or `None` if it is not cached.
+            Only products found count as hits.
+        """
+        with self._lock:
+            if key is None or key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            calib = self._entries[key][0]
+        return copyCalib(calib) if self.copyProducts else calib
+
+    def get(self, key, reader):
+        """Return a cached product, reading and caching it if needed.
+
+        Parameters
+        ----------
+        key : hashable or `None`
+            Key identifying the product.  If `None`, the product cannot
+            be identified and is read without being cached.
+        reader : callable
+            Function taking no arguments that reads the product.
+
+        Returns
+        -------
+        calib : `object`
+            The calibration product.
+        """
+        with self._lock:
+            if key is not None and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                calib = self._entries[key][0]
+                return copyCalib(calib) if self.copyProducts else calib
+            self.misses += 1
+
+        calib = reader()
+        if key is None:
+            return calib
+        self.put(key, calib)
+        return copyCalib(calib) if self.copyProducts else calib
+
+    def put(self, key, calib):
+        """Add a product to the cache, evicting the least recently used
+        products to stay within the budget.
+
+        Parameters
+        ----------
+        key : hashable
+            Key identifying the product.
+        calib : `object`
+            The calibration product.
+        """
+        nBytes = estimateCalibSize(calib)
+        with self._lock:
+            self._remove(key)
+            if nBytes > self.maxBytes:
+                return
+            self._entries[key] = (calib, nBytes)
+            self.nBytes += nBytes
+            self._evict()
+
+    def setMaxBytes(self, maxBytes):
+        """Change the byte budget, evicting products if needed.
+
+        Parameters
+        ----------
+        maxBytes : `int`
+            Maximum total size of the cached products, in bytes.
+        """
+        with self._lock:
+            self.maxBytes = maxBytes
+            self._evict()
+
+    def clear(self):
+        """Remove all products from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nBytes = 0
+
+    def getCounters(self):
+        """Return the current cache counters.
+
+        Returns
+        -------
+        counters : `dict` [`str`, `int`]
+            Numbers of ``hits`` and ``misses``, and bytes held
+            (``nBytes``).
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, nBytes=self.nBytes)
+
+    def setMetadata(self, metadata, counters=None):
+        """Record the cache counters in task metadata.
+
+        Parameters
+        ----------
+        metadata : `lsst.daf.base.PropertyList`
+            Metadata to update, with the keys ``CALIB CACHE HITS``,
+            ``CALIB CACHE MISSES`` and ``CALIB CACHE BYTES``.
+        counters : `dict` [`str`, `int`], optional
+            Counters from an earlier `getCounters` to record instead of
+            the current ones.
+        """
+        if counters is None:
+            counters = self.getCounters()
+        metadata.set("CALIB CACHE HITS", counters["hits"])
+        metadata.set("CALIB CACHE MISSES", counters["misses"])
+        metadata.set("CALIB CACHE BYTES", counters["nBytes"])
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nBytes -= entry[1]
+
+    def _evict(self):
+        while self._entries and self.nBytes > self.maxBytes:
+            _, (_, nBytes) = self._entries.popitem(last=False)
+            self.nBytes -= nBytes
+
+
+_processCache = CalibCache(0, copyProducts=True)
+
+
+def getCalibCache(maxBytes=None):
+    """Return the calibration cache shared within this process.
+
+    Parameters
+    ----------
+    maxBytes : `int`, optional
+        If not `None`, raise the byte budget of the cache to at least
+        this value.  The budget is never lowered here, so that a caller
+        asking for a small cache does not evict the products of others;
+        use `CalibCache.setMaxBytes` to lower it.
+
+    Returns
+    -------
+    cache : `lsst.ip.isr.CalibCache`
+        The process-level cache.
+    """
+    if maxBytes is not None and maxBytes > _processCache.maxBytes:
+        _processCache.setMaxBytes(maxBytes)
+    return _processCache
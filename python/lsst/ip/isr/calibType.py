@@ -85,6 +85,16 @@ class IsrCalib(abc.ABC):
             self.fromDetector(detector)
         self.updateMetadata(camera=camera, detector=detector)
 
+    def __getstate__(self):
+        # The log cannot be pickled; it is recreated on unpickling.
+        state = self.__dict__.copy()
+        state.pop("log", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.log = Log.getLogger(__name__.partition(".")[2])
+
     def __str__(self):
         return f"{self.__class__.__name__}(obstype={self._OBSTYPE}, detector={self._detectorName}, )"
 
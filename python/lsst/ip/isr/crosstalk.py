@@ -27,14 +27,18 @@ from astropy.table import Table
 
 import lsst.afw.math
 import lsst.afw.detection
+import lsst.afw.image
 from lsst.pex.config import Config, Field, ChoiceField, ListField
-from lsst.pipe.base import Task
+from lsst.pipe.base import Struct, Task
 
 from lsst.ip.isr import IsrCalib
+from lsst.log import Log
+from .ampStatistics import AmpStatisticsCache
+from .calibCache import CalibCache
 
 
-__all__ = ["CrosstalkCalib", "CrosstalkConfig", "CrosstalkTask",
-           "NullCrosstalkTask"]
+__all__ = ["CrosstalkCalib", "CrosstalkSource", "CrosstalkConfig", "CrosstalkTask",
+           "FocalPlaneCrosstalk", "NullCrosstalkTask"]
 
 
 class CrosstalkCalib(IsrCalib):
@@ -80,6 +84,12 @@ class CrosstalkCalib(IsrCalib):
         A dictionary keyed by detectorName containing ``coeffs``
         matrices used to correct for inter-chip crosstalk with a
         source on the detector indicated.
+    coeffRetained : `np.ndarray`, optional
+        A matrix of Boolean values indicating the terms of ``coeffs``
+        kept by `pruneCoeffs`.  All non-zero terms are used if `None`.
+    interChipRetained : `dict` [`np.ndarray`]
+        A dictionary keyed by detectorName containing the
+        ``coeffRetained`` matrices of the ``interChip`` coefficients.
 
     """
     _OBSTYPE = 'CROSSTALK'
@@ -98,6 +108,8 @@ class CrosstalkCalib(IsrCalib):
         self.coeffValid = np.zeros(self.crosstalkShape,
                                    dtype=bool) if self.nAmp else None
         self.interChip = {}
+        self.coeffRetained = None
+        self.interChipRetained = {}
 
         super().__init__(**kwargs)
         self.requiredAttributes.update(['hasCrosstalk', 'nAmp', 'coeffs',
@@ -263,6 +275,13 @@ class CrosstalkCalib(IsrCalib):
                     coeffVector = calib.interChip[detector]
                     calib.interChip[detector] = np.array(coeffVector).reshape(calib.crosstalkShape)
 
+            if 'coeffRetained' in dictionary:
+                calib.coeffRetained = np.array(dictionary['coeffRetained'],
+                                               dtype=bool).reshape(calib.crosstalkShape)
+            for detector, retained in dictionary.get('interChipRetained', {}).items():
+                calib.interChipRetained[detector] = np.array(retained,
+                                                             dtype=bool).reshape(calib.crosstalkShape)
+
         calib.updateMetadata()
         return calib
 
@@ -302,6 +321,12 @@ class CrosstalkCalib(IsrCalib):
             for detector in self.interChip:
                 outDict['interChip'][detector] = self.interChip[detector].reshape(ctLength).tolist()
 
+        if self.coeffRetained is not None:
+            outDict['coeffRetained'] = self.coeffRetained.reshape(ctLength).tolist()
+        if self.interChipRetained:
+            outDict['interChipRetained'] = {detector: retained.reshape(ctLength).tolist()
+                                            for detector, retained in self.interChipRetained.items()}
+
         return outDict
 
     @classmethod
@@ -339,12 +364,17 @@ class CrosstalkCalib(IsrCalib):
             inDict['coeffNum'] = coeffTable['CT_COUNTS']
         if 'CT_VALID' in coeffTable:
             inDict['coeffValid'] = coeffTable['CT_VALID']
+        if 'CT_RETAINED' in coeffTable.columns:
+            inDict['coeffRetained'] = coeffTable['CT_RETAINED']
 
         if len(tableList) > 1:
             inDict['interChip'] = dict()
             interChipTable = tableList[1]
             for record in interChipTable:
                 inDict['interChip'][record['IC_SOURCE_DET']] = record['IC_COEFFS']
+            if 'IC_RETAINED' in interChipTable.columns:
+                inDict['interChipRetained'] = {record['IC_SOURCE_DET']: record['IC_RETAINED']
+                                               for record in interChipTable}
 
         return cls().fromDict(inDict)
 
@@ -363,11 +393,14 @@ class CrosstalkCalib(IsrCalib):
         """
         tableList = []
         self.updateMetadata()
-        catalog = Table([{'CT_COEFFS': self.coeffs.reshape(self.nAmp*self.nAmp),
-                          'CT_ERRORS': self.coeffErr.reshape(self.nAmp*self.nAmp),
-                          'CT_COUNTS': self.coeffNum.reshape(self.nAmp*self.nAmp),
-                          'CT_VALID': self.coeffValid.reshape(self.nAmp*self.nAmp),
-                          }])
+        coeffRecord = {'CT_COEFFS': self.coeffs.reshape(self.nAmp*self.nAmp),
+                       'CT_ERRORS': self.coeffErr.reshape(self.nAmp*self.nAmp),
+                       'CT_COUNTS': self.coeffNum.reshape(self.nAmp*self.nAmp),
+                       'CT_VALID': self.coeffValid.reshape(self.nAmp*self.nAmp),
+                       }
+        if self.coeffRetained is not None:
+            coeffRecord['CT_RETAINED'] = self.coeffRetained.reshape(self.nAmp*self.nAmp)
+        catalog = Table([coeffRecord])
         # filter None, because astropy can't deal.
         inMeta = self.getMetadata().toDict()
         outMeta = {k: v for k, v in inMeta.items() if v is not None}
@@ -376,12 +409,109 @@ class CrosstalkCalib(IsrCalib):
         tableList.append(catalog)
 
         if self.interChip:
-            interChipTable = Table([{'IC_SOURCE_DET': sourceDet,
-                                     'IC_COEFFS': self.interChip[sourceDet].reshape(self.nAmp*self.nAmp)}
-                                    for sourceDet in self.interChip.keys()])
+            interChipRecords = [{'IC_SOURCE_DET': sourceDet,
+                                 'IC_COEFFS': self.interChip[sourceDet].reshape(self.nAmp*self.nAmp)}
+                                for sourceDet in self.interChip.keys()]
+            if self.interChipRetained:
+                for record in interChipRecords:
+                    retained = self.interChipRetained.get(record['IC_SOURCE_DET'])
+                    if retained is None:
+                        retained = record['IC_COEFFS'] != 0.0
+                    record['IC_RETAINED'] = retained.reshape(self.nAmp*self.nAmp)
+            interChipTable = Table(interChipRecords)
             tableList.append(interChipTable)
         return tableList
 
+    def pruneCoeffs(self, minCoeff=0.0, minSignificance=0.0):
+        """Select the crosstalk terms worth correcting.
+
+        Terms are dropped if their coefficient is zero, smaller in
+        absolute value than ``minCoeff``, or measured with a
+        significance ``abs(coeff)*sqrt(coeffNum)/coeffErr`` below
+        ``minSignificance``.  Terms without a measured error are judged
+        on ``minCoeff`` alone, as are the ``interChip`` terms.
+
+        Parameters
+        ----------
+        minCoeff : `float`, optional
+            Minimum absolute coefficient to retain.
+        minSignificance : `float`, optional
+            Minimum significance of the measured coefficients to
+            retain.  A value of 1 drops the coefficients that are not
+            ``coeffValid``.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            Summary of the pruning, with components:
+
+            ``numRetained``
+                Number of non-zero terms retained (`int`).
+            ``numDropped``
+                Number of non-zero terms dropped (`int`).
+            ``maxErrorBound``
+                Largest sum of the absolute dropped coefficients of any
+                target amplifier: the error of the correction, as a
+                fraction of the brightest source pixel (`float`).
+        """
+        def selectTerms(coeffs, significance=None):
+            retained = (coeffs != 0.0) & (np.abs(coeffs) >= minCoeff)
+            if significance is not None:
+                measured = np.isfinite(significance)
+                retained &= ~(measured & (significance < minSignificance))
+            return retained
+
+        significance = None
+        if self.coeffErr is not None and self.coeffNum is not None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                significance = np.abs(self.coeffs)*np.sqrt(self.coeffNum)/self.coeffErr
+            significance[~(self.coeffErr > 0)] = np.nan
+
+        self.coeffRetained = selectTerms(self.coeffs, significance)
+        self.interChipRetained = {detector: selectTerms(coeffs)
+                                  for detector, coeffs in self.interChip.items()}
+
+        numRetained = 0
+        numDropped = 0
+        maxErrorBound = 0.0
+        matrices = [(self.coeffs, self.coeffRetained)]
+        matrices += [(self.interChip[detector], self.interChipRetained[detector])
+                     for detector in self.interChip]
+        for coeffs, retained in matrices:
+            dropped = (coeffs != 0.0) & ~retained
+            numRetained += int(retained.sum())
+            numDropped += int(dropped.sum())
+            # Columns hold the terms of one target amplifier.
+            targetErrors = np.abs(np.where(dropped, coeffs, 0.0)).sum(axis=0)
+            maxErrorBound = max(maxErrorBound, float(targetErrors.max()))
+        return Struct(numRetained=numRetained, numDropped=numDropped, maxErrorBound=maxErrorBound)
+
+    @staticmethod
+    def getSparseCoeffs(coeffs, coeffRetained=None):
+        """Return the retained crosstalk terms of each target amplifier.
+
+        Parameters
+        ----------
+        coeffs : `numpy.ndarray`, (nAmp, nAmp)
+            Crosstalk coefficients, as used by `subtractCrosstalk`:
+            ``coeffs[j, i]`` is the fraction of source amplifier ``j``
+            present in target amplifier ``i``.
+        coeffRetained : `numpy.ndarray`, optional
+            Terms to retain; all non-zero terms if not set.
+
+        Returns
+        -------
+        terms : `list` [`list` [`tuple` [`int`, `float`]]]
+            For each target amplifier, the ``(source, coeff)`` pairs of
+            its retained terms.
+        """
+        retained = coeffs != 0.0
+        if coeffRetained is not None:
+            retained &= coeffRetained
+        return [[(int(source), float(coeffs[source, target]))
+                 for source in np.flatnonzero(retained[:, target])]
+                for target in range(coeffs.shape[1])]
+
     # Implementation methods.
     @staticmethod
     def extractAmp(image, amp, ampTarget, isTrimmed=False):
@@ -423,6 +553,45 @@ class CrosstalkCalib(IsrCalib):
         yFlip = Y_FLIP[targetAmpCorner] ^ Y_FLIP[thisAmpCorner]
         return lsst.afw.math.flipImage(output, xFlip, yFlip)
 
+    @staticmethod
+    def getAmpArray(array, amp, xy0, isTrimmed=False):
+        """Return a view of the data of an amp, flipped to read out from
+        the lower left corner.
+
+        Parameters
+        ----------
+        array : `numpy.ndarray`
+            Array of an image plane containing the amplifier of
+            interest.
+        amp : `lsst.afw.cameraGeom.Amplifier`
+            Amplifier on image to extract.
+        xy0 : `lsst.geom.Point2I`
+            Origin of the image the array belongs to.
+        isTrimmed : `bool`
+            The image is already trimmed.
+            TODO : DM-15409 will resolve this.
+
+        Returns
+        -------
+        view : `numpy.ndarray`
+            View of the amplifier data.  Flips are done by striding, so
+            writing to the view modifies ``array``.
+
+        Notes
+        -----
+        Two amplifiers flipped this way match each other as
+        `extractAmp` would flip one to match the other.
+        """
+        bbox = amp.getBBox() if isTrimmed else amp.getRawDataBBox()
+        view = array[bbox.getMinY() - xy0.getY():bbox.getMaxY() + 1 - xy0.getY(),
+                     bbox.getMinX() - xy0.getX():bbox.getMaxX() + 1 - xy0.getX()]
+        corner = amp.getReadoutCorner()
+        if corner in (lsst.afw.cameraGeom.ReadoutCorner.LR, lsst.afw.cameraGeom.ReadoutCorner.UR):
+            view = view[:, ::-1]
+        if corner in (lsst.afw.cameraGeom.ReadoutCorner.UL, lsst.afw.cameraGeom.ReadoutCorner.UR):
+            view = view[::-1, :]
+        return view
+
     @staticmethod
     def calculateBackground(mi, badPixels=["BAD"]):
         """Estimate median background in image.
@@ -449,7 +618,8 @@ class CrosstalkCalib(IsrCalib):
     def subtractCrosstalk(self, thisExposure, sourceExposure=None, crosstalkCoeffs=None,
                           badPixels=["BAD"], minPixelToMask=45000,
                           crosstalkStr="CROSSTALK", isTrimmed=False,
-                          backgroundMethod="None"):
+                          backgroundMethod="None", useMatrix=False, ampStatistics=None,
+                          coeffRetained=None, useTiles=False):
         """Subtract the crosstalk from thisExposure, optionally using a different source.
 
         We set the mask plane indicated by ``crosstalkStr`` in a target amplifier
@@ -487,6 +657,20 @@ class CrosstalkCalib(IsrCalib):
             amplifier-by-amplifier background levels, "DETECTOR" uses full
             exposure/maskedImage levels.  Any other value results in no
             background subtraction.
+        useMatrix : `bool`, optional
+            Compute the corrections of all amplifiers with a single
+            matrix product; see `subtractCrosstalkMatrix`.
+        ampStatistics : `lsst.ip.isr.AmpStatisticsCache`, optional
+            Statistics of ``thisExposure``, used for the background
+            levels of intra-detector crosstalk, and invalidated once the
+            crosstalk is subtracted.
+        coeffRetained : `numpy.ndarray`, optional
+            Terms of the coefficients to correct; see `pruneCoeffs`.  All
+            non-zero terms are corrected if not set.
+        useTiles : `bool`, optional
+            Correct one target amplifier at a time, without full-frame
+            temporaries; see `subtractCrosstalkTiled`.  Takes precedence
+            over ``useMatrix``.
         """
         mi = thisExposure.getMaskedImage()
         mask = mi.getMask()
@@ -515,46 +699,356 @@ class CrosstalkCalib(IsrCalib):
         # thresholdBackground holds the offset needed so that we only mask
         # pixels high relative to the background, not in an absolute
         # sense.
-        thresholdBackground = self.calculateBackground(source, badPixels)
+        sourceStatistics = ampStatistics if sourceExposure is None else None
+        if sourceStatistics is None:
+            sourceStatistics = AmpStatisticsCache(source)
+        backgroundControl = lsst.afw.math.StatisticsControl()
+        backgroundControl.setAndMask(source.getMask().getPlaneBitMask(badPixels))
+        thresholdBackground = sourceStatistics.getStatistics(lsst.afw.math.MEDIAN,
+                                                             statControl=backgroundControl).getValue()
 
         backgrounds = [0.0 for amp in sourceDetector]
         if backgroundMethod is None:
             pass
         elif backgroundMethod == "AMP":
-            backgrounds = [self.calculateBackground(source[amp.getBBox()], badPixels)
+            backgrounds = [sourceStatistics.getStatistics(lsst.afw.math.MEDIAN, bbox=amp.getBBox(),
+                                                          statControl=backgroundControl).getValue()
                            for amp in sourceDetector]
         elif backgroundMethod == "DETECTOR":
-            backgrounds = [self.calculateBackground(source, badPixels) for amp in sourceDetector]
+            # The detector background is the same for every amplifier.
+            backgrounds = [thresholdBackground for amp in sourceDetector]
+
+        crosstalkPlane = mask.addMaskPlane(crosstalkStr)
+        crosstalk = mask.getPlaneBitMask(crosstalkStr)
+        if ampStatistics is not None:
+            ampStatistics.invalidate()
+        if coeffRetained is not None:
+            coeffs = np.where(coeffRetained, coeffs, 0.0)
+        if useTiles and self.subtractCrosstalkTiled(mi, source, sourceDetector, detector, coeffs, backgrounds,
+                                                    minPixelToMask + thresholdBackground, crosstalk,
+                                                    isTrimmed=isTrimmed):
+            return
 
         # Set the crosstalkStr bit for the bright pixels (those which will have
         # significant crosstalk correction)
-        crosstalkPlane = mask.addMaskPlane(crosstalkStr)
         footprints = lsst.afw.detection.FootprintSet(source,
                                                      lsst.afw.detection.Threshold(minPixelToMask
                                                                                   + thresholdBackground))
         footprints.setMask(mask, crosstalkStr)
-        crosstalk = mask.getPlaneBitMask(crosstalkStr)
+
+        if useMatrix and self.subtractCrosstalkMatrix(mi, detector, sourceDetector, coeffs, backgrounds,
+                                                      crosstalk, isTrimmed=isTrimmed):
+            return
 
         # Define a subtrahend image to contain all the scaled crosstalk signals
         subtrahend = source.Factory(source.getBBox())
         subtrahend.set((0, 0, 0))
 
-        coeffs = coeffs.transpose()
+        sourceAmps = list(detector)
+        terms = self.getSparseCoeffs(coeffs)
         for ii, iAmp in enumerate(sourceDetector):
             iImage = subtrahend[iAmp.getBBox() if isTrimmed else iAmp.getRawDataBBox()]
-            for jj, jAmp in enumerate(detector):
-                if coeffs[ii, jj] == 0.0:
-                    continue
-                jImage = self.extractAmp(mi, jAmp, iAmp, isTrimmed)
+            for jj, coeff in terms[ii]:
+                jImage = self.extractAmp(mi, sourceAmps[jj], iAmp, isTrimmed)
                 jImage.getMask().getArray()[:] &= crosstalk  # Remove all other masks
                 jImage -= backgrounds[jj]
-                iImage.scaledPlus(coeffs[ii, jj], jImage)
+                iImage.scaledPlus(coeff, jImage)
 
         # Set crosstalkStr bit only for those pixels that have been significantly modified (i.e., those
         # masked as such in 'subtrahend'), not necessarily those that are bright originally.
         mask.clearMaskPlane(crosstalkPlane)
         mi -= subtrahend  # also sets crosstalkStr bit for bright pixels
 
+    def subtractCrosstalkMatrix(self, maskedImage, sourceAmps, targetAmps, coeffs, backgrounds,
+                                crosstalkBit, isTrimmed=False):
+        """Subtract the crosstalk of all amplifiers at once.
+
+        The amplifiers are stacked into a cube of views flipped to a
+        common readout corner, and the corrections of all target
+        amplifiers are computed as a single product with the coefficient
+        matrix and subtracted in place.  This gives the same result as
+        the amplifier-by-amplifier correction in `subtractCrosstalk`,
+        to within floating point rounding.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to correct in place; also the source of the crosstalk.
+            The ``crosstalkBit`` mask plane must be set for the bright
+            source pixels.
+        sourceAmps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers that are the sources of the crosstalk.
+        targetAmps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers to correct.
+        coeffs : `numpy.ndarray`, (nAmp, nAmp)
+            Crosstalk coefficients; ``coeffs[j, i]`` is the fraction of
+            source amplifier ``j`` present in target amplifier ``i``.
+        backgrounds : `list` [`float`]
+            Background level of each source amplifier.
+        crosstalkBit : `int`
+            Bit mask of the crosstalk mask plane.
+        isTrimmed : `bool`
+            The image is already trimmed.
+
+        Returns
+        -------
+        applied : `bool`
+            Whether the correction was applied.  It is not if the
+            amplifiers differ in size; the caller should then fall back
+            to the amplifier-by-amplifier correction.
+        """
+        bright = (maskedImage.getMask().getArray() & crosstalkBit) != 0
+        source = CrosstalkSource.fromMaskedImage(maskedImage, sourceAmps, backgrounds, bright,
+                                                 isTrimmed=isTrimmed)
+        applied = source is not None and self.applyCrosstalkSources(maskedImage, targetAmps,
+                                                                    [(source, coeffs)], crosstalkBit,
+                                                                    isTrimmed=isTrimmed)
+        if not applied:
+            self.log.debug("Amplifiers differ in size; not using the crosstalk matrix.")
+        return applied
+
+    def subtractCrosstalkTiled(self, maskedImage, sourceImage, sourceAmps, targetAmps, coeffs, backgrounds,
+                               threshold, crosstalkBit, isTrimmed=False):
+        """Subtract the crosstalk one target amplifier at a time.
+
+        The correction of each target amplifier is accumulated in
+        amplifier-sized scratch arrays and subtracted in place, so no
+        full-frame subtrahend or footprint set is made.  The crosstalk
+        bit is set in a target for the pixels of its coupled source
+        amplifiers that are at or above ``threshold``.
+
+        As in the amplifier-by-amplifier and matrix corrections, the
+        crosstalk is computed from the uncorrected pixels of
+        ``maskedImage``, and the bright pixels are found in
+        ``sourceImage``.  A source amplifier is copied just before it is
+        itself corrected, and only if a later target still needs it, so
+        the result does not depend on the order of the amplifiers.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to correct in place; also the source of the crosstalk.
+        sourceImage : `lsst.afw.image.MaskedImage`
+            Image in which to find the bright source pixels; may be
+            ``maskedImage``.
+        sourceAmps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers that are the sources of the crosstalk.
+        targetAmps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers to correct.
+        coeffs : `numpy.ndarray`, (nAmp, nAmp)
+            Crosstalk coefficients, indexed as in
+            `subtractCrosstalkMatrix`.
+        backgrounds : `list` [`float`]
+            Background level of each source amplifier.
+        threshold : `float`
+            Source level above which the crosstalk is masked.
+        crosstalkBit : `int`
+            Bit mask of the crosstalk mask plane.
+        isTrimmed : `bool`
+            The image is already trimmed.
+
+        Returns
+        -------
+        applied : `bool`
+            Whether the correction was applied.  It is not if the
+            amplifiers differ in size.
+        """
+        xy0 = maskedImage.getXY0()
+        planes = (maskedImage.getImage().getArray(), maskedImage.getMask().getArray(),
+                  maskedImage.getVariance().getArray())
+        targets = [[self.getAmpArray(plane, amp, xy0, isTrimmed) for amp in targetAmps] for plane in planes]
+        sources = [[self.getAmpArray(plane, amp, xy0, isTrimmed) for amp in sourceAmps]
+                   for plane in (planes[0], planes[2])]
+        brightSources = [self.getAmpArray(sourceImage.getImage().getArray(), amp, sourceImage.getXY0(),
+                                          isTrimmed) for amp in sourceAmps]
+        shapes = {view.shape for view in targets[0] + sources[0] + brightSources}
+        if len(shapes) != 1:
+            self.log.debug("Amplifiers differ in size; not using the tiled crosstalk correction.")
+            return False
+        ampShape = shapes.pop()
+
+        terms = self.getSparseCoeffs(coeffs)
+        with np.errstate(invalid="ignore"):
+            coupledSources = {jj for targetTerms in terms for jj, _ in targetTerms}
+            bright = {jj: brightSources[jj] >= threshold for jj in coupledSources}
+
+        # The source amplifiers overwritten by each target, and the number
+        # of targets still to read each source.
+        boxes = [amp.getBBox() if isTrimmed else amp.getRawDataBBox() for amp in sourceAmps]
+        overwritten = [[jj for jj in coupledSources
+                        if boxes[jj] == (amp.getBBox() if isTrimmed else amp.getRawDataBBox())]
+                       for amp in targetAmps]
+        pending = {jj: sum(1 for targetTerms in terms for kk, _ in targetTerms if kk == jj)
+                   for jj in coupledSources}
+
+        correction = np.empty(ampShape, dtype=planes[0].dtype)
+        varianceCorrection = np.empty(ampShape, dtype=planes[2].dtype)
+        scaled = np.empty(ampShape, dtype=planes[0].dtype)
+        targetBright = np.empty(ampShape, dtype=bool)
+
+        # Only the pixels significantly modified by the correction keep
+        # the crosstalk bit.
+        planes[1][...] &= ~crosstalkBit
+        for image, mask, variance, targetTerms, targetSources in zip(*targets, terms, overwritten):
+            if not targetTerms:
+                continue
+            correction[...] = 0.0
+            varianceCorrection[...] = 0.0
+            targetBright[...] = False
+            for jj, coeff in targetTerms:
+                np.multiply(sources[0][jj], coeff, out=scaled, casting="same_kind")
+                correction += scaled
+                np.multiply(sources[1][jj], coeff*coeff, out=scaled, casting="same_kind")
+                varianceCorrection += scaled
+                targetBright |= bright[jj]
+                pending[jj] -= 1
+            for jj in targetSources:
+                if pending[jj] > 0:
+                    sources[0][jj] = sources[0][jj].copy()
+                    sources[1][jj] = sources[1][jj].copy()
+            correction -= sum(coeff*backgrounds[jj] for jj, coeff in targetTerms)
+            image -= correction
+            variance += varianceCorrection
+            mask[targetBright] |= crosstalkBit
+        return True
+
+    @staticmethod
+    def applyCrosstalkSources(maskedImage, targetAmps, sourceTerms, crosstalkBit, isTrimmed=False):
+        """Subtract the crosstalk of stacked source amplifiers in place.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to correct in place.
+        targetAmps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers to correct.
+        sourceTerms : `list` [`tuple`]
+            Pairs of a `CrosstalkSource` and the (nSourceAmp, nTargetAmp)
+            coefficients coupling its amplifiers to ``targetAmps``,
+            indexed as in `subtractCrosstalkMatrix`.
+        crosstalkBit : `int`
+            Bit mask of the crosstalk mask plane.  It is cleared, then
+            set for the pixels of the targets coupled to bright source
+            pixels.
+        isTrimmed : `bool`
+            The image is already trimmed.
+
+        Returns
+        -------
+        applied : `bool`
+            Whether the correction was applied.  It is not if the target
+            and source amplifiers differ in size.
+        """
+        xy0 = maskedImage.getXY0()
+        planes = (maskedImage.getImage().getArray(), maskedImage.getMask().getArray(),
+                  maskedImage.getVariance().getArray())
+        targets = [[CrosstalkCalib.getAmpArray(plane, amp, xy0, isTrimmed) for amp in targetAmps]
+                   for plane in planes]
+        shapes = {view.shape for view in targets[0]} | {source.ampShape for source, _ in sourceTerms}
+        if len(shapes) != 1:
+            return False
+        ampShape = shapes.pop()
+        numPixels = ampShape[0]*ampShape[1]
+
+        dtype = planes[0].dtype
+        corrections = np.zeros((len(targets[0]), numPixels), dtype=dtype)
+        varianceCorrections = np.zeros((len(targets[0]), numPixels), dtype=planes[2].dtype)
+        targetBright = np.zeros((len(targets[0]), numPixels), dtype=bool)
+        for source, coeffs in sourceTerms:
+            # Rows of the matrix are targets, and columns are sources.
+            matrix = np.asarray(coeffs, dtype=float).transpose()
+            coupled = matrix != 0.0
+            if source.isFinite:
+                corrections += matrix.astype(dtype) @ source.imageCube
+            else:
+                # Sources with zero coefficients must not spread non-finite
+                # values to their targets.
+                for row, rowCoupled, correction in zip(matrix, coupled, corrections):
+                    correction += row[rowCoupled].astype(dtype) @ source.imageCube[rowCoupled]
+            corrections -= (matrix @ source.backgrounds)[:, np.newaxis]
+            varianceCorrections += np.square(matrix).astype(varianceCorrections.dtype) @ source.varianceCube
+            targetBright |= (coupled.astype(np.float32) @ source.brightCube) > 0
+
+        # Only the pixels significantly modified by the correction keep
+        # the crosstalk bit.
+        planes[1][...] &= ~crosstalkBit
+        for image, mask, variance, correction, varianceCorrection, bright in zip(
+                *targets, corrections, varianceCorrections, targetBright):
+            image -= correction.reshape(ampShape)
+            variance += varianceCorrection.reshape(ampShape)
+            mask[bright.reshape(ampShape)] |= crosstalkBit
+        return True
+
+
+class CrosstalkSource:
+    """Uncorrected amplifier data of a detector that is a source of
+    crosstalk.
+
+    Parameters
+    ----------
+    imageCube : `numpy.ndarray`, (nAmp, nPixel)
+        Image of each amplifier, flipped to read out from the lower left
+        corner and flattened.
+    varianceCube : `numpy.ndarray`, (nAmp, nPixel)
+        Variance of each amplifier, arranged as ``imageCube``.
+    brightCube : `numpy.ndarray`, (nAmp, nPixel)
+        One for the bright pixels of each amplifier, whose crosstalk is
+        masked in the targets, and zero elsewhere.
+    backgrounds : `numpy.ndarray`, (nAmp,)
+        Background level of each amplifier.
+    ampShape : `tuple` [`int`]
+        Shape of an amplifier image.
+    """
+
+    def __init__(self, imageCube, varianceCube, brightCube, backgrounds, ampShape):
+        self.imageCube = imageCube
+        self.varianceCube = varianceCube
+        self.brightCube = np.asarray(brightCube, dtype=np.float32)
+        self.backgrounds = np.asarray(backgrounds, dtype=float)
+        self.ampShape = tuple(ampShape)
+        self.isFinite = bool(np.isfinite(imageCube).all())
+
+    @classmethod
+    def fromMaskedImage(cls, maskedImage, amps, backgrounds, bright, isTrimmed=False):
+        """Stack copies of the amplifiers of an image.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image of the source detector.
+        amps : `lsst.afw.cameraGeom.Detector` or `list`
+            Amplifiers of the source detector.
+        backgrounds : `list` [`float`]
+            Background level of each amplifier.
+        bright : `numpy.ndarray`
+            Boolean array, the shape of ``maskedImage``, of the bright
+            pixels.
+        isTrimmed : `bool`
+            The image is already trimmed.
+
+        Returns
+        -------
+        source : `CrosstalkSource` or `None`
+            Stacked amplifiers, or `None` if they differ in size.
+        """
+        xy0 = maskedImage.getXY0()
+        planes = (maskedImage.getImage().getArray(), maskedImage.getVariance().getArray(), bright)
+        views = [[CrosstalkCalib.getAmpArray(plane, amp, xy0, isTrimmed) for amp in amps]
+                 for plane in planes]
+        shapes = {view.shape for view in views[0]}
+        if len(shapes) != 1:
+            return None
+        # Stacking copies the uncorrected data, so the image can later be
+        # corrected in place.
+        cubes = [np.stack(plane).reshape(len(plane), -1) for plane in views]
+        return cls(*cubes, backgrounds, shapes.pop())
+
+    @property
+    def nbytes(self):
+        """Memory used by the stacked amplifiers, in bytes (`int`).
+        """
+        return self.imageCube.nbytes + self.varianceCube.nbytes + self.brightCube.nbytes
+
 
 class CrosstalkConfig(Config):
     """Configuration for intra-detector crosstalk removal."""
@@ -591,11 +1085,49 @@ class CrosstalkConfig(Config):
              "vector [corr0 corr1 corr2 ...]^T."),
         default=[0.0],
     )
+    doPruneCoeffs = Field(
+        dtype=bool,
+        doc="Only correct the crosstalk terms selected by minCoeff and minCoeffSignificance?",
+        default=False,
+    )
+    minCoeff = Field(
+        dtype=float,
+        doc="Minimum absolute crosstalk coefficient corrected if doPruneCoeffs is set.",
+        default=0.0,
+        check=lambda x: x >= 0,
+    )
+    minCoeffSignificance = Field(
+        dtype=float,
+        doc="Minimum significance, abs(coeff)*sqrt(coeffNum)/coeffErr, of the measured crosstalk "
+            "coefficients corrected if doPruneCoeffs is set.",
+        default=0.0,
+        check=lambda x: x >= 0,
+    )
+    doTiledSubtraction = Field(
+        dtype=bool,
+        doc="Subtract the crosstalk one target amplifier at a time, with amplifier-sized scratch "
+            "arrays instead of a full-frame subtrahend and footprint set?  Takes precedence over "
+            "doMatrixSubtraction.",
+        default=False,
+    )
+    doMatrixSubtraction = Field(
+        dtype=bool,
+        doc="Compute the crosstalk corrections of all amplifiers with a single coefficient-matrix "
+            "product and subtract them in place, rather than amplifier pair by amplifier pair?",
+        default=False,
+    )
     crosstalkShape = ListField(
         dtype=int,
         doc="Shape of the coefficient array.  This should be equal to [nAmp, nAmp].",
         default=[1],
     )
+    sourceCacheSize = Field(
+        dtype=int,
+        doc="Byte budget of the stacked source detector amplifiers held by FocalPlaneCrosstalk for "
+            "the inter-detector corrections of a visit.",
+        default=2**31,
+        check=lambda x: x >= 0,
+    )
 
     def getCrosstalk(self, detector=None):
         """Return a 2-D numpy array of crosstalk coefficients in the proper shape.
@@ -672,7 +1204,7 @@ class CrosstalkTask(Task):
         return
 
     def run(self, exposure, crosstalk=None,
-            crosstalkSources=None, isTrimmed=False):
+            crosstalkSources=None, isTrimmed=False, ampStatistics=None):
         """Apply intra-detector crosstalk correction
 
         Parameters
@@ -682,16 +1214,18 @@ class CrosstalkTask(Task):
         crosstalkCalib : `lsst.ip.isr.CrosstalkCalib`, optional
             External crosstalk calibration to apply.  Constructed from
             detector if not found.
-        crosstalkSources : `defaultdict`, optional
+        crosstalkSources : `list`, optional
             Image data for other detectors that are sources of
-            crosstalk in exposure.  The keys are expected to be names
-            of the other detectors, with the values containing
-            `lsst.afw.image.Exposure` at the same level of processing
-            as ``exposure``.
+            crosstalk in exposure, as `lsst.afw.image.Exposure` or
+            `lsst.daf.butler.DeferredDatasetHandle` at the same level of
+            processing as ``exposure``.  Deferred sources are loaded
+            only when their coefficients are applied.
             The default for intra-detector crosstalk here is None.
         isTrimmed : `bool`
             The image is already trimmed.
             This should no longer be needed once DM-15409 is resolved.
+        ampStatistics : `lsst.ip.isr.AmpStatisticsCache`, optional
+            Statistics of ``exposure`` shared with other ISR stages.
 
         Raises
         ------
@@ -709,38 +1243,291 @@ class CrosstalkTask(Task):
             raise RuntimeError("Attempted to correct crosstalk without crosstalk coefficients.")
 
         else:
+            if self.config.doPruneCoeffs:
+                pruning = crosstalk.pruneCoeffs(minCoeff=self.config.minCoeff,
+                                                minSignificance=self.config.minCoeffSignificance)
+                self.log.info("Pruned %d of %d crosstalk terms; maximum error bound %g of the source level.",
+                              pruning.numDropped, pruning.numDropped + pruning.numRetained,
+                              pruning.maxErrorBound)
             self.log.info("Applying crosstalk correction.")
             crosstalk.subtractCrosstalk(exposure, crosstalkCoeffs=crosstalk.coeffs,
                                         minPixelToMask=self.config.minPixelToMask,
                                         crosstalkStr=self.config.crosstalkMaskPlane, isTrimmed=isTrimmed,
-                                        backgroundMethod=self.config.crosstalkBackgroundMethod)
+                                        backgroundMethod=self.config.crosstalkBackgroundMethod,
+                                        useMatrix=self.config.doMatrixSubtraction,
+                                        useTiles=self.config.doTiledSubtraction,
+                                        ampStatistics=ampStatistics,
+                                        coeffRetained=crosstalk.coeffRetained)
 
             if crosstalk.interChip:
                 if crosstalkSources:
+                    sourceIndex = _getSourceIndex(crosstalkSources)
                     for detName in crosstalk.interChip:
-                        if isinstance(crosstalkSources[0], 'lsst.afw.image.Exposure'):
-                            # Received afwImage.Exposure
-                            sourceNames = [exp.getDetector().getName() for exp in crosstalkSources]
-                        else:
-                            # Received dafButler.DeferredDatasetHandle
-                            sourceNames = [expRef.get(datasetType='isrOscanCorr').getDetector().getName()
-                                           for expRef in crosstalkSources]
-                        if detName not in sourceNames:
+                        if detName not in sourceIndex:
                             self.log.warn("Crosstalk lists %s, not found in sources: %s",
-                                          detName, sourceNames)
+                                          detName, list(sourceIndex))
                             continue
                         interChipCoeffs = crosstalk.interChip[detName]
-                        sourceExposure = crosstalkSources[sourceNames.index(detName)]
+                        # Load the source only now, and release it once
+                        # applied.
+                        sourceExposure = _loadSource(sourceIndex[detName])
                         crosstalk.subtractCrosstalk(exposure, sourceExposure=sourceExposure,
                                                     crosstalkCoeffs=interChipCoeffs,
                                                     minPixelToMask=self.config.minPixelToMask,
                                                     crosstalkStr=self.config.crosstalkMaskPlane,
                                                     isTrimmed=isTrimmed,
-                                                    backgroundMethod=self.config.crosstalkBackgroundMethod)
+                                                    backgroundMethod=self.config.crosstalkBackgroundMethod,
+                                                    useMatrix=self.config.doMatrixSubtraction,
+                                                    useTiles=self.config.doTiledSubtraction,
+                                                    ampStatistics=ampStatistics,
+                                                    coeffRetained=crosstalk.interChipRetained.get(detName))
+                        del sourceExposure
                 else:
                     self.log.warn("Crosstalk contains interChip coefficients, but no sources found!")
 
 
+def _getSourceIndex(crosstalkSources):
+    """Index crosstalk sources by detector name without loading their
+    pixels.
+
+    Parameters
+    ----------
+    crosstalkSources : `list`
+        `lsst.afw.image.Exposure` or `lsst.daf.butler.DeferredDatasetHandle`
+        of the source detectors.
+
+    Returns
+    -------
+    sourceIndex : `dict`
+        The sources, keyed by detector name.
+    """
+    sourceIndex = {}
+    for source in crosstalkSources:
+        if isinstance(source, lsst.afw.image.Exposure):
+            detector = source.getDetector()
+        else:
+            # Only the detector component of a deferred handle is read.
+            detector = source.get(component="detector")
+        sourceIndex[detector.getName()] = source
+    return sourceIndex
+
+
+def _loadSource(source):
+    """Return the exposure of a crosstalk source, loading it if deferred.
+
+    Parameters
+    ----------
+    source : `lsst.afw.image.Exposure` or `lsst.daf.butler.DeferredDatasetHandle`
+        Crosstalk source.
+
+    Returns
+    -------
+    exposure : `lsst.afw.image.Exposure`
+        Exposure of the source detector.
+    """
+    return source if isinstance(source, lsst.afw.image.Exposure) else source.get()
+
+
+class FocalPlaneCrosstalk:
+    """Crosstalk correction of the detectors of a visit.
+
+    The amplifiers of each source detector are stacked once, before the
+    detector is corrected, and kept in a cache bounded by
+    ``config.sourceCacheSize``.  The intra- and inter-detector crosstalk
+    of each target is then subtracted from the cached stacks in a single
+    pass, so a driver correcting all the detectors of a visit extracts
+    each detector once rather than once per target it couples to.
+
+    Parameters
+    ----------
+    config : `CrosstalkConfig`, optional
+        Crosstalk configuration.  The defaults are used if not set.
+    badPixels : `list` of `str`
+        Mask planes to ignore when measuring the backgrounds.
+    isTrimmed : `bool`
+        The images are already trimmed.
+        This should no longer be needed once DM-15409 is resolved.
+    log : `lsst.log.Log`, optional
+        Log to write messages to.
+
+    Notes
+    -----
+    Unlike `CrosstalkCalib.subtractCrosstalk`, inter-detector crosstalk
+    is computed from the pixels of the source detector.  Sources should
+    be added with `addSource`, or listed in ``crosstalkSources``, before
+    they are themselves corrected; a source evicted from the cache is
+    extracted again from the exposure it is given in.  Sources are
+    cached by the exposure id and detector name, so the sources of one
+    exposure are never applied to another.  Exposures without an
+    exposure id cannot be told apart, and so their sources are not
+    cached: each source must be listed in ``crosstalkSources``, and is
+    stacked every time it is used.
+    """
+
+    def __init__(self, config=None, badPixels=["BAD"], isTrimmed=False, log=None):
+        self.config = config if config is not None else CrosstalkConfig()
+        self.badPixels = badPixels
+        self.isTrimmed = isTrimmed
+        self.log = log if log else Log.getLogger(__name__.partition(".")[2])
+        self._sources = CalibCache(self.config.sourceCacheSize)
+        self._added = set()
+
+    @property
+    def numExtracted(self):
+        """Number of times a source detector was stacked (`int`).
+        """
+        return self._sources.misses
+
+    def addSource(self, exposure):
+        """Stack the amplifiers of a source detector, if not cached.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Uncorrected exposure of the source detector.
+
+        Returns
+        -------
+        source : `CrosstalkSource`
+            Stacked amplifiers of the detector.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the amplifiers of the detector differ in size.
+        """
+        key = self._getKey(exposure, exposure.getDetector().getName())
+        if key is not None:
+            self._added.add(key)
+        return self._sources.get(key, lambda: self.makeSource(exposure))
+
+    @staticmethod
+    def _getKey(exposure, detName):
+        """Identify a source detector of the exposure being corrected, or
+        return `None` if the exposure has no exposure id.
+        """
+        visitInfo = exposure.getInfo().getVisitInfo()
+        exposureId = visitInfo.getExposureId() if visitInfo is not None else 0
+        return (exposureId, detName) if exposureId else None
+
+    def makeSource(self, exposure):
+        """Stack the amplifiers of a source detector.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Uncorrected exposure of the source detector.
+
+        Returns
+        -------
+        source : `CrosstalkSource`
+            Stacked amplifiers of the detector.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the amplifiers of the detector differ in size.
+        """
+        maskedImage = exposure.getMaskedImage()
+        detector = exposure.getDetector()
+        statistics = AmpStatisticsCache(maskedImage)
+        backgroundControl = lsst.afw.math.StatisticsControl()
+        backgroundControl.setAndMask(maskedImage.getMask().getPlaneBitMask(self.badPixels))
+        thresholdBackground = statistics.getStatistics(lsst.afw.math.MEDIAN,
+                                                       statControl=backgroundControl).getValue()
+
+        backgrounds = [0.0 for amp in detector]
+        if self.config.crosstalkBackgroundMethod == "AMP":
+            backgrounds = [statistics.getStatistics(lsst.afw.math.MEDIAN, bbox=amp.getBBox(),
+                                                    statControl=backgroundControl).getValue()
+                           for amp in detector]
+        elif self.config.crosstalkBackgroundMethod == "DETECTOR":
+            backgrounds = [thresholdBackground for amp in detector]
+
+        # These are the pixels a detection footprint set at the threshold
+        # would cover.
+        with np.errstate(invalid="ignore"):
+            bright = maskedImage.getImage().getArray() >= self.config.minPixelToMask + thresholdBackground
+        source = CrosstalkSource.fromMaskedImage(maskedImage, detector, backgrounds, bright,
+                                                 isTrimmed=self.isTrimmed)
+        if source is None:
+            raise RuntimeError(f"Amplifiers of {detector.getName()} differ in size.")
+        return source
+
+    def run(self, exposure, crosstalk, crosstalkSources=None):
+        """Subtract the intra- and inter-detector crosstalk of a detector.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure to correct in place.  It is added as a source first,
+            so it may be a source of other detectors corrected later.
+        crosstalk : `lsst.ip.isr.CrosstalkCalib`
+            Crosstalk calibration of the detector.
+        crosstalkSources : `list`, optional
+            `lsst.afw.image.Exposure` or
+            `lsst.daf.butler.DeferredDatasetHandle` of the other detectors
+            listed in ``crosstalk.interChip``.  Only the sources not
+            cached are loaded.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the calibration does not match the detector, if
+            the target and source amplifiers differ in size, or if a
+            source was evicted from the cache and is not listed in
+            ``crosstalkSources``.
+        """
+        maskedImage = exposure.getMaskedImage()
+        detector = exposure.getDetector()
+        if len(detector) != crosstalk.nAmp:
+            raise RuntimeError(f"Crosstalk built for {crosstalk.nAmp} amplifiers, received "
+                               f"{len(detector)} in {detector.getName()}")
+
+        terms = []
+        target = self.addSource(exposure)
+        if crosstalk.hasCrosstalk:
+            terms.append((target, self._getRetained(crosstalk.coeffs, crosstalk.coeffRetained)))
+
+        sourceIndex = _getSourceIndex(crosstalkSources) if crosstalk.interChip and crosstalkSources else {}
+        for detName, coeffs in crosstalk.interChip.items():
+            key = self._getKey(exposure, detName)
+            sourceRef = sourceIndex.get(detName)
+            source = self._sources.find(key)
+            if source is None and sourceRef is None:
+                if key in self._added:
+                    raise RuntimeError(f"Crosstalk source {detName} of {detector.getName()} was evicted "
+                                       "from the cache and is not in crosstalkSources; increase "
+                                       "sourceCacheSize or list it.")
+                self.log.warn("Crosstalk lists %s, not found in sources: %s",
+                              detName, list(sourceIndex))
+                continue
+            if source is None:
+                if key is not None:
+                    self._added.add(key)
+                source = self._sources.get(key, lambda: self.makeSource(_loadSource(sourceRef)))
+            terms.append((source, self._getRetained(coeffs, crosstalk.interChipRetained.get(detName))))
+
+        mask = maskedImage.getMask()
+        mask.addMaskPlane(self.config.crosstalkMaskPlane)
+        crosstalkBit = mask.getPlaneBitMask(self.config.crosstalkMaskPlane)
+        if not CrosstalkCalib.applyCrosstalkSources(maskedImage, detector, terms, crosstalkBit,
+                                                    isTrimmed=self.isTrimmed):
+            raise RuntimeError(f"Amplifiers of {detector.getName()} and its crosstalk sources "
+                               "differ in size.")
+
+    @staticmethod
+    def _getRetained(coeffs, coeffRetained):
+        coeffs = np.asarray(coeffs, dtype=float)
+        return coeffs if coeffRetained is None else np.where(coeffRetained, coeffs, 0.0)
+
+    def clear(self):
+        """Drop the cached sources, e.g. at the end of a visit.
+        """
+        self._sources.clear()
+        self._added.clear()
+
+
 class NullCrosstalkTask(CrosstalkTask):
     def run(self, exposure, crosstalkSources=None):
         self.log.info("Not performing any crosstalk correction")
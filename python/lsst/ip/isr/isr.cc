@@ -20,7 +20,9 @@
  * see <https://www.lsstcorp.org/LegalNotices/>.
  */
 #include "pybind11/pybind11.h"
+#include "ndarray/pybind11.h"
 
+#include <cstdint>
 #include <memory>
 
 #include "lsst/ip/isr/isr.h"
@@ -44,6 +46,15 @@ static void declareCountMaskedPixels(py::module& mod, std::string const& suffix)
     cls.def("getCount", &CountMaskedPixels<PixelT>::getCount);
 }
 
+template <typename PixelT, typename MaskT>
+static void declareRowStatistics(py::module& mod) {
+    mod.def("computeRowStatistics",
+            py::overload_cast<ndarray::Array<PixelT const, 2, 1> const&,
+                              ndarray::Array<MaskT const, 2, 1> const&, MaskT, int>(
+                    &computeRowStatistics<PixelT, MaskT>),
+            "image"_a, "mask"_a, "badMask"_a, "nThreads"_a = 0, py::call_guard<py::gil_scoped_release>());
+}
+
 /**
  * Wrap all code in Isr.h for a given template parameter
  *
@@ -60,7 +71,13 @@ static void declareAll(py::module& mod, std::string const& suffix) {
 
     mod.def("maskNans", &maskNans<PixelT>, "maskedImage"_a, "maskVal"_a, "allow"_a = 0);
     mod.def("fitOverscanImage", &fitOverscanImage<PixelT, double>, "overscanFunction"_a, "overscan"_a,
-            "stepSize"_a = 1.1, "sigma"_a = 1);
+            "stepSize"_a = 1.1, "sigma"_a = 1, "badMask"_a = 0, "nThreads"_a = 0);
+    mod.def("computeRowStatistics",
+            py::overload_cast<afw::image::MaskedImage<PixelT> const&, afw::image::MaskPixel, int>(
+                    &computeRowStatistics<PixelT>),
+            "maskedImage"_a, "badMask"_a = 0, "nThreads"_a = 0, py::call_guard<py::gil_scoped_release>());
+    declareRowStatistics<PixelT, afw::image::MaskPixel>(mod);
+    declareRowStatistics<PixelT, std::uint8_t>(mod);
 }
 
 }  // namespace lsst::ip::isr::<anonymous>
@@ -0,0 +1,654 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Performance benchmarks of IsrTask at production scale, built on the
+simulated data of `lsst.ip.isr.isrMock`.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import lsst.geom
+import lsst.afw.cameraGeom as cameraGeom
+import lsst.afw.image as afwImage
+import lsst.pex.config as pexConfig
+from lsst.pipe.base import Struct
+
+from . import isrFunctions
+from . import isrMock
+from .crosstalk import CrosstalkCalib
+from .defects import Defects
+from .isrTask import IsrTask, IsrTaskConfig
+from .linearize import Linearizer
+from .overscan import OverscanCorrectionTask
+from .stageTimer import getMaxRss, measureStage
+
+__all__ = ["IsrBenchmarkConfig", "makeBenchmarkCamera", "makeBenchmarkData", "runBenchmarks",
+           "measureBrighterFatterMemory", "compareBenchmarks", "main"]
+
+
+class IsrBenchmarkConfig(pexConfig.Config):
+    """Configuration of the simulated detector and the benchmark runs.
+
+    The defaults describe a 4k x 4k detector read out through 16
+    amplifiers.
+    """
+    nAmpX = pexConfig.Field(dtype=int, default=8, doc="Number of amplifiers along x.")
+    nAmpY = pexConfig.Field(dtype=int, default=2, doc="Number of amplifiers along y.")
+    ampWidth = pexConfig.Field(dtype=int, default=509, doc="Width of the amplifier data region.")
+    ampHeight = pexConfig.Field(dtype=int, default=2000, doc="Height of the amplifier data region.")
+    prescanWidth = pexConfig.Field(dtype=int, default=3, doc="Width of the serial prescan.")
+    overscanWidth = pexConfig.Field(dtype=int, default=32, doc="Width of the serial overscan.")
+    crosstalkLevel = pexConfig.Field(dtype=float, default=1e-4,
+                                     doc="Typical crosstalk coefficient between amplifiers.")
+    numBadColumns = pexConfig.Field(dtype=int, default=30, doc="Number of partial bad columns.")
+    numHotPixels = pexConfig.Field(dtype=int, default=2000, doc="Number of single hot pixels.")
+    numDefectBlobs = pexConfig.Field(dtype=int, default=20, doc="Number of extended defect regions.")
+    rngSeed = pexConfig.Field(dtype=int, default=20201016, doc="Seed for the simulated defects.")
+    repeat = pexConfig.Field(dtype=int, default=3, check=lambda x: x > 0,
+                             doc="Number of times each benchmark is run; the fastest run is reported.")
+
+
+def makeBenchmarkCamera(config):
+    """Construct a camera with a single production-scale detector.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration describing the detector geometry.
+
+    Returns
+    -------
+    camera : `lsst.afw.cameraGeom.Camera`
+        Camera containing one untrimmed-raw detector.
+    """
+    nAmp = config.nAmpX*config.nAmpY
+    rawWidth = config.prescanWidth + config.ampWidth + config.overscanWidth
+    rng = np.random.RandomState(config.rngSeed)
+    crosstalk = rng.uniform(0.0, 2.0*config.crosstalkLevel, size=(nAmp, nAmp))
+    np.fill_diagonal(crosstalk, 0.0)
+
+    camBuilder = cameraGeom.Camera.Builder("isrBenchmark")
+    detBuilder = camBuilder.add("benchmark", 0)
+    detBuilder.setSerial("benchmark-0")
+    detBuilder.setBBox(lsst.geom.Box2I(lsst.geom.Point2I(0, 0),
+                                       lsst.geom.Extent2I(config.nAmpX*config.ampWidth,
+                                                          config.nAmpY*config.ampHeight)))
+    detBuilder.setOrientation(cameraGeom.Orientation())
+    detBuilder.setPixelSize(lsst.geom.Extent2D(0.01, 0.01))
+    detBuilder.setCrosstalk(np.array(crosstalk, dtype=np.float32))
+
+    for iy in range(config.nAmpY):
+        for ix in range(config.nAmpX):
+            x0 = ix*rawWidth
+            y0 = iy*config.ampHeight
+            amp = cameraGeom.Amplifier.Builder()
+            amp.setName(f"C{iy}{ix}")
+            amp.setBBox(lsst.geom.Box2I(lsst.geom.Point2I(ix*config.ampWidth, y0),
+                                        lsst.geom.Extent2I(config.ampWidth, config.ampHeight)))
+            amp.setRawBBox(lsst.geom.Box2I(lsst.geom.Point2I(x0, y0),
+                                           lsst.geom.Extent2I(rawWidth, config.ampHeight)))
+            amp.setRawPrescanBBox(lsst.geom.Box2I(lsst.geom.Point2I(x0, y0),
+                                                  lsst.geom.Extent2I(config.prescanWidth, config.ampHeight)))
+            amp.setRawDataBBox(lsst.geom.Box2I(lsst.geom.Point2I(x0 + config.prescanWidth, y0),
+                                               lsst.geom.Extent2I(config.ampWidth, config.ampHeight)))
+            amp.setRawHorizontalOverscanBBox(
+                lsst.geom.Box2I(lsst.geom.Point2I(x0 + config.prescanWidth + config.ampWidth, y0),
+                                lsst.geom.Extent2I(config.overscanWidth, config.ampHeight)))
+            amp.setRawXYOffset(lsst.geom.Extent2I(0, 0))
+            amp.setRawFlipX(False)
+            amp.setRawFlipY(False)
+            amp.setReadoutCorner(cameraGeom.ReadoutCorner.LL if iy == 0 else cameraGeom.ReadoutCorner.UL)
+            amp.setGain(1.0)
+            amp.setReadNoise(5.0)
+            amp.setSaturation(32000.0)
+            amp.setSuspectLevel(25000.0)
+            amp.setLinearityType("Polynomial")
+            amp.setLinearityCoeffs([0.0, 1.0, 0.0, 0.0])
+            detBuilder.append(amp)
+
+    return camBuilder.finish()
+
+
+def _makeMockClass(mockClass, camera):
+    """Make a version of a mock class that simulates data for ``camera``.
+    """
+    detector = camera[0]
+    crosstalkCoeffs = np.array(detector.getCrosstalk(), dtype=float)
+
+    class BenchmarkMock(mockClass):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.config.detectorIndex = 0
+            self.crosstalkCoeffs = crosstalkCoeffs
+
+        def getCamera(self):
+            return camera
+
+    BenchmarkMock.__name__ = "Benchmark" + mockClass.__name__
+    return BenchmarkMock
+
+
+def makeBenchmarkDefects(config, detector):
+    """Simulate a realistic list of defects.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration setting the numbers of defects.
+    detector : `lsst.afw.cameraGeom.Detector`
+        Detector to place the defects on.
+
+    Returns
+    -------
+    defects : `lsst.ip.isr.Defects`
+        Bad columns, hot pixels and extended defect regions.
+    """
+    rng = np.random.RandomState(config.rngSeed)
+    width, height = detector.getBBox().getWidth(), detector.getBBox().getHeight()
+    boxes = []
+    for _ in range(config.numBadColumns):
+        length = rng.randint(100, height)
+        x, y = rng.randint(0, width), rng.randint(0, height - length + 1)
+        boxes.append(lsst.geom.Box2I(lsst.geom.Point2I(x, y), lsst.geom.Extent2I(1, length)))
+    for _ in range(config.numHotPixels):
+        x, y = rng.randint(0, width), rng.randint(0, height)
+        boxes.append(lsst.geom.Box2I(lsst.geom.Point2I(x, y), lsst.geom.Extent2I(1, 1)))
+    for _ in range(config.numDefectBlobs):
+        dx, dy = rng.randint(2, 21, size=2)
+        x, y = rng.randint(0, width - dx), rng.randint(0, height - dy)
+        boxes.append(lsst.geom.Box2I(lsst.geom.Point2I(x, y), lsst.geom.Extent2I(dx, dy)))
+    return Defects(boxes)
+
+
+def makeBenchmarkData(config):
+    """Simulate a raw exposure and its calibrations.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration.
+
+    Returns
+    -------
+    data : `lsst.pipe.base.Struct`
+        Result struct with components:
+        - ``camera`` : `lsst.afw.cameraGeom.Camera`
+        - ``raw`` : `lsst.afw.image.Exposure`
+            Untrimmed raw exposure, with crosstalk.
+        - ``calibs`` : `dict`
+            Keyword arguments for `lsst.ip.isr.IsrTask.run`.
+    """
+    camera = makeBenchmarkCamera(config)
+    detector = camera[0]
+
+    def make(mockClass, **overrides):
+        mockConfig = isrMock.IsrMockConfig()
+        mockConfig.rngSeed = config.rngSeed
+        mock = _makeMockClass(mockClass, camera)(config=mockConfig)
+        for name, value in overrides.items():
+            setattr(mock.config, name, value)
+        return mock.run()
+
+    raw = make(isrMock.RawMock, doAddCrosstalk=True, doAddFringe=True, doAddFlat=True)
+    bfKernel = make(isrMock.BfKernelMock)
+
+    linearizer = Linearizer(detector=detector)
+    crosstalk = CrosstalkCalib().fromDetector(detector)
+    calibs = dict(camera=camera,
+                  bias=make(isrMock.BiasMock),
+                  dark=make(isrMock.DarkMock),
+                  flat=make(isrMock.FlatMock),
+                  fringes=Struct(fringes=make(isrMock.FringeMock), seed=1234),
+                  bfKernel=bfKernel,
+                  defects=makeBenchmarkDefects(config, detector),
+                  linearizer=linearizer,
+                  crosstalk=crosstalk)
+    return Struct(camera=camera, raw=raw, calibs=calibs)
+
+
+def makeBenchmarkIsrConfig(filterName):
+    """Return the ISR configuration used for the benchmarks.
+
+    Parameters
+    ----------
+    filterName : `str`
+        Name of the filter of the simulated exposure, for which fringe
+        correction is enabled.
+
+    Returns
+    -------
+    config : `lsst.ip.isr.IsrTaskConfig`
+        Configuration running every correction that can be simulated.
+    """
+    config = IsrTaskConfig()
+    config.doWrite = False
+    config.doLinearize = True
+    config.doCrosstalk = True
+    config.doCrosstalkBeforeAssemble = False
+    config.doBrighterFatter = True
+    config.doFringe = True
+    config.fringe.filters = [filterName]
+    config.doAttachTransmissionCurve = False
+    config.doVignette = False
+    config.doStrayLight = False
+    config.doIlluminationCorrection = False
+    config.doMeasureBackground = True
+    config.doStageTiming = True
+    return config
+
+
+def _timeCall(name, repeat, setup, function):
+    """Time a function, reporting the fastest of several runs.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the benchmark.
+    repeat : `int`
+        Number of runs.
+    setup : callable
+        Function returning the arguments of ``function`` for one run,
+        as a `dict`.  Not included in the timing.
+    function : callable
+        Function to time.
+
+    Returns
+    -------
+    record : `dict`
+        Measurement record of the fastest run; see `_timeRecord`.
+    """
+    best = None
+    for _ in range(repeat):
+        kwargs = setup()
+        with measureStage(name) as record:
+            function(**kwargs)
+        del kwargs
+        if best is None or record["wallTime"] < best["wallTime"]:
+            best = record
+    return _timeRecord(best)
+
+
+def _timeRecord(record):
+    """Return the timing measurements of a record from
+    `lsst.ip.isr.measureStage`.
+
+    The peak resident set size of the process only grows as the
+    benchmarks run one after another, so the memory measurements of all
+    but the first are meaningless and are dropped; see
+    `measureBrighterFatterMemory` for a memory benchmark.
+    """
+    return {key: value for key, value in record.items() if key in ("stage", "wallTime", "cpuTime")}
+
+
+def runIsrBenchmark(config, data, isrConfig, name="IsrTask.run"):
+    """Time `lsst.ip.isr.IsrTask.run` overall and per stage.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration.
+    data : `lsst.pipe.base.Struct`
+        Simulated data from `makeBenchmarkData`.
+    isrConfig : `lsst.ip.isr.IsrTaskConfig`
+        ISR configuration to time.
+    name : `str`, optional
+        Name of the benchmark.
+
+    Returns
+    -------
+    records : `list` [`dict`]
+        Measurement records of the fastest run: one named ``name`` for
+        the whole of ``run``, followed by one per stage named
+        ``<name>:<stage>``.
+    """
+    task = IsrTask(config=isrConfig)
+    best = None
+    with tempfile.TemporaryDirectory() as tempDir:
+        isrConfig.stageTimingFile = os.path.join(tempDir, "stages.json")
+        for _ in range(config.repeat):
+            raw = data.raw.clone()
+            with measureStage(name) as record:
+                task.run(raw, **data.calibs)
+            del raw
+            if best is None or record["wallTime"] < best[0]["wallTime"]:
+                with open(isrConfig.stageTimingFile) as stageFile:
+                    stages = json.load(stageFile)["stages"]
+                for stage in stages:
+                    stage["stage"] = f"{name}:{stage['stage']}"
+                best = [_timeRecord(record) for record in [record] + stages]
+    return best
+
+
+def runFunctionBenchmarks(config, data):
+    """Time the key functions of `lsst.ip.isr.isrFunctions`.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration.
+    data : `lsst.pipe.base.Struct`
+        Simulated data from `makeBenchmarkData`.
+
+    Returns
+    -------
+    records : `list` [`dict`]
+        Measurement records of the fastest run of each function.
+    """
+    calibs = data.calibs
+    isrConfig = makeBenchmarkIsrConfig(data.raw.getFilter().getName())
+    task = IsrTask(config=isrConfig)
+
+    # The detrending functions operate on the assembled, overscan
+    # corrected image, approximated here by the flat-fielded sky.
+    raw = data.raw.clone()
+    raw = task.convertIntToFloat(raw)
+    amp = raw.getDetector()[0]
+    assembled = task.assembleCcd.assembleCcd(raw.clone())
+    bias = calibs["bias"].getMaskedImage()
+    dark = calibs["dark"].getMaskedImage()
+    flat = calibs["flat"].getMaskedImage()
+
+    def image():
+        return dict(maskedImage=assembled.getMaskedImage().clone())
+
+    def exposure():
+        return dict(exposure=assembled.clone())
+
+    overscanImage = raw.getMaskedImage()[amp.getRawHorizontalOverscanBBox()]
+
+    def overscan():
+        return dict(image=overscanImage)
+
+    def overscanTask(fitType):
+        overscanConfig = OverscanCorrectionTask.ConfigClass()
+        overscanConfig.fitType = fitType
+        return OverscanCorrectionTask(config=overscanConfig)
+
+    benchmarks = [
+        ("isrFunctions.overscanCorrection",
+         lambda: dict(ampMaskedImage=raw.getMaskedImage()[amp.getRawDataBBox()].clone(),
+                      overscanImage=raw.getMaskedImage()[amp.getRawHorizontalOverscanBBox()].clone()),
+         lambda **kw: isrFunctions.overscanCorrection(fitType=isrConfig.overscan.fitType,
+                                                      order=isrConfig.overscan.order, **kw)),
+        ("OverscanCorrectionTask.measureVectorOverscan(POLY)", overscan,
+         overscanTask("POLY").measureVectorOverscan),
+        ("OverscanCorrectionTask.measureVectorOverscan(MEDIAN_PER_ROW)", overscan,
+         overscanTask("MEDIAN_PER_ROW").measureVectorOverscan),
+        ("isrFunctions.biasCorrection", image,
+         lambda maskedImage: isrFunctions.biasCorrection(maskedImage, bias)),
+        ("isrFunctions.updateVariance", image,
+         lambda maskedImage: isrFunctions.updateVariance(maskedImage, gain=1.0, readNoise=5.0)),
+        ("isrFunctions.darkCorrection", image,
+         lambda maskedImage: isrFunctions.darkCorrection(maskedImage, dark, expScale=5.0, darkScale=1.0)),
+        ("isrFunctions.flatCorrection", image,
+         lambda maskedImage: isrFunctions.flatCorrection(maskedImage, flat, "USER")),
+        ("isrFunctions.detrendCorrection", image,
+         lambda maskedImage: isrFunctions.detrendCorrection(maskedImage, biasMaskedImage=bias,
+                                                            darkMaskedImage=dark, flatMaskedImage=flat,
+                                                            expScale=5.0, gain=1.0, readNoise=5.0)),
+        ("isrFunctions.makeThresholdMask", image,
+         lambda maskedImage: isrFunctions.makeThresholdMask(maskedImage, threshold=9000.0,
+                                                            growFootprints=0)),
+        ("isrFunctions.interpolateFromMask",
+         lambda: dict(exposure=_maskDefects(task, assembled, calibs["defects"])),
+         lambda exposure: isrFunctions.interpolateFromMask(exposure.getMaskedImage(), isrConfig.fwhm,
+                                                           maskNameList=["BAD"])),
+        ("isrFunctions.brighterFatterCorrection", exposure,
+         lambda exposure: isrFunctions.brighterFatterCorrection(exposure, calibs["bfKernel"],
+                                                                isrConfig.brighterFatterMaxIter,
+                                                                isrConfig.brighterFatterThreshold,
+                                                                isrConfig.brighterFatterApplyGain)),
+        ("IsrTask.lowMemoryBrighterFatterCorrection", exposure,
+         lambda exposure: task.lowMemoryBrighterFatterCorrection(exposure, calibs["flat"], calibs["dark"],
+                                                                 calibs["bfKernel"], None)),
+    ]
+    return [_timeCall(name, config.repeat, setup, function) for name, setup, function in benchmarks]
+
+
+def _maskDefects(task, exposure, defects):
+    """Return a copy of an exposure with its defects masked.
+    """
+    exposure = exposure.clone()
+    task.maskDefect(exposure, defects)
+    return exposure
+
+
+def _brighterFatterPeakRss(isrConfig, dataDir):
+    """Measure the increase of the peak resident set size of this process
+    while applying the brighter fatter correction.
+
+    This is run in a fresh process by `measureBrighterFatterMemory`, after
+    reading only its inputs, so that the peak is set by the correction.
+    """
+    exposure = afwImage.ExposureF(os.path.join(dataDir, "exposure.fits"))
+    flat = afwImage.ExposureF(os.path.join(dataDir, "flat.fits"))
+    dark = afwImage.ExposureF(os.path.join(dataDir, "dark.fits"))
+    bfKernel = np.load(os.path.join(dataDir, "bfKernel.npy"))
+    task = IsrTask(config=isrConfig)
+    startRss = getMaxRss()
+    task.brighterFatterCorrection(exposure, flat, dark, bfKernel, None)
+    return getMaxRss() - startRss
+
+
+def measureBrighterFatterMemory(config, data):
+    """Measure the peak memory used by the default and low-memory
+    brighter fatter corrections.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration.
+    data : `lsst.pipe.base.Struct`
+        Simulated data from `makeBenchmarkData`.
+
+    Returns
+    -------
+    memory : `dict`
+        Measurements, in bytes, with keys:
+        - ``brighterFatterPeak`` : increase of the peak resident set
+          size while applying the default correction (`int`).
+        - ``brighterFatterLowMemoryPeak`` : the same, with
+          ``brighterFatterLowMemory`` set (`int`).
+        - ``brighterFatterSaved`` : ``brighterFatterPeak`` minus
+          ``brighterFatterLowMemoryPeak`` (`int`).
+
+    Notes
+    -----
+    The peak resident set size of a process can only grow, so each
+    correction is applied in a new process, to the exposure as processed
+    by `lsst.ip.isr.IsrTask.run` up to the brighter fatter correction.
+    The peak of the fastest of ``config.repeat`` runs is not meaningful,
+    so each correction is measured once.
+    """
+    isrConfig = makeBenchmarkIsrConfig(data.raw.getFilter().getName())
+    isrConfig.doBrighterFatter = False
+    isrConfig.doStageTiming = False
+    exposure = IsrTask(config=isrConfig).run(data.raw.clone(), **data.calibs).exposure
+    isrConfig.doBrighterFatter = True
+
+    memory = dict()
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tempDir:
+        exposure.writeFits(os.path.join(tempDir, "exposure.fits"))
+        data.calibs["flat"].writeFits(os.path.join(tempDir, "flat.fits"))
+        data.calibs["dark"].writeFits(os.path.join(tempDir, "dark.fits"))
+        np.save(os.path.join(tempDir, "bfKernel.npy"), data.calibs["bfKernel"])
+        for key, lowMemory in (("brighterFatterPeak", False), ("brighterFatterLowMemoryPeak", True)):
+            isrConfig.brighterFatterLowMemory = lowMemory
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                memory[key] = executor.submit(_brighterFatterPeakRss, isrConfig, tempDir).result()
+    memory["brighterFatterSaved"] = memory["brighterFatterPeak"] - memory["brighterFatterLowMemoryPeak"]
+    return memory
+
+
+def runBenchmarks(config):
+    """Run all the benchmarks.
+
+    Parameters
+    ----------
+    config : `IsrBenchmarkConfig`
+        Benchmark configuration.
+
+    Returns
+    -------
+    results : `dict`
+        Machine-readable results, with a ``metadata`` entry describing
+        the environment and detector, a ``benchmarks`` entry mapping
+        each benchmark name to its measurement record, and a ``memory``
+        entry from `measureBrighterFatterMemory`.
+    """
+    data = makeBenchmarkData(config)
+    filterName = data.raw.getFilter().getName()
+
+    records = runIsrBenchmark(config, data, makeBenchmarkIsrConfig(filterName))
+    lowMemoryConfig = makeBenchmarkIsrConfig(filterName)
+    lowMemoryConfig.brighterFatterLowMemory = True
+    records += runIsrBenchmark(config, data, lowMemoryConfig, name="IsrTask.run(brighterFatterLowMemory)")
+    records += runFunctionBenchmarks(config, data)
+
+    detectorBBox = data.camera[0].getBBox()
+    metadata = dict(date=datetime.datetime.now().isoformat(),
+                    host=platform.node(),
+                    python=platform.python_version(),
+                    numpy=np.__version__,
+                    detectorWidth=detectorBBox.getWidth(),
+                    detectorHeight=detectorBBox.getHeight(),
+                    nAmp=len(data.camera[0]),
+                    nDefects=len(data.calibs["defects"]),
+                    config=config.toDict())
+    benchmarks = dict()
+    for record in records:
+        record = dict(record)
+        benchmarks[record.pop("stage")] = record
+    return dict(metadata=metadata, benchmarks=benchmarks, memory=measureBrighterFatterMemory(config, data))
+
+
+def compareBenchmarks(results, baseline, threshold=0.1, key="wallTime", minValue=0.01):
+    """Find the benchmarks that regressed relative to a baseline.
+
+    Parameters
+    ----------
+    results : `dict`
+        Results of `runBenchmarks`.
+    baseline : `dict`
+        Stored results of an earlier `runBenchmarks`.
+    threshold : `float`, optional
+        Fractional increase above which a benchmark has regressed.
+    key : `str`, optional
+        Measurement to compare.
+    minValue : `float`, optional
+        Baseline values below this are too small to compare reliably
+        and are ignored.
+
+    Returns
+    -------
+    regressions : `list` [`tuple`]
+        ``(name, baselineValue, value, fractionalChange)`` for each
+        regressed benchmark, worst first.
+    """
+    regressions = []
+    for name, record in results["benchmarks"].items():
+        baseRecord = baseline["benchmarks"].get(name)
+        if baseRecord is None or key not in record or key not in baseRecord:
+            continue
+        baseValue, value = baseRecord[key], record[key]
+        if baseValue < minValue:
+            continue
+        change = (value - baseValue)/baseValue
+        if change > threshold:
+            regressions.append((name, baseValue, value, change))
+    return sorted(regressions, key=lambda regression: regression[3], reverse=True)
+
+
+def _printResults(results, stream):
+    for name, record in results["benchmarks"].items():
+        print(f"{name:60s} {record['wallTime']:10.3f} s {record['cpuTime']:10.3f} s CPU", file=stream)
+    for name, value in results.get("memory", {}).items():
+        print(f"{name:60s} {value/2**20:10.1f} MiB", file=stream)
+
+
+def main(argv=None):
+    """Run the benchmarks, or compare results with a baseline, from the
+    command line.
+
+    Parameters
+    ----------
+    argv : `list` [`str`], optional
+        Command line arguments.  Defaults to `sys.argv`.
+
+    Returns
+    -------
+    status : `int`
+        Exit status: 1 if any benchmark regressed, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark IsrTask on simulated production-scale data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runParser = subparsers.add_parser("run", help="Run the benchmarks.")
+    runParser.add_argument("--output", help="Write the results to this JSON file.")
+    runParser.add_argument("--baseline", help="Compare the results with this JSON file.")
+    runParser.add_argument("--config", nargs="*", default=[], metavar="NAME=VALUE",
+                           help="Override IsrBenchmarkConfig fields, e.g. repeat=5.")
+
+    compareParser = subparsers.add_parser("compare", help="Compare stored results with a baseline.")
+    compareParser.add_argument("results", help="JSON file of results.")
+    compareParser.add_argument("baseline", help="JSON file of baseline results.")
+
+    for subparser in (runParser, compareParser):
+        subparser.add_argument("--threshold", type=float, default=0.1,
+                               help="Fractional slowdown reported as a regression.")
+        subparser.add_argument("--key", default="wallTime", choices=("wallTime", "cpuTime"),
+                               help="Measurement to compare: wallTime or cpuTime.")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        config = IsrBenchmarkConfig()
+        for override in args.config:
+            name, value = override.split("=", 1)
+            setattr(config, name, type(getattr(config, name))(value))
+        results = runBenchmarks(config)
+        _printResults(results, sys.stdout)
+        if args.output:
+            with open(args.output, "w") as outFile:
+                json.dump(results, outFile, indent=2)
+        if not args.baseline:
+            return 0
+        baselineFile = args.baseline
+    else:
+        with open(args.results) as inFile:
+            results = json.load(inFile)
+        baselineFile = args.baseline
+
+    with open(baselineFile) as inFile:
+        baseline = json.load(inFile)
+    regressions = compareBenchmarks(results, baseline, threshold=args.threshold, key=args.key)
+    for name, baseValue, value, change in regressions:
+        print(f"REGRESSION {name}: {args.key} {baseValue:.4g} -> {value:.4g} ({change:+.1%})")
+    return 1 if regressions else 0
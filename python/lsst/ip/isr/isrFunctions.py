@@ -35,6 +35,7 @@ from contextlib import contextmanager
 
 from .overscan import OverscanCorrectionTask, OverscanCorrectionTaskConfig
 from .defects import Defects
+from .ampStatistics import AmpStatisticsCache
 
 
 def createPsf(fwhm):
@@ -391,6 +392,37 @@ def flatCorrection(maskedImage, flatMaskedImage, scalingType, userScale=1.0, inv
         raise RuntimeError("maskedImage bbox %s != flatMaskedImage bbox %s" %
                            (maskedImage.getBBox(afwImage.LOCAL), flatMaskedImage.getBBox(afwImage.LOCAL)))
 
+    flatScale = computeFlatScale(flatMaskedImage, scalingType, userScale=userScale)
+
+    if not invert:
+        maskedImage.scaledDivides(1.0/flatScale, flatMaskedImage)
+    else:
+        maskedImage.scaledMultiplies(1.0/flatScale, flatMaskedImage)
+
+
+def computeFlatScale(flatMaskedImage, scalingType, userScale=1.0):
+    """Determine the scale to apply to a flat.
+
+    Parameters
+    ----------
+    flatMaskedImage : `lsst.afw.image.MaskedImage`
+        Flat image to measure.
+    scalingType : str
+        Flat scale computation method.  Allowed values are 'MEAN',
+        'MEDIAN', or 'USER'.
+    userScale : scalar, optional
+        Scale to use if ``scalingType``='USER'.
+
+    Returns
+    -------
+    flatScale : `float`
+        Scale of the flat; the image is divided by ``flat/flatScale``.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if ``scalingType`` is not an allowed value.
+    """
     # Figure out scale from the data
     # Ideally the flats are normalized by the calibration product pipeline, but this allows some flexibility
     # in the case that the flat is created by some other mechanism.
@@ -401,11 +433,134 @@ def flatCorrection(maskedImage, flatMaskedImage, scalingType, userScale=1.0, inv
         flatScale = userScale
     else:
         raise RuntimeError('%s : %s not implemented' % ("flatCorrection", scalingType))
+    return flatScale
 
-    if not invert:
-        maskedImage.scaledDivides(1.0/flatScale, flatMaskedImage)
-    else:
-        maskedImage.scaledMultiplies(1.0/flatScale, flatMaskedImage)
+
+def detrendCorrection(maskedImage, biasMaskedImage=None, darkMaskedImage=None, flatMaskedImage=None,
+                      expScale=1.0, darkScale=1.0, flatScale=1.0, gain=None, readNoise=0.0,
+                      rowsPerChunk=256, nanMaskVal=None):
+    """Apply bias, dark and flat corrections in place in a single pass.
+
+    This gives the same result as calling `biasCorrection`,
+    `updateVariance` (if ``gain`` is set), `darkCorrection` and
+    `flatCorrection` (with a 'USER' scale of ``flatScale``) in turn,
+    but traverses the image, mask and variance arrays only once.  The
+    arrays are processed in blocks of ``rowsPerChunk`` rows, so that
+    all corrections are applied while a block is still in cache.
+
+    Parameters
+    ----------
+    maskedImage : `lsst.afw.image.MaskedImage`
+        Image to process.  The image is modified by this method.
+    biasMaskedImage : `lsst.afw.image.MaskedImage`, optional
+        Bias image of the same size as ``maskedImage``.
+    darkMaskedImage : `lsst.afw.image.MaskedImage`, optional
+        Dark image of the same size as ``maskedImage``.
+    flatMaskedImage : `lsst.afw.image.MaskedImage`, optional
+        Flat image of the same size as ``maskedImage``.
+    expScale : scalar, optional
+        Dark exposure time for ``maskedImage``.
+    darkScale : scalar, optional
+        Dark exposure time for ``darkMaskedImage``.
+    flatScale : scalar, optional
+        Scale of the flat, as returned by `computeFlatScale`.
+    gain : scalar, optional
+        The amplifier gain in electrons/ADU.  If set, the variance
+        plane is recomputed from the bias-corrected image, as in
+        `updateVariance`.
+    readNoise : scalar, optional
+        The amplifier read noise in ADU/pixel.  Only used if ``gain``
+        is set.
+    rowsPerChunk : `int`, optional
+        Number of rows to process at a time.
+    nanMaskVal : `int`, optional
+        If set, this mask value is set for the pixels whose image or
+        variance is not finite after the bias and variance corrections,
+        as `lsst.ip.isr.maskNans` would set it before the dark and flat
+        corrections.
+
+    Returns
+    -------
+    numNans : `int`
+        Number of pixels masked with ``nanMaskVal``; zero if it is not
+        set.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if ``maskedImage`` and the calibration images do not
+        have the same size.
+
+    Notes
+    -----
+    The corrections are applied by calculating:
+        maskedImage = (maskedImage - bias - dark * expScale / darkScale) / (flat / flatScale)
+    with the variance and mask planes propagated as for the
+    individual corrections.  The arithmetic is done in the pixel type
+    of ``maskedImage``, so the results agree with the sequential
+    corrections to within floating point rounding.
+    """
+    bbox = maskedImage.getBBox(afwImage.LOCAL)
+    for name, calib in (("bias", biasMaskedImage), ("dark", darkMaskedImage), ("flat", flatMaskedImage)):
+        if calib is not None and calib.getBBox(afwImage.LOCAL) != bbox:
+            raise RuntimeError("maskedImage bbox %s != %sMaskedImage bbox %s" %
+                               (bbox, name, calib.getBBox(afwImage.LOCAL)))
+
+    image = maskedImage.image.array
+    mask = maskedImage.mask.array
+    variance = maskedImage.variance.array
+
+    darkFactor = expScale / darkScale
+    flatFactor = 1.0 / flatScale
+
+    numRows = image.shape[0]
+    scratch = numpy.empty((min(rowsPerChunk, numRows), image.shape[1]), dtype=image.dtype)
+    scratch2 = numpy.empty_like(scratch) if flatMaskedImage is not None else None
+
+    numNans = 0
+    for y0 in range(0, numRows, rowsPerChunk):
+        rows = slice(y0, y0 + rowsPerChunk)
+        imageRows = image[rows]
+        maskRows = mask[rows]
+        varianceRows = variance[rows]
+        tmp = scratch[:imageRows.shape[0]]
+
+        if biasMaskedImage is not None:
+            imageRows -= biasMaskedImage.image.array[rows]
+            maskRows |= biasMaskedImage.mask.array[rows]
+            if gain is None:
+                varianceRows += biasMaskedImage.variance.array[rows]
+
+        if gain is not None:
+            numpy.divide(imageRows, gain, out=varianceRows)
+            varianceRows += readNoise**2
+
+        if nanMaskVal is not None:
+            nans = ~(numpy.isfinite(imageRows) & numpy.isfinite(varianceRows))
+            maskRows[nans] |= nanMaskVal
+            numNans += int(numpy.count_nonzero(nans))
+
+        if darkMaskedImage is not None:
+            numpy.multiply(darkMaskedImage.image.array[rows], darkFactor, out=tmp)
+            imageRows -= tmp
+            maskRows |= darkMaskedImage.mask.array[rows]
+            numpy.multiply(darkMaskedImage.variance.array[rows], darkFactor**2, out=tmp)
+            varianceRows += tmp
+
+        if flatMaskedImage is not None:
+            tmp2 = scratch2[:imageRows.shape[0]]
+            numpy.multiply(flatMaskedImage.image.array[rows], flatFactor, out=tmp)
+            imageRows /= tmp
+            maskRows |= flatMaskedImage.mask.array[rows]
+            # var' = (var + image'**2 * flatVar * flatFactor**2) / (flat * flatFactor)**2
+            numpy.multiply(imageRows, imageRows, out=tmp2)
+            tmp2 *= flatMaskedImage.variance.array[rows]
+            tmp2 *= flatFactor**2
+            varianceRows += tmp2
+            varianceRows /= tmp
+            varianceRows /= tmp
+
+    return numNans
 
 
 def illuminationCorrection(maskedImage, illumMaskedImage, illumScale, trimToFit=True):
@@ -516,14 +671,14 @@ def overscanCorrection(ampMaskedImage, overscanImage, fitType='MEDIAN', order=1,
     return overscanTask.run(ampImage, overscanImage)
 
 
-def brighterFatterCorrection(exposure, kernel, maxIter, threshold, applyGain, gains=None):
+def brighterFatterCorrection(exposure, kernel, maxIter, threshold, applyGain, gains=None, image=None):
     """Apply brighter fatter correction in place for the image.
 
     Parameters
     ----------
     exposure : `lsst.afw.image.Exposure`
         Exposure to have brighter-fatter correction applied.  Modified
-        by this method.
+        by this method, unless ``image`` is set.
     kernel : `numpy.ndarray`
         Brighter-fatter kernel to apply.
     maxIter : scalar
@@ -537,6 +692,10 @@ def brighterFatterCorrection(exposure, kernel, maxIter, threshold, applyGain, ga
     gains : `dict` [`str`, `float`]
         A dictionary, keyed by amplifier name, of the gains to use.
         If gains is None, the nominal gains in the amplifier object are used.
+    image : `lsst.afw.image.Image`, optional
+        Image to correct in place instead of the image plane of
+        ``exposure``, which then only supplies the detector.  It must
+        have the same bounding box as ``exposure``.
 
     Returns
     -------
@@ -574,7 +733,8 @@ def brighterFatterCorrection(exposure, kernel, maxIter, threshold, applyGain, ga
     The edges as defined by the kernel are not corrected because they
     have spurious values due to the convolution.
     """
-    image = exposure.getMaskedImage().getImage()
+    if image is None:
+        image = exposure.getMaskedImage().getImage()
 
     # The image needs to be units of electrons/holes
     with gainContext(exposure, image, applyGain, gains):
@@ -743,7 +903,7 @@ def attachTransmissionCurve(exposure, opticsTransmission=None, filterTransmissio
     return combined
 
 
-def applyGains(exposure, normalizeGains=False):
+def applyGains(exposure, normalizeGains=False, ampStatistics=None):
     """Scale an exposure by the amplifier gains.
 
     Parameters
@@ -753,24 +913,29 @@ def applyGains(exposure, normalizeGains=False):
     normalizeGains : `Bool`, optional
         If True, then amplifiers are scaled to force the median of
         each amplifier to equal the median of those medians.
+    ampStatistics : `lsst.ip.isr.AmpStatisticsCache`, optional
+        Statistics of ``exposure`` shared with other ISR stages.  The
+        amplifier medians are taken from it, and the statistics of the
+        scaled amplifiers are invalidated.
     """
     ccd = exposure.getDetector()
     ccdImage = exposure.getMaskedImage()
+    if ampStatistics is None:
+        ampStatistics = AmpStatisticsCache(ccdImage)
 
-    medians = []
     for amp in ccd:
         sim = ccdImage.Factory(ccdImage, amp.getBBox())
         sim *= amp.getGain()
-
-        if normalizeGains:
-            medians.append(numpy.median(sim.getImage().getArray()))
+        ampStatistics.invalidate(bbox=amp.getBBox())
 
     if normalizeGains:
+        medians = [ampStatistics.getArrayMedian(amp.getBBox()) for amp in ccd]
         median = numpy.median(numpy.array(medians))
         for index, amp in enumerate(ccd):
             sim = ccdImage.Factory(ccdImage, amp.getBBox())
             if medians[index] != 0.0:
                 sim *= median/medians[index]
+                ampStatistics.invalidate(bbox=amp.getBBox())
 
 
 def widenSaturationTrails(mask):
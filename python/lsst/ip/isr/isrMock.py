@@ -671,10 +671,9 @@ class IsrMock(pipeBase.Task):
         y0 : `float`
             Y-coordinate of the source peak.
         """
-        for x in range(0, ampData.getDimensions().getX()):
-            for y in range(0, ampData.getDimensions().getY()):
-                ampData.array[y][x] = (ampData.array[y][x]
-                                       + scale * np.exp(-0.5 * ((x - x0)**2 + (y - y0)**2) / 3.0**2))
+        y, x = np.ogrid[0:ampData.getDimensions().getY(), 0:ampData.getDimensions().getX()]
+        ampData.array[:] = (ampData.array
+                            + scale * np.exp(-0.5 * ((x - x0)**2 + (y - y0)**2) / 3.0**2))
 
     def amplifierAddCT(self, ampDataSource, ampDataTarget, scale):
         """Add a scaled copy of an amplifier to another, simulating crosstalk.
@@ -722,12 +721,13 @@ class IsrMock(pipeBase.Task):
         coordinates are in the frame of the amplifier, and (u, v) in
         the frame of the full trimmed image.
         """
-        for x in range(0, ampData.getDimensions().getX()):
-            for y in range(0, ampData.getDimensions().getY()):
-                (u, v) = self.localCoordToExpCoord(amp, x, y)
-                ampData.getArray()[y][x] = np.sum((ampData.getArray()[y][x]
-                                                   + scale * np.sinc(((u - x0) / 50)**2
-                                                                     + ((v - y0) / 50)**2)))
+        y, x = np.ogrid[0:ampData.getDimensions().getY(), 0:ampData.getDimensions().getX()]
+        (u, v) = self.localCoordToExpCoord(amp, x, y)
+        ampArr = ampData.getArray()
+        fringe = 0.0
+        for s, u0, v0 in zip(*np.broadcast_arrays(*np.atleast_1d(scale, x0, y0))):
+            fringe = fringe + (ampArr + s * np.sinc(((u - u0) / 50)**2 + ((v - v0) / 50)**2))
+        ampArr[:] = fringe
 
     def amplifierMultiplyFlat(self, amp, ampData, fracDrop, u0=100.0, v0=100.0):
         """Multiply an amplifier's image data by a flat-like pattern.
@@ -757,11 +757,10 @@ class IsrMock(pipeBase.Task):
 
         sigma = u0 / np.sqrt(-2.0 * np.log(fracDrop))
 
-        for x in range(0, ampData.getDimensions().getX()):
-            for y in range(0, ampData.getDimensions().getY()):
-                (u, v) = self.localCoordToExpCoord(amp, x, y)
-                f = np.exp(-0.5 * ((u - u0)**2 + (v - v0)**2) / sigma**2)
-                ampData.array[y][x] = (ampData.array[y][x] * f)
+        y, x = np.ogrid[0:ampData.getDimensions().getY(), 0:ampData.getDimensions().getX()]
+        (u, v) = self.localCoordToExpCoord(amp, x, y)
+        f = np.exp(-0.5 * ((u - u0)**2 + (v - v0)**2) / sigma**2)
+        ampData.array[:] = ampData.array * f
 
 
 class RawMock(IsrMock):
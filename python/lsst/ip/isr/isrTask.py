@@ -19,8 +19,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import itertools
 import math
 import numpy
+import queue
+import threading
+
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed, wait)
 
 import lsst.geom
 import lsst.afw.image as afwImage
@@ -29,11 +35,10 @@ import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import lsst.pipe.base.connectionTypes as cT
 
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from lsstDebug import getDebugFrame
 
-from lsst.afw.cameraGeom import (PIXELS, FOCAL_PLANE, NullLinearityType,
-                                 ReadoutCorner)
+from lsst.afw.cameraGeom import PIXELS, FOCAL_PLANE, NullLinearityType
 from lsst.afw.display import getDisplay
 from lsst.afw.geom import Polygon
 from lsst.daf.persistence import ButlerDataRef
@@ -45,12 +50,16 @@ from . import isrQa
 from . import linearize
 from .defects import Defects
 
+from .ampPlan import AmplifierPlan, getDetectorPlan
+from .ampStatistics import AmpStatisticsCache
 from .assembleCcdTask import AssembleCcdTask
+from .calibCache import getCalibCache
 from .crosstalk import CrosstalkTask, CrosstalkCalib
 from .fringe import FringeTask
 from .isr import maskNans
 from .masking import MaskingTask
-from .overscan import OverscanCorrectionTask
+from .overscan import OverscanCorrectionTask, OverscanStatistics
+from .stageTimer import StageTimer, measureStage
 from .straylight import StrayLightTask
 from .vignette import VignetteTask
 from lsst.daf.butler import DimensionGraph
@@ -340,6 +349,14 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         doc="Convert integer raw images to floating point values?",
         default=True,
     )
+    doLazyConvertIntToFloat = pexConfig.Field(
+        dtype=bool,
+        doc="Avoid full-image passes when converting integer raw images to floating point values? "
+            "The mask and variance planes are allocated without being written, so their memory is only "
+            "used once a stage sets them, and each amplifier is converted by the thread that then corrects "
+            "its overscan.  The variance is zero where `updateVariance` does not set it, rather than one.",
+        default=False,
+    )
 
     # Saturated pixel handling.
     doSaturation = pexConfig.Field(
@@ -496,6 +513,18 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         doc="Location of bias jump along y-axis.",
         default=0,
     )
+    numAmpWorkers = pexConfig.Field(
+        dtype=int,
+        doc="Number of threads used to mask and overscan correct independent amplifiers. "
+            "A value of 1 processes the amplifiers serially.",
+        default=1, check=lambda x: x > 0
+    )
+    doBatchOverscan = pexConfig.Field(
+        dtype=bool,
+        doc="Measure the overscans of all the amplifiers of a detector in one vectorized call? "
+            "The overscans are rejected, collapsed and fit together once every amplifier has been masked.",
+        default=False,
+    )
 
     # Amplifier to CCD assembly configuration
     doAssembleCcd = pexConfig.Field(
@@ -514,6 +543,14 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         default=False,
         doc="Assemble amp-level calibration exposures into ccd-level exposure?"
     )
+    calibCacheSize = pexConfig.Field(
+        dtype=int,
+        doc="Byte budget of the process-level cache of calibration products read by readIsrData. "
+            "Cached products are reused for later exposures with the same calibrations; 0 disables "
+            "the cache.  The process cache is sized to the largest budget requested by any task.",
+        default=0,
+        check=lambda x: x >= 0,
+    )
     doTrimToMatchCalib = pexConfig.Field(
         dtype=bool,
         default=False,
@@ -631,6 +668,12 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         default=True,
         doc="Should the gain be applied when applying the brighter fatter correction?"
     )
+    brighterFatterLowMemory = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Apply the brighter fatter correction using image-plane scratch buffers instead of two "
+        "full clones of the exposure?  The results are the same, with half the extra memory."
+    )
     brighterFatterMaskGrowSize = pexConfig.Field(
         dtype=int,
         default=0,
@@ -693,6 +736,19 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         default=False
     )
 
+    # Fused bias, dark and flat correction.
+    doFusedDetrend = pexConfig.Field(
+        dtype=bool,
+        doc="Apply the bias, variance, dark and flat corrections in a single pass over the pixels, "
+            "if no intervening step needs the intermediate image?  See IsrTask.canFuseDetrend.",
+        default=False,
+    )
+    fusedDetrendRowsPerChunk = pexConfig.Field(
+        dtype=int,
+        doc="Number of image rows processed at a time by the fused bias, dark and flat correction.",
+        default=256, check=lambda x: x > 0
+    )
+
     # Amplifier normalization based on gains instead of using flats configuration.
     doApplyGains = pexConfig.Field(
         dtype=bool,
@@ -851,12 +907,32 @@ class IsrTaskConfig(pipeBase.PipelineTaskConfig,
         doc="Only perform illumination correction for these filters."
     )
 
+    # Stage instrumentation.
+    doStageTiming = pexConfig.Field(
+        dtype=bool,
+        doc="Record the wall time, CPU time and memory use of each ISR stage in the task metadata?",
+        default=False,
+    )
+    stageTimingFile = pexConfig.Field(
+        dtype=str,
+        doc="If set, write the resource usage of each ISR stage to this JSON file for every exposure. "
+            "The name may contain {exposureId} and {detector} fields.",
+        default=None,
+        optional=True,
+    )
+
     # Write the outputs to disk.  If ISR is run as a subtask, this may not be needed.
     doWrite = pexConfig.Field(
         dtype=bool,
         doc="Persist postISRCCD?",
         default=True,
     )
+    prefetchDepth = pexConfig.Field(
+        dtype=int,
+        doc="Number of exposures read ahead, and of results waiting to be written, by runDataRefs. "
+            "This bounds the number of exposures held in memory.",
+        default=1, check=lambda x: x > 0
+    )
 
     def validate(self):
         super().validate()
@@ -912,6 +988,7 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         self.makeSubtask("masking")
         self.makeSubtask("overscan")
         self.makeSubtask("vignette")
+        self.calibCache = getCalibCache(self.config.calibCacheSize)
 
     def runQuantum(self, butlerQC, inputRefs, outputRefs):
         inputs = butlerQC.get(inputRefs)
@@ -1065,7 +1142,8 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         biasExposure = (self.getIsrExposure(dataRef, self.config.biasDataProductName)
                         if self.config.doBias else None)
         # immediate=True required for functors and linearizers are functors; see ticket DM-6515
-        linearizer = (dataRef.get("linearizer", immediate=True)
+        linearizer = (self.getCachedCalib(dataRef, "linearizer",
+                                          lambda: dataRef.get("linearizer", immediate=True))
                       if self.doLinearize(ccd) else None)
         if linearizer is not None and not isinstance(linearizer, numpy.ndarray):
             linearizer.log = self.log
@@ -1096,12 +1174,14 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
                 # Use the new-style cp_pipe version of the kernel if it exists
                 # If using a new-style kernel, always use the self-consistent
                 # gains, i.e. the ones inside the kernel object itself
-                brighterFatterKernel = dataRef.get("brighterFatterKernel")
+                brighterFatterKernel = self.getCachedCalib(dataRef, "brighterFatterKernel",
+                                                           lambda: dataRef.get("brighterFatterKernel"))
                 brighterFatterGains = brighterFatterKernel.gain
                 self.log.info("New style bright-fatter kernel (brighterFatterKernel) loaded")
             except NoResults:
                 try:  # Fall back to the old-style numpy-ndarray style kernel if necessary.
-                    brighterFatterKernel = dataRef.get("bfKernel")
+                    brighterFatterKernel = self.getCachedCalib(dataRef, "bfKernel",
+                                                               lambda: dataRef.get("bfKernel"))
                     self.log.info("Old style bright-fatter kernel (np.array) loaded")
                 except NoResults:
                     brighterFatterKernel = None
@@ -1119,10 +1199,12 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
                     # TODO DM-15631 for implementing this
                     raise NotImplementedError("Per-amplifier brighter-fatter correction not implemented")
 
-        defectList = (dataRef.get("defects")
+        defectList = (self.getCachedCalib(dataRef, "defects", lambda: dataRef.get("defects"))
                       if self.config.doDefect else None)
-        fringeStruct = (self.fringe.readFringes(dataRef, assembler=self.assembleCcd
-                                                if self.config.doAssembleIsrExposures else None)
+        fringeStruct = (self.getCachedCalib(dataRef, "fringe",
+                                            lambda: self.fringe.readFringes(
+                                                dataRef, assembler=self.assembleCcd
+                                                if self.config.doAssembleIsrExposures else None))
                         if self.config.doFringe and self.fringe.checkFilter(rawExposure)
                         else pipeBase.Struct(fringes=None))
 
@@ -1321,6 +1403,8 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         if not ccd:
             assert not self.config.doAssembleCcd, "You need a Detector to run assembleCcd."
             ccd = [FakeAmp(ccdExposure, self.config)]
+        ampPlans = getDetectorPlan(ccd, self.config)
+        ampsByName = {amp.getName(): amp for amp in ccd}
 
         # Validate Input
         if self.config.doBias and bias is None:
@@ -1347,253 +1431,302 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             raise RuntimeError("Must supply an illumcor if config.doIlluminationCorrection=True.")
 
         # Begin ISR processing.
+        stageTimer = StageTimer(enabled=self.config.doStageTiming or bool(self.config.stageTimingFile))
+        # Amplifiers to process.  If ccdExposure is a single amplifier,
+        # check for coverage to prevent performing ops multiple times.
+        ampList = []
+        for ampPlan in ampPlans:
+            if ccdExposure.getBBox().contains(ampPlan.bbox):
+                ampList.append(ampPlan)
+            else:
+                self.log.info("Skipped OSCAN for %s.", ampPlan.name)
+
+        rawExposure = None
         if self.config.doConvertIntToFloat:
-            self.log.info("Converting exposure to floating point values.")
-            ccdExposure = self.convertIntToFloat(ccdExposure)
+            with stageTimer.time("CONVERT"):
+                self.log.info("Converting exposure to floating point values.")
+                deferImage = self.canDeferConversion(ccdExposure, ampList)
+                if deferImage:
+                    rawExposure = ccdExposure
+                ccdExposure = self.convertIntToFloat(ccdExposure, deferImage=deferImage)
 
         if self.config.doBias and self.config.doBiasBeforeOverscan:
-            self.log.info("Applying bias correction.")
-            isrFunctions.biasCorrection(ccdExposure.getMaskedImage(), bias.getMaskedImage(),
-                                        trimToFit=self.config.doTrimToMatchCalib)
-            self.debugView(ccdExposure, "doBias")
+            with stageTimer.time("BIAS"):
+                self.log.info("Applying bias correction.")
+                isrFunctions.biasCorrection(ccdExposure.getMaskedImage(), bias.getMaskedImage(),
+                                            trimToFit=self.config.doTrimToMatchCalib)
+                self.debugView(ccdExposure, "doBias")
+
+        # Check for fully masked bad amplifiers, generate masks for SUSPECT and SATURATED values,
+        # and correct the overscan.  This may be done in parallel, but the metadata is always
+        # recorded below in amplifier order.
+        ampResults = self.processAmplifiers(ccdExposure, ampList, defects, rawExposure=rawExposure,
+                                            stageTimer=stageTimer, detector=ccd)
 
-        # Amplifier level processing.
         overscans = []
-        for amp in ccd:
-            # if ccdExposure is one amp, check for coverage to prevent performing ops multiple times
-            if ccdExposure.getBBox().contains(amp.getBBox()):
-                # Check for fully masked bad amplifiers, and generate masks for SUSPECT and SATURATED values.
-                badAmp = self.maskAmplifier(ccdExposure, amp, defects)
+        for ampPlan, ampResult in zip(ampList, ampResults):
+            amp = ampsByName[ampPlan.name]
+            stageTimer.add(ampResult.timing)
+            overscanResults = ampResult.overscanResults
+            if self.config.doOverscan and not ampResult.badAmp:
+                if overscanResults is not None:
+                    self.setOverscanMetadata(ccdExposure, amp, overscanResults)
+                self.log.debug("Corrected overscan for amplifier %s.", amp.getName())
+                if overscanResults is not None and \
+                   self.config.qa is not None and self.config.qa.saveStats is True:
+                    # The QA statistics use the default statistics control,
+                    # unlike the overscan metadata and the read noise.
+                    statistics = self.getOverscanStatistics(overscanResults)
+                    fitStats = statistics.getFitStatistics(afwMath.StatisticsControl())
+                    qaMedian = fitStats.median
+                    if isinstance(overscanResults.overscanFit, float):
+                        qaStdev = float("NaN")
+                    else:
+                        qaStdev = fitStats.stdev
 
-                if self.config.doOverscan and not badAmp:
-                    # Overscan correction on amp-by-amp basis.
-                    overscanResults = self.overscanCorrection(ccdExposure, amp)
-                    self.log.debug("Corrected overscan for amplifier %s.", amp.getName())
-                    if overscanResults is not None and \
-                       self.config.qa is not None and self.config.qa.saveStats is True:
-                        if isinstance(overscanResults.overscanFit, float):
-                            qaMedian = overscanResults.overscanFit
-                            qaStdev = float("NaN")
-                        else:
-                            qaStats = afwMath.makeStatistics(overscanResults.overscanFit,
-                                                             afwMath.MEDIAN | afwMath.STDEVCLIP)
-                            qaMedian = qaStats.getValue(afwMath.MEDIAN)
-                            qaStdev = qaStats.getValue(afwMath.STDEVCLIP)
-
-                        self.metadata.set(f"FIT MEDIAN {amp.getName()}", qaMedian)
-                        self.metadata.set(f"FIT STDEV {amp.getName()}", qaStdev)
-                        self.log.debug("  Overscan stats for amplifer %s: %f +/- %f",
-                                       amp.getName(), qaMedian, qaStdev)
-
-                        # Residuals after overscan correction
-                        qaStatsAfter = afwMath.makeStatistics(overscanResults.overscanImage,
-                                                              afwMath.MEDIAN | afwMath.STDEVCLIP)
-                        qaMedianAfter = qaStatsAfter.getValue(afwMath.MEDIAN)
-                        qaStdevAfter = qaStatsAfter.getValue(afwMath.STDEVCLIP)
-
-                        self.metadata.set(f"RESIDUAL MEDIAN {amp.getName()}", qaMedianAfter)
-                        self.metadata.set(f"RESIDUAL STDEV {amp.getName()}", qaStdevAfter)
-                        self.log.debug("  Overscan stats for amplifer %s after correction: %f +/- %f",
-                                       amp.getName(), qaMedianAfter, qaStdevAfter)
-
-                        ccdExposure.getMetadata().set('OVERSCAN', "Overscan corrected")
-                else:
-                    if badAmp:
-                        self.log.warn("Amplifier %s is bad.", amp.getName())
-                    overscanResults = None
+                    self.metadata.set(f"FIT MEDIAN {amp.getName()}", qaMedian)
+                    self.metadata.set(f"FIT STDEV {amp.getName()}", qaStdev)
+                    self.log.debug("  Overscan stats for amplifer %s: %f +/- %f",
+                                   amp.getName(), qaMedian, qaStdev)
 
-                overscans.append(overscanResults if overscanResults is not None else None)
-            else:
-                self.log.info("Skipped OSCAN for %s.", amp.getName())
+                    # Residuals after overscan correction
+                    residualStats = statistics.getResidualStatistics(afwMath.StatisticsControl())
+                    qaMedianAfter = residualStats.median
+                    qaStdevAfter = residualStats.stdev
+
+                    self.metadata.set(f"RESIDUAL MEDIAN {amp.getName()}", qaMedianAfter)
+                    self.metadata.set(f"RESIDUAL STDEV {amp.getName()}", qaStdevAfter)
+                    self.log.debug("  Overscan stats for amplifer %s after correction: %f +/- %f",
+                                   amp.getName(), qaMedianAfter, qaStdevAfter)
+
+                    ccdExposure.getMetadata().set('OVERSCAN', "Overscan corrected")
+            elif ampResult.badAmp:
+                self.log.warn("Amplifier %s is bad.", amp.getName())
+
+            overscans.append(overscanResults)
 
         if self.config.doCrosstalk and self.config.doCrosstalkBeforeAssemble:
-            self.log.info("Applying crosstalk correction.")
-            self.crosstalk.run(ccdExposure, crosstalk=crosstalk,
-                               crosstalkSources=crosstalkSources)
-            self.debugView(ccdExposure, "doCrosstalk")
+            with stageTimer.time("CROSSTALK"):
+                self.log.info("Applying crosstalk correction.")
+                self.crosstalk.run(ccdExposure, crosstalk=crosstalk,
+                                   crosstalkSources=crosstalkSources)
+                self.debugView(ccdExposure, "doCrosstalk")
 
         if self.config.doAssembleCcd:
-            self.log.info("Assembling CCD from amplifiers.")
-            ccdExposure = self.assembleCcd.assembleCcd(ccdExposure)
+            with stageTimer.time("ASSEMBLE"):
+                self.log.info("Assembling CCD from amplifiers.")
+                ccdExposure = self.assembleCcd.assembleCcd(ccdExposure)
+
+                if self.config.expectWcs and not ccdExposure.getWcs():
+                    self.log.warn("No WCS found in input exposure.")
+                self.debugView(ccdExposure, "doAssembleCcd")
 
-            if self.config.expectWcs and not ccdExposure.getWcs():
-                self.log.warn("No WCS found in input exposure.")
-            self.debugView(ccdExposure, "doAssembleCcd")
+        # Amplifier statistics shared within the stages below.  Each
+        # stage that reads them first discards those of earlier stages,
+        # as any stage in between may have modified the pixels.
+        ampStatistics = AmpStatisticsCache(ccdExposure.getMaskedImage())
 
         ossThumb = None
         if self.config.qa.doThumbnailOss:
             ossThumb = isrQa.makeThumbnail(ccdExposure, isrQaConfig=self.config.qa)
 
-        if self.config.doBias and not self.config.doBiasBeforeOverscan:
-            self.log.info("Applying bias correction.")
-            isrFunctions.biasCorrection(ccdExposure.getMaskedImage(), bias.getMaskedImage(),
-                                        trimToFit=self.config.doTrimToMatchCalib)
-            self.debugView(ccdExposure, "doBias")
-
-        if self.config.doVariance:
-            for amp, overscanResults in zip(ccd, overscans):
-                if ccdExposure.getBBox().contains(amp.getBBox()):
-                    self.log.debug("Constructing variance map for amplifer %s.", amp.getName())
-                    ampExposure = ccdExposure.Factory(ccdExposure, amp.getBBox())
-                    if overscanResults is not None:
-                        self.updateVariance(ampExposure, amp,
-                                            overscanImage=overscanResults.overscanImage)
-                    else:
-                        self.updateVariance(ampExposure, amp,
-                                            overscanImage=None)
-                    if self.config.qa is not None and self.config.qa.saveStats is True:
-                        qaStats = afwMath.makeStatistics(ampExposure.getVariance(),
-                                                         afwMath.MEDIAN | afwMath.STDEVCLIP)
-                        self.metadata.set(f"ISR VARIANCE {amp.getName()} MEDIAN",
-                                          qaStats.getValue(afwMath.MEDIAN))
-                        self.metadata.set(f"ISR VARIANCE {amp.getName()} STDEV",
-                                          qaStats.getValue(afwMath.STDEVCLIP))
-                        self.log.debug("  Variance stats for amplifer %s: %f +/- %f.",
-                                       amp.getName(), qaStats.getValue(afwMath.MEDIAN),
-                                       qaStats.getValue(afwMath.STDEVCLIP))
+        fuseDetrend = False
+        if self.config.doFusedDetrend:
+            fuseDetrend = self.canFuseDetrend(ccd, exposure=ccdExposure)
+            if not fuseDetrend:
+                self.log.info("Configuration does not allow a fused detrend; applying corrections in turn.")
+        if fuseDetrend:
+            with stageTimer.time("DETREND"):
+                self.log.info("Applying fused bias, dark and flat correction.")
+                nanMaskVal = None
+                if self.config.doNanMasking:
+                    # The NaNs are masked within the fused correction, at
+                    # the point the separate NaN masking would see them.
+                    ccdExposure.getMask().addMaskPlane("UNMASKEDNAN")
+                    nanMaskVal = ccdExposure.getMask().getPlaneBitMask("UNMASKEDNAN")
+                numNans = self.detrendCorrection(ccdExposure, ccd, overscans,
+                                                 bias=bias if self.config.doBias else None,
+                                                 dark=dark if self.config.doDark else None,
+                                                 flat=flat if self.config.doFlat else None,
+                                                 nanMaskVal=nanMaskVal)
+                if nanMaskVal is not None:
+                    self.metadata.set("NUMNANS", numNans)
+                    if numNans > 0:
+                        self.log.warn("There were %d unmasked NaNs.", numNans)
+                self.debugView(ccdExposure, "doFusedDetrend")
+
+        if self.config.doBias and not self.config.doBiasBeforeOverscan and not fuseDetrend:
+            with stageTimer.time("BIAS"):
+                self.log.info("Applying bias correction.")
+                isrFunctions.biasCorrection(ccdExposure.getMaskedImage(), bias.getMaskedImage(),
+                                            trimToFit=self.config.doTrimToMatchCalib)
+                self.debugView(ccdExposure, "doBias")
+
+        if self.config.doVariance and not fuseDetrend:
+            with stageTimer.time("VARIANCE"):
+                ampStatistics.invalidate()
+                for ampPlan, overscanResults in zip(ampPlans, overscans):
+                    amp = ampsByName[ampPlan.name]
+                    if ccdExposure.getBBox().contains(ampPlan.bbox):
+                        self.log.debug("Constructing variance map for amplifer %s.", amp.getName())
+                        ampExposure = ccdExposure.Factory(ccdExposure, ampPlan.bbox)
+                        self.updateVariance(ampExposure, amp, overscanResults=overscanResults)
+                        ampStatistics.invalidate(planes=["variance"], bbox=ampPlan.bbox)
+                        if self.config.qa is not None and self.config.qa.saveStats is True:
+                            qaStats = ampStatistics.getStatistics(afwMath.MEDIAN | afwMath.STDEVCLIP,
+                                                                  bbox=ampPlan.bbox, plane="variance")
+                            self.metadata.set(f"ISR VARIANCE {amp.getName()} MEDIAN",
+                                              qaStats.getValue(afwMath.MEDIAN))
+                            self.metadata.set(f"ISR VARIANCE {amp.getName()} STDEV",
+                                              qaStats.getValue(afwMath.STDEVCLIP))
+                            self.log.debug("  Variance stats for amplifer %s: %f +/- %f.",
+                                           amp.getName(), qaStats.getValue(afwMath.MEDIAN),
+                                           qaStats.getValue(afwMath.STDEVCLIP))
 
         if self.doLinearize(ccd):
-            self.log.info("Applying linearizer.")
-            linearizer.applyLinearity(image=ccdExposure.getMaskedImage().getImage(),
-                                      detector=ccd, log=self.log)
+            with stageTimer.time("LINEARIZE"):
+                self.log.info("Applying linearizer.")
+                linearizer.applyLinearity(image=ccdExposure.getMaskedImage().getImage(),
+                                          detector=ccd, log=self.log)
 
         if self.config.doCrosstalk and not self.config.doCrosstalkBeforeAssemble:
-            self.log.info("Applying crosstalk correction.")
-            self.crosstalk.run(ccdExposure, crosstalk=crosstalk,
-                               crosstalkSources=crosstalkSources, isTrimmed=True)
-            self.debugView(ccdExposure, "doCrosstalk")
+            with stageTimer.time("CROSSTALK"):
+                self.log.info("Applying crosstalk correction.")
+                self.crosstalk.run(ccdExposure, crosstalk=crosstalk,
+                                   crosstalkSources=crosstalkSources, isTrimmed=True)
+                self.debugView(ccdExposure, "doCrosstalk")
 
         # Masking block. Optionally mask known defects, NAN pixels, widen trails, and do
         # anything else the camera needs. Saturated and suspect pixels have already been masked.
         if self.config.doDefect:
-            self.log.info("Masking defects.")
-            self.maskDefect(ccdExposure, defects)
+            with stageTimer.time("DEFECT"):
+                self.log.info("Masking defects.")
+                self.maskDefect(ccdExposure, defects)
 
-            if self.config.numEdgeSuspect > 0:
-                self.log.info("Masking edges as SUSPECT.")
-                self.maskEdges(ccdExposure, numEdgePixels=self.config.numEdgeSuspect,
-                               maskPlane="SUSPECT", level=self.config.edgeMaskLevel)
+                if self.config.numEdgeSuspect > 0:
+                    self.log.info("Masking edges as SUSPECT.")
+                    self.maskEdges(ccdExposure, numEdgePixels=self.config.numEdgeSuspect,
+                                   maskPlane="SUSPECT", level=self.config.edgeMaskLevel)
 
-        if self.config.doNanMasking:
-            self.log.info("Masking NAN value pixels.")
-            self.maskNan(ccdExposure)
+        if self.config.doNanMasking and not fuseDetrend:
+            with stageTimer.time("NANMASK"):
+                self.log.info("Masking NAN value pixels.")
+                self.maskNan(ccdExposure)
 
         if self.config.doWidenSaturationTrails:
-            self.log.info("Widening saturation trails.")
-            isrFunctions.widenSaturationTrails(ccdExposure.getMaskedImage().getMask())
+            with stageTimer.time("SATURATIONTRAILS"):
+                self.log.info("Widening saturation trails.")
+                isrFunctions.widenSaturationTrails(ccdExposure.getMaskedImage().getMask())
 
         if self.config.doCameraSpecificMasking:
-            self.log.info("Masking regions for camera specific reasons.")
-            self.masking.run(ccdExposure)
+            with stageTimer.time("CAMERAMASK"):
+                self.log.info("Masking regions for camera specific reasons.")
+                self.masking.run(ccdExposure)
 
         if self.config.doBrighterFatter:
-            # We need to apply flats and darks before we can interpolate, and we
-            # need to interpolate before we do B-F, but we do B-F without the
-            # flats and darks applied so we can work in units of electrons or holes.
-            # This context manager applies and then removes the darks and flats.
-            #
-            # We also do not want to interpolate values here, so operate on temporary
-            # images so we can apply only the BF-correction and roll back the
-            # interpolation.
-            interpExp = ccdExposure.clone()
-            with self.flatContext(interpExp, flat, dark):
-                isrFunctions.interpolateFromMask(
-                    maskedImage=interpExp.getMaskedImage(),
-                    fwhm=self.config.fwhm,
-                    growSaturatedFootprints=self.config.growSaturationFootprintSize,
-                    maskNameList=self.config.maskListToInterpolate
-                )
-            bfExp = interpExp.clone()
-
-            self.log.info("Applying brighter fatter correction using kernel type %s / gains %s.",
-                          type(bfKernel), type(bfGains))
-            bfResults = isrFunctions.brighterFatterCorrection(bfExp, bfKernel,
-                                                              self.config.brighterFatterMaxIter,
-                                                              self.config.brighterFatterThreshold,
-                                                              self.config.brighterFatterApplyGain,
-                                                              bfGains)
-            if bfResults[1] == self.config.brighterFatterMaxIter:
-                self.log.warn("Brighter fatter correction did not converge, final difference %f.",
-                              bfResults[0])
-            else:
-                self.log.info("Finished brighter fatter correction in %d iterations.",
-                              bfResults[1])
-            image = ccdExposure.getMaskedImage().getImage()
-            bfCorr = bfExp.getMaskedImage().getImage()
-            bfCorr -= interpExp.getMaskedImage().getImage()
-            image += bfCorr
-
-            # Applying the brighter-fatter correction applies a
-            # convolution to the science image. At the edges this
-            # convolution may not have sufficient valid pixels to
-            # produce a valid correction. Mark pixels within the size
-            # of the brighter-fatter kernel as EDGE to warn of this
-            # fact.
-            self.log.info("Ensuring image edges are masked as SUSPECT to the brighter-fatter kernel size.")
-            self.maskEdges(ccdExposure, numEdgePixels=numpy.max(bfKernel.shape) // 2,
-                           maskPlane="EDGE")
-
-            if self.config.brighterFatterMaskGrowSize > 0:
-                self.log.info("Growing masks to account for brighter-fatter kernel convolution.")
-                for maskPlane in self.config.maskListToInterpolate:
-                    isrFunctions.growMasks(ccdExposure.getMask(),
-                                           radius=self.config.brighterFatterMaskGrowSize,
-                                           maskNameList=maskPlane,
-                                           maskValue=maskPlane)
-
-            self.debugView(ccdExposure, "doBrighterFatter")
-
-        if self.config.doDark:
-            self.log.info("Applying dark correction.")
-            self.darkCorrection(ccdExposure, dark)
-            self.debugView(ccdExposure, "doDark")
+            with stageTimer.time("BRIGHTERFATTER"):
+                # We need to apply flats and darks before we can interpolate, and we
+                # need to interpolate before we do B-F, but we do B-F without the
+                # flats and darks applied so we can work in units of electrons or holes.
+                # This context manager applies and then removes the darks and flats.
+                #
+                # We also do not want to interpolate values here, so operate on temporary
+                # images so we can apply only the BF-correction and roll back the
+                # interpolation.
+                self.log.info("Applying brighter fatter correction using kernel type %s / gains %s.",
+                              type(bfKernel), type(bfGains))
+                bfResults = self.brighterFatterCorrection(ccdExposure, flat, dark, bfKernel, bfGains)
+
+                if bfResults[1] == self.config.brighterFatterMaxIter:
+                    self.log.warn("Brighter fatter correction did not converge, final difference %f.",
+                                  bfResults[0])
+                else:
+                    self.log.info("Finished brighter fatter correction in %d iterations.",
+                                  bfResults[1])
+
+                # Applying the brighter-fatter correction applies a
+                # convolution to the science image. At the edges this
+                # convolution may not have sufficient valid pixels to
+                # produce a valid correction. Mark pixels within the size
+                # of the brighter-fatter kernel as EDGE to warn of this
+                # fact.
+                self.log.info("Ensuring image edges are masked as SUSPECT to the brighter-fatter "
+                              "kernel size.")
+                self.maskEdges(ccdExposure, numEdgePixels=numpy.max(bfKernel.shape) // 2,
+                               maskPlane="EDGE")
+
+                if self.config.brighterFatterMaskGrowSize > 0:
+                    self.log.info("Growing masks to account for brighter-fatter kernel convolution.")
+                    for maskPlane in self.config.maskListToInterpolate:
+                        isrFunctions.growMasks(ccdExposure.getMask(),
+                                               radius=self.config.brighterFatterMaskGrowSize,
+                                               maskNameList=maskPlane,
+                                               maskValue=maskPlane)
+
+                self.debugView(ccdExposure, "doBrighterFatter")
+
+        if self.config.doDark and not fuseDetrend:
+            with stageTimer.time("DARK"):
+                self.log.info("Applying dark correction.")
+                self.darkCorrection(ccdExposure, dark)
+                self.debugView(ccdExposure, "doDark")
 
         if self.config.doFringe and not self.config.fringeAfterFlat:
-            self.log.info("Applying fringe correction before flat.")
-            self.fringe.run(ccdExposure, **fringes.getDict())
-            self.debugView(ccdExposure, "doFringe")
+            with stageTimer.time("FRINGE"):
+                self.log.info("Applying fringe correction before flat.")
+                self.fringe.run(ccdExposure, **fringes.getDict())
+                self.debugView(ccdExposure, "doFringe")
 
         if self.config.doStrayLight and self.strayLight.check(ccdExposure):
-            self.log.info("Checking strayLight correction.")
-            self.strayLight.run(ccdExposure, strayLightData)
-            self.debugView(ccdExposure, "doStrayLight")
+            with stageTimer.time("STRAYLIGHT"):
+                self.log.info("Checking strayLight correction.")
+                self.strayLight.run(ccdExposure, strayLightData)
+                self.debugView(ccdExposure, "doStrayLight")
 
-        if self.config.doFlat:
-            self.log.info("Applying flat correction.")
-            self.flatCorrection(ccdExposure, flat)
-            self.debugView(ccdExposure, "doFlat")
+        if self.config.doFlat and not fuseDetrend:
+            with stageTimer.time("FLAT"):
+                self.log.info("Applying flat correction.")
+                self.flatCorrection(ccdExposure, flat)
+                self.debugView(ccdExposure, "doFlat")
 
         if self.config.doApplyGains:
-            self.log.info("Applying gain correction instead of flat.")
-            isrFunctions.applyGains(ccdExposure, self.config.normalizeGains)
+            with stageTimer.time("GAINS"):
+                self.log.info("Applying gain correction instead of flat.")
+                ampStatistics.invalidate()
+                isrFunctions.applyGains(ccdExposure, self.config.normalizeGains,
+                                        ampStatistics=ampStatistics)
 
         if self.config.doFringe and self.config.fringeAfterFlat:
-            self.log.info("Applying fringe correction after flat.")
-            self.fringe.run(ccdExposure, **fringes.getDict())
+            with stageTimer.time("FRINGE"):
+                self.log.info("Applying fringe correction after flat.")
+                self.fringe.run(ccdExposure, **fringes.getDict())
 
         if self.config.doVignette:
-            self.log.info("Constructing Vignette polygon.")
-            self.vignettePolygon = self.vignette.run(ccdExposure)
+            with stageTimer.time("VIGNETTE"):
+                self.log.info("Constructing Vignette polygon.")
+                self.vignettePolygon = self.vignette.run(ccdExposure)
 
-            if self.config.vignette.doWriteVignettePolygon:
-                self.setValidPolygonIntersect(ccdExposure, self.vignettePolygon)
+                if self.config.vignette.doWriteVignettePolygon:
+                    self.setValidPolygonIntersect(ccdExposure, self.vignettePolygon)
 
         if self.config.doAttachTransmissionCurve:
-            self.log.info("Adding transmission curves.")
-            isrFunctions.attachTransmissionCurve(ccdExposure, opticsTransmission=opticsTransmission,
-                                                 filterTransmission=filterTransmission,
-                                                 sensorTransmission=sensorTransmission,
-                                                 atmosphereTransmission=atmosphereTransmission)
+            with stageTimer.time("TRANSMISSION"):
+                self.log.info("Adding transmission curves.")
+                isrFunctions.attachTransmissionCurve(ccdExposure, opticsTransmission=opticsTransmission,
+                                                     filterTransmission=filterTransmission,
+                                                     sensorTransmission=sensorTransmission,
+                                                     atmosphereTransmission=atmosphereTransmission)
 
         flattenedThumb = None
         if self.config.qa.doThumbnailFlattened:
             flattenedThumb = isrQa.makeThumbnail(ccdExposure, isrQaConfig=self.config.qa)
 
         if self.config.doIlluminationCorrection and filterName in self.config.illumFilters:
-            self.log.info("Performing illumination correction.")
-            isrFunctions.illuminationCorrection(ccdExposure.getMaskedImage(),
-                                                illumMaskedImage, illumScale=self.config.illumScale,
-                                                trimToFit=self.config.doTrimToMatchCalib)
+            with stageTimer.time("ILLUMINATION"):
+                self.log.info("Performing illumination correction.")
+                isrFunctions.illuminationCorrection(ccdExposure.getMaskedImage(),
+                                                    illumMaskedImage, illumScale=self.config.illumScale,
+                                                    trimToFit=self.config.doTrimToMatchCalib)
 
         preInterpExp = None
         if self.config.doSaveInterpPixels:
@@ -1613,37 +1746,46 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         # that the remaining defects adjacent to bad amplifiers (as an
         # example) do not attempt to interpolate extreme values.
         if self.config.doSetBadRegions:
-            badPixelCount, badPixelValue = isrFunctions.setBadRegions(ccdExposure)
-            if badPixelCount > 0:
-                self.log.info("Set %d BAD pixels to %f.", badPixelCount, badPixelValue)
+            with stageTimer.time("BADREGIONS"):
+                badPixelCount, badPixelValue = isrFunctions.setBadRegions(ccdExposure)
+                if badPixelCount > 0:
+                    self.log.info("Set %d BAD pixels to %f.", badPixelCount, badPixelValue)
 
         if self.config.doInterpolate:
-            self.log.info("Interpolating masked pixels.")
-            isrFunctions.interpolateFromMask(
-                maskedImage=ccdExposure.getMaskedImage(),
-                fwhm=self.config.fwhm,
-                growSaturatedFootprints=self.config.growSaturationFootprintSize,
-                maskNameList=list(self.config.maskListToInterpolate)
-            )
+            with stageTimer.time("INTERPOLATE"):
+                self.log.info("Interpolating masked pixels.")
+                isrFunctions.interpolateFromMask(
+                    maskedImage=ccdExposure.getMaskedImage(),
+                    fwhm=self.config.fwhm,
+                    growSaturatedFootprints=self.config.growSaturationFootprintSize,
+                    maskNameList=list(self.config.maskListToInterpolate)
+                )
 
         self.roughZeroPoint(ccdExposure)
 
         if self.config.doMeasureBackground:
-            self.log.info("Measuring background level.")
-            self.measureBackground(ccdExposure, self.config.qa)
-
-            if self.config.qa is not None and self.config.qa.saveStats is True:
-                for amp in ccd:
-                    ampExposure = ccdExposure.Factory(ccdExposure, amp.getBBox())
-                    qaStats = afwMath.makeStatistics(ampExposure.getImage(),
-                                                     afwMath.MEDIAN | afwMath.STDEVCLIP)
-                    self.metadata.set("ISR BACKGROUND {} MEDIAN".format(amp.getName()),
-                                      qaStats.getValue(afwMath.MEDIAN))
-                    self.metadata.set("ISR BACKGROUND {} STDEV".format(amp.getName()),
-                                      qaStats.getValue(afwMath.STDEVCLIP))
-                    self.log.debug("  Background stats for amplifer %s: %f +/- %f",
-                                   amp.getName(), qaStats.getValue(afwMath.MEDIAN),
-                                   qaStats.getValue(afwMath.STDEVCLIP))
+            with stageTimer.time("BACKGROUND"):
+                self.log.info("Measuring background level.")
+                self.measureBackground(ccdExposure, self.config.qa)
+
+                if self.config.qa is not None and self.config.qa.saveStats is True:
+                    ampStatistics.invalidate()
+                    for ampPlan in ampPlans:
+                        amp = ampsByName[ampPlan.name]
+                        qaStats = ampStatistics.getStatistics(afwMath.MEDIAN | afwMath.STDEVCLIP,
+                                                              bbox=ampPlan.bbox, plane="image")
+                        self.metadata.set("ISR BACKGROUND {} MEDIAN".format(amp.getName()),
+                                          qaStats.getValue(afwMath.MEDIAN))
+                        self.metadata.set("ISR BACKGROUND {} STDEV".format(amp.getName()),
+                                          qaStats.getValue(afwMath.STDEVCLIP))
+                        self.log.debug("  Background stats for amplifer %s: %f +/- %f",
+                                       amp.getName(), qaStats.getValue(afwMath.MEDIAN),
+                                       qaStats.getValue(afwMath.STDEVCLIP))
+
+        if self.config.doStageTiming:
+            stageTimer.setMetadata(self.metadata)
+        if self.config.stageTimingFile:
+            self.writeStageTiming(stageTimer, ccdExposure)
 
         self.debugView(ccdExposure, "postISRCCD")
 
@@ -1658,6 +1800,125 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             outputFlattenedThumbnail=flattenedThumb,
         )
 
+    def prepareCalibs(self, detector, **calibs):
+        """Prepare a calibration bundle for reuse with many exposures.
+
+        The checks and conversions that `run` would otherwise repeat for
+        every exposure are done once here.
+
+        Parameters
+        ----------
+        detector : `lsst.afw.cameraGeom.Detector`
+            Detector of the exposures that will be processed.
+        **calibs
+            Calibration products and other keyword arguments for `run`.
+
+        Returns
+        -------
+        calibs : `dict`
+            Keyword arguments for `run`, with ``defects`` promoted to
+            `lsst.ip.isr.Defects`, ``linearizer`` validated against the
+            detector, and an intra-detector ``crosstalk`` calibration
+            constructed from the detector if none was supplied.
+        """
+        calibs = dict(calibs)
+
+        defects = calibs.get("defects")
+        if defects is not None and not isinstance(defects, Defects):
+            calibs["defects"] = Defects(defects)
+
+        if detector is None:
+            return calibs
+
+        linearizer = calibs.get("linearizer")
+        if linearizer is not None and self.doLinearize(detector):
+            if not linearizer.hasLinearity:
+                linearizer.fromDetector(detector)
+            linearizer.validate(detector)
+
+        if self.config.doCrosstalk and not calibs.get("crosstalk"):
+            crosstalk = CrosstalkCalib(log=self.log)
+            calibs["crosstalk"] = crosstalk.fromDetector(detector,
+                                                         coeffVector=self.crosstalk.config.crosstalkValues)
+        return calibs
+
+    def runBatch(self, exposures, numProcesses=1, **calibs):
+        """Perform instrument signature removal on many exposures of one
+        detector that share the same calibrations.
+
+        Parameters
+        ----------
+        exposures : iterable of `lsst.afw.image.Exposure`
+            Raw exposures to process.  These are read from the iterable
+            only as processing capacity becomes free, so a generator may
+            be used to limit the number held in memory.
+        numProcesses : `int`, optional
+            Number of processes to use.  If 1, the exposures are
+            processed serially in this process.
+        **calibs
+            Calibration products and other keyword arguments for `run`.
+            These are prepared once with `prepareCalibs`.
+
+        Yields
+        ------
+        index : `int`
+            Position of the exposure in ``exposures``.
+        result : `lsst.pipe.base.Struct`
+            Result of `run` for that exposure.  Results are yielded as
+            they complete, which is not necessarily in input order when
+            ``numProcesses`` > 1.
+
+        Notes
+        -----
+        With ``numProcesses`` > 1, each worker process constructs its
+        own task and receives the calibrations once, when it starts.  At
+        most ``2*numProcesses`` exposures are in flight at any time.  The
+        task metadata of the worker processes is not returned.
+        """
+        exposures = iter(exposures)
+        first = next(exposures, None)
+        if first is None:
+            return
+        calibs = self.prepareCalibs(first.getDetector(), **calibs)
+        exposures = itertools.chain([first], exposures)
+
+        if numProcesses == 1:
+            for index, exposure in enumerate(exposures):
+                yield index, self.run(exposure, **calibs)
+            return
+
+        maxPending = 2*numProcesses
+        with ProcessPoolExecutor(max_workers=numProcesses, initializer=_initBatchWorker,
+                                 initargs=(type(self), self.config, calibs)) as executor:
+            pending = set()
+            for index, exposure in enumerate(exposures):
+                if len(pending) >= maxPending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(executor.submit(_runBatchWorker, index, exposure))
+            for future in as_completed(pending):
+                yield future.result()
+
+    def writeStageTiming(self, stageTimer, exposure):
+        """Write the per-stage resource usage of an exposure to JSON.
+
+        Parameters
+        ----------
+        stageTimer : `lsst.ip.isr.StageTimer`
+            Measurements of the ISR stages.
+        exposure : `lsst.afw.image.Exposure`
+            Processed exposure, used to identify the measurements.
+        """
+        visitInfo = exposure.getInfo().getVisitInfo()
+        exposureId = visitInfo.getExposureId() if visitInfo is not None else 0
+        detector = exposure.getDetector()
+        detectorName = detector.getName() if detector is not None else ""
+
+        filename = self.config.stageTimingFile.format(exposureId=exposureId, detector=detectorName)
+        self.log.info("Writing ISR stage timing to %s.", filename)
+        stageTimer.writeJson(filename, exposureId=exposureId, detector=detectorName)
+
     @pipeBase.timeMethod
     def runDataRef(self, sensorRef):
         """Perform instrument signature removal on a ButlerDataRef of a Sensor.
@@ -1690,15 +1951,71 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             required calibration data does not exist.
 
         """
+        inputs = self.readDataRef(sensorRef)
+        self.setCalibCacheMetadata(inputs)
+        result = self.run(inputs.ccdExposure, camera=inputs.camera, **inputs.isrData.getDict())
+        self.writeDataRef(sensorRef, result)
+
+        return result
+
+    def readDataRef(self, sensorRef):
+        """Read the raw exposure and calibrations for a ButlerDataRef.
+
+        Parameters
+        ----------
+        sensorRef : `daf.persistence.butlerSubset.ButlerDataRef`
+            DataRef of the detector data to be processed.
+
+        Returns
+        -------
+        inputs : `lsst.pipe.base.Struct`
+            Result struct with components:
+            - ``ccdExposure`` : `lsst.afw.image.Exposure`
+                The raw exposure.
+            - ``camera`` : `lsst.afw.cameraGeom.Camera`
+                The camera geometry.
+            - ``isrData`` : `lsst.pipe.base.Struct`
+                The calibrations; see `readIsrData`.
+            - ``calibCacheCounters`` : `dict` or `None`
+                Calibration cache counters once the calibrations were
+                read, for `setCalibCacheMetadata`; `None` if the cache
+                is disabled.
+        """
         self.log.info("Performing ISR on sensor %s.", sensorRef.dataId)
 
         ccdExposure = sensorRef.get(self.config.datasetType)
 
         camera = sensorRef.get("camera")
         isrData = self.readIsrData(sensorRef, ccdExposure)
+        calibCacheCounters = self.calibCache.getCounters() if self.config.calibCacheSize > 0 else None
+
+        return pipeBase.Struct(ccdExposure=ccdExposure, camera=camera, isrData=isrData,
+                               calibCacheCounters=calibCacheCounters)
+
+    def setCalibCacheMetadata(self, inputs):
+        """Record the calibration cache counters of an exposure in the
+        task metadata.
+
+        Parameters
+        ----------
+        inputs : `lsst.pipe.base.Struct`
+            Result of `readDataRef`.  The counters are those recorded
+            when its calibrations were read, so they are not changed by
+            exposures read ahead by `runDataRefs`.
+        """
+        if inputs.calibCacheCounters is not None:
+            self.calibCache.setMetadata(self.metadata, counters=inputs.calibCacheCounters)
 
-        result = self.run(ccdExposure, camera=camera, **isrData.getDict())
+    def writeDataRef(self, sensorRef, result):
+        """Persist the outputs of `run` for a ButlerDataRef.
 
+        Parameters
+        ----------
+        sensorRef : `daf.persistence.butlerSubset.ButlerDataRef`
+            DataRef of the detector data that was processed.
+        result : `lsst.pipe.base.Struct`
+            Result of `run`.
+        """
         if self.config.doWrite:
             sensorRef.put(result.exposure, "postISRCCD")
             if result.preInterpolatedExposure is not None:
@@ -1708,7 +2025,109 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         if result.flattenedThumb is not None:
             isrQa.writeThumbnail(sensorRef, result.flattenedThumb, "flattenedThumb")
 
-        return result
+    def runDataRefs(self, sensorRefs):
+        """Perform instrument signature removal on a sequence of
+        ButlerDataRefs, overlapping I/O with processing.
+
+        While one exposure is processed, the inputs of the following
+        exposures are read in one background thread and the outputs of
+        the preceding exposures are written in another.
+
+        Parameters
+        ----------
+        sensorRefs : iterable of `daf.persistence.butlerSubset.ButlerDataRef`
+            DataRefs of the detector data to be processed.
+
+        Yields
+        ------
+        result : `lsst.pipe.base.Struct`
+            Result of `run` for each dataRef, in input order.  The
+            outputs may not have been written yet when a result is
+            yielded; all are written before the generator finishes.
+
+        Raises
+        ------
+        Exception
+            Any error raised while reading, processing or writing an
+            exposure is re-raised here, after which no further exposures
+            are processed.
+
+        Notes
+        -----
+        At most ``config.prefetchDepth`` exposures are read ahead, and
+        at most ``config.prefetchDepth`` results wait to be written;
+        reading and processing pause when these limits are reached.
+        """
+        depth = self.config.prefetchDepth
+        readQueue = queue.Queue(maxsize=depth)
+        writeQueue = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+        errors = []
+
+        def put(itemQueue, item):
+            while not stop.is_set():
+                try:
+                    itemQueue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(itemQueue):
+            while True:
+                try:
+                    return itemQueue.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        return None
+
+        def reader():
+            try:
+                for sensorRef in sensorRefs:
+                    if not put(readQueue, (sensorRef, self.readDataRef(sensorRef))):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                return
+            put(readQueue, None)
+
+        def writer():
+            while True:
+                item = get(writeQueue)
+                if item is None:
+                    return
+                try:
+                    self.writeDataRef(*item)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                    return
+
+        readThread = threading.Thread(target=reader, name="isrRead", daemon=True)
+        writeThread = threading.Thread(target=writer, name="isrWrite", daemon=True)
+        readThread.start()
+        writeThread.start()
+        try:
+            while True:
+                item = get(readQueue)
+                if item is None:
+                    break
+                sensorRef, inputs = item
+                self.setCalibCacheMetadata(inputs)
+                result = self.run(inputs.ccdExposure, camera=inputs.camera, **inputs.isrData.getDict())
+                del item, inputs
+                if not put(writeQueue, (sensorRef, result)):
+                    break
+                yield result
+            put(writeQueue, None)
+            writeThread.join()
+        finally:
+            stop.set()
+            readThread.join()
+            writeThread.join()
+        if errors:
+            raise errors[0]
 
     def getIsrExposure(self, dataRef, datasetType, dateObs=None, immediate=True):
         """Retrieve a calibration dataset for removing instrument signature.
@@ -1733,6 +2152,32 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         exposure : `lsst.afw.image.Exposure`
             Requested calibration frame.
 
+        Raises
+        ------
+        RuntimeError
+            Raised if no matching calibration frame can be found.
+
+        Notes
+        -----
+        Frames are read through the process-level calibration cache if
+        ``config.calibCacheSize`` is non-zero.  The cache returns a copy
+        of the pixel data, so the frame may be modified by the caller.
+        """
+        return self.getCachedCalib(dataRef, datasetType,
+                                   lambda: self.readIsrExposure(dataRef, datasetType, dateObs=dateObs,
+                                                                immediate=immediate))
+
+    def readIsrExposure(self, dataRef, datasetType, dateObs=None, immediate=True):
+        """Read a calibration frame from the butler, bypassing the cache.
+
+        Parameters are as for `getIsrExposure`.
+
+        Returns
+        -------
+        exposure : `lsst.afw.image.Exposure`
+            Requested calibration frame, assembled if
+            ``config.doAssembleIsrExposures`` is set.
+
         Raises
         ------
         RuntimeError
@@ -1758,6 +2203,55 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             exp = self.assembleCcd.assembleCcd(exp)
         return exp
 
+    def getCalibCacheKey(self, dataRef, datasetType):
+        """Identify a calibration product for the calibration cache.
+
+        Parameters
+        ----------
+        dataRef : `daf.persistence.butlerSubset.ButlerDataRef`
+            DataRef of the detector data to find calibration datasets
+            for.
+        datasetType : `str`
+            Type of dataset to identify.
+
+        Returns
+        -------
+        key : `tuple` or `None`
+            Dataset type, the files the butler resolves the dataset to,
+            and the assembly option.  The files are selected by the
+            calibration dataId and validity range, so exposures sharing a
+            calibration share a key.  `None` if the files cannot be
+            determined, in which case the product is not cached.
+        """
+        try:
+            filenames = dataRef.get(datasetType + "_filename")
+        except Exception:
+            return None
+        return (datasetType, tuple(filenames), self.config.doAssembleIsrExposures)
+
+    def getCachedCalib(self, dataRef, datasetType, reader):
+        """Return a calibration product, from the calibration cache if
+        it has already been read.
+
+        Parameters
+        ----------
+        dataRef : `daf.persistence.butlerSubset.ButlerDataRef`
+            DataRef of the detector data to find calibration datasets
+            for.
+        datasetType : `str`
+            Type of dataset to return.
+        reader : callable
+            Function taking no arguments that reads the product.
+
+        Returns
+        -------
+        calib : `object`
+            The calibration product.
+        """
+        if self.config.calibCacheSize == 0:
+            return reader()
+        return self.calibCache.get(self.getCalibCacheKey(dataRef, datasetType), reader)
+
     def ensureExposure(self, inputExp, camera, detectorNum):
         """Ensure that the data returned by Butler is a fully constructed exposure.
 
@@ -1806,7 +2300,7 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
 
         return inputExp
 
-    def convertIntToFloat(self, exposure):
+    def convertIntToFloat(self, exposure, deferImage=False):
         """Convert exposure image from uint16 to float.
 
         If the exposure does not need to be converted, the input is
@@ -1814,10 +2308,19 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         floating point pixels, the variance is set to unity and the
         mask to zero.
 
+        If ``config.doLazyConvertIntToFloat`` is set, the mask and
+        variance planes are allocated as zero-filled memory that is
+        only committed when written, and the variance is only set to
+        unity if ``config.doVariance`` will not replace it.
+
         Parameters
         ----------
         exposure : `lsst.afw.image.Exposure`
            The raw exposure to be converted.
+        deferImage : `bool`, optional
+           Leave the image pixels of the converted exposure
+           uninitialised, for `processAmplifiers` to convert amplifier
+           by amplifier.  Requires ``config.doLazyConvertIntToFloat``.
 
         Returns
         -------
@@ -1837,13 +2340,150 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         if not hasattr(exposure, "convertF"):
             raise RuntimeError("Unable to convert exposure (%s) to float." % type(exposure))
 
-        newexposure = exposure.convertF()
-        newexposure.variance[:] = 1
-        newexposure.mask[:] = 0x0
+        if not self.config.doLazyConvertIntToFloat:
+            newexposure = exposure.convertF()
+            newexposure.variance[:] = 1
+            newexposure.mask[:] = 0x0
+            return newexposure
+
+        # numpy.zeros obtains pre-zeroed pages from the operating
+        # system, which are not touched until a stage writes to them.
+        xy0 = exposure.getXY0()
+        shape = exposure.image.array.shape
+        if deferImage:
+            imageArray = numpy.empty(shape, dtype=numpy.float32)
+        else:
+            imageArray = exposure.image.array.astype(numpy.float32)
+        if self.config.doVariance:
+            varianceArray = numpy.zeros(shape, dtype=numpy.float32)
+        else:
+            varianceArray = numpy.ones(shape, dtype=numpy.float32)
+        maskedImage = afwImage.makeMaskedImage(
+            afwImage.ImageF(imageArray, deep=False, xy0=xy0),
+            afwImage.Mask(numpy.zeros(shape, dtype=afwImage.MaskPixel), deep=False, xy0=xy0),
+            afwImage.ImageF(varianceArray, deep=False, xy0=xy0))
+        return afwImage.ExposureF(maskedImage, afwImage.ExposureInfo(exposure.getInfo(), True))
+
+    def canDeferConversion(self, ccdExposure, ampList):
+        """Check whether the conversion to floating point can be done
+        amplifier by amplifier in `processAmplifiers`.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Raw exposure to be converted.
+        ampList : `list` [`lsst.ip.isr.AmplifierPlan`]
+            Amplifiers that will be processed.
+
+        Returns
+        -------
+        canDefer : `bool`
+            True if ``config.doLazyConvertIntToFloat`` is set, no
+            stage reads the image before the overscan correction, and
+            the raw bounding boxes of the amplifiers tile the exposure.
+        """
+        if not self.config.doLazyConvertIntToFloat or isinstance(ccdExposure, afwImage.ExposureF):
+            return False
+        if self.config.doBias and self.config.doBiasBeforeOverscan:
+            return False
+        bbox = ccdExposure.getBBox()
+        if not all(bbox.contains(ampPlan.rawBBox) for ampPlan in ampList):
+            return False
+        return sum(ampPlan.rawBBox.getArea() for ampPlan in ampList) == bbox.getArea()
+
+    def processAmplifiers(self, ccdExposure, amps, defects, rawExposure=None, stageTimer=None,
+                          detector=None):
+        """Mask and overscan correct a set of amplifiers.
+
+        Each amplifier only modifies the pixels within its own raw
+        bounding box, so the amplifiers can be processed concurrently
+        using ``config.numAmpWorkers`` threads.  The results are
+        identical to those of the serial processing.  If
+        ``config.doBatchOverscan`` is set, the overscans are instead
+        measured together once all the amplifiers have been masked;
+        see `batchOverscanCorrection`.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure to process.
+        amps : `list` [`lsst.ip.isr.AmplifierPlan`]
+            Geometry of the amplifiers to process.
+        defects : `lsst.ip.isr.Defects`
+            List of defects.  Used to determine if an entire
+            amplifier is bad.
+        rawExposure : `lsst.afw.image.Exposure`, optional
+            Integer raw exposure whose pixels have not yet been copied
+            to ``ccdExposure``; see `convertIntToFloat`.  If supplied,
+            each amplifier is converted just before it is processed.
+        stageTimer : `lsst.ip.isr.StageTimer`, optional
+            Timer to record the batched overscan correction in.
+        detector : `lsst.afw.cameraGeom.Detector` or `list`, optional
+            Detector, or list of amplifier-like objects, holding the
+            amplifiers described by ``amps``.  Defaults to the detector
+            of ``ccdExposure``.
+
+        Returns
+        -------
+        ampResults : `list` [`lsst.pipe.base.Struct`]
+            Per-amplifier results, in the same order as ``amps``, each
+            with components:
+            - ``badAmp`` : `bool`
+                True if the entire amplifier is unusable.
+            - ``overscanResults`` : `lsst.pipe.base.Struct` or `None`
+                Result of `overscanCorrection`, or `None` if no
+                overscan correction was performed.
+            - ``timing`` : `dict` or `None`
+                Wall and CPU time used to process the amplifier; see
+                `lsst.ip.isr.stageTimer.measureStage`.  `None` if
+                ``stageTimer`` is not set or not enabled.
 
-        return newexposure
+        Notes
+        -----
+        The overscan levels are not written to the exposure metadata
+        here, to keep the metadata order deterministic; use
+        `setOverscanMetadata` on the results in amplifier order.
+        """
+        if detector is None:
+            detector = ccdExposure.getDetector()
+        ampsByName = {amp.getName(): amp for amp in detector}
+
+        def processAmp(ampPlan):
+            amp = ampsByName[ampPlan.name]
+            ampTimer = (measureStage(f"OVERSCAN {ampPlan.name}", threadCpu=True)
+                        if stageTimer is not None and stageTimer.enabled else nullcontext())
+            with ampTimer as timing:
+                if rawExposure is not None:
+                    slices = ampPlan.getArraySlices("rawBBox", ccdExposure.getXY0())
+                    ccdExposure.image.array[slices] = rawExposure.image.array[slices]
+                badAmp = self.maskAmplifier(ccdExposure, amp, defects, ampPlan=ampPlan)
+                overscanResults = None
+                if self.config.doOverscan and not badAmp:
+                    if self.config.doBatchOverscan:
+                        # Measured below; keep the regions to correct.
+                        overscanResults = self.prepareOverscanRegions(ccdExposure, ampPlan)
+                    else:
+                        overscanResults = self.overscanCorrection(ccdExposure, amp,
+                                                                  recordMetadata=False, ampPlan=ampPlan)
+            return pipeBase.Struct(badAmp=badAmp, overscanResults=overscanResults, timing=timing)
 
-    def maskAmplifier(self, ccdExposure, amp, defects):
+        numWorkers = min(self.config.numAmpWorkers, len(amps))
+        if numWorkers <= 1:
+            ampResults = [processAmp(amp) for amp in amps]
+        else:
+            with ThreadPoolExecutor(max_workers=numWorkers) as executor:
+                ampResults = list(executor.map(processAmp, amps))
+
+        if self.config.doOverscan and self.config.doBatchOverscan:
+            with stageTimer.time("OVERSCAN BATCH") if stageTimer is not None else nullcontext():
+                overscanResults = self.batchOverscanCorrection(
+                    [ampResult.overscanResults for ampResult in ampResults],
+                    [ampsByName[ampPlan.name] for ampPlan in amps])
+            for ampResult, overscanResult in zip(ampResults, overscanResults):
+                ampResult.overscanResults = overscanResult
+        return ampResults
+
+    def maskAmplifier(self, ccdExposure, amp, defects, ampPlan=None):
         """Identify bad amplifiers, saturated and suspect pixels.
 
         Parameters
@@ -1856,6 +2496,9 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         defects : `lsst.ip.isr.Defects`
             List of defects.  Used to determine if the entire
             amplifier is bad.
+        ampPlan : `lsst.ip.isr.AmplifierPlan`, optional
+            Precomputed geometry of ``amp``.  Derived from ``amp`` if
+            not supplied.
 
         Returns
         -------
@@ -1864,6 +2507,8 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             defects and unusable.
 
         """
+        if ampPlan is None:
+            ampPlan = AmplifierPlan(amp, self.config)
         maskedImage = ccdExposure.getMaskedImage()
 
         badAmp = False
@@ -1871,12 +2516,12 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         # Check if entire amp region is defined as a defect (need to use amp.getBBox() for correct
         # comparison with current defects definition.
         if defects is not None:
-            badAmp = bool(sum([v.getBBox().contains(amp.getBBox()) for v in defects]))
+            badAmp = bool(sum([v.getBBox().contains(ampPlan.bbox) for v in defects]))
 
         # In the case of a bad amp, we will set mask to "BAD" (here use amp.getRawBBox() for correct
         # association with pixels in current ccdExposure).
         if badAmp:
-            dataView = afwImage.MaskedImageF(maskedImage, amp.getRawBBox(),
+            dataView = afwImage.MaskedImageF(maskedImage, ampPlan.rawBBox,
                                              afwImage.PARENT)
             maskView = dataView.getMask()
             maskView |= maskView.getPlaneBitMask("BAD")
@@ -1895,7 +2540,7 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
 
         for maskName, maskThreshold in limits.items():
             if not math.isnan(maskThreshold):
-                dataView = maskedImage.Factory(maskedImage, amp.getRawBBox())
+                dataView = maskedImage.Factory(maskedImage, ampPlan.rawBBox)
                 isrFunctions.makeThresholdMask(
                     maskedImage=dataView,
                     threshold=maskThreshold,
@@ -1904,17 +2549,17 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
                 )
 
         # Determine if we've fully masked this amplifier with SUSPECT and SAT pixels.
-        maskView = afwImage.Mask(maskedImage.getMask(), amp.getRawDataBBox(),
-                                 afwImage.PARENT)
-        maskVal = maskView.getPlaneBitMask([self.config.saturatedMaskName,
-                                            self.config.suspectMaskName])
-        if numpy.all(maskView.getArray() & maskVal > 0):
+        mask = maskedImage.getMask()
+        maskArray = mask.getArray()[ampPlan.getArraySlices("rawDataBBox", mask.getXY0())]
+        maskVal = mask.getPlaneBitMask([self.config.saturatedMaskName,
+                                        self.config.suspectMaskName])
+        if numpy.all(maskArray & maskVal > 0):
             badAmp = True
-            maskView |= maskView.getPlaneBitMask("BAD")
+            maskArray |= mask.getPlaneBitMask("BAD")
 
         return badAmp
 
-    def overscanCorrection(self, ccdExposure, amp):
+    def overscanCorrection(self, ccdExposure, amp, recordMetadata=True, ampPlan=None):
         """Apply overscan correction in place.
 
         This method does initial pixel rejection of the overscan
@@ -1930,6 +2575,12 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             Exposure to have overscan correction performed.
         amp : `lsst.afw.cameraGeom.Amplifer`
             The amplifier to consider while correcting the overscan.
+        recordMetadata : `bool`, optional
+            Record the overscan level and sigma in the exposure
+            metadata?  See `setOverscanMetadata`.
+        ampPlan : `lsst.ip.isr.AmplifierPlan`, optional
+            Precomputed geometry of ``amp``.  Derived from ``amp`` if
+            not supplied.
 
         Returns
         -------
@@ -1953,62 +2604,66 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         --------
         lsst.ip.isr.isrFunctions.overscanCorrection
         """
-        if amp.getRawHorizontalOverscanBBox().isEmpty():
-            self.log.info("ISR_OSCAN: No overscan region.  Not performing overscan correction.")
+        if ampPlan is None:
+            ampPlan = AmplifierPlan(amp, self.config)
+        regions = self.prepareOverscanRegions(ccdExposure, ampPlan)
+        if regions is None:
             return None
 
-        statControl = afwMath.StatisticsControl()
-        statControl.setAndMask(ccdExposure.mask.getPlaneBitMask("SAT"))
-
-        # Determine the bounding boxes
-        dataBBox = amp.getRawDataBBox()
-        oscanBBox = amp.getRawHorizontalOverscanBBox()
-        dx0 = 0
-        dx1 = 0
-
-        prescanBBox = amp.getRawPrescanBBox()
-        if (oscanBBox.getBeginX() > prescanBBox.getBeginX()):  # amp is at the right
-            dx0 += self.config.overscanNumLeadingColumnsToSkip
-            dx1 -= self.config.overscanNumTrailingColumnsToSkip
-        else:
-            dx0 += self.config.overscanNumTrailingColumnsToSkip
-            dx1 -= self.config.overscanNumLeadingColumnsToSkip
+        # Perform overscan correction on subregions.
+        for ampImage, overscanImage in regions:
+            overscanResults = self.overscan.run(ampImage.getImage(), overscanImage, amp)
 
-        # Determine if we need to work on subregions of the amplifier and overscan.
-        imageBBoxes = []
-        overscanBBoxes = []
+        if recordMetadata:
+            self.setOverscanMetadata(ccdExposure, amp, overscanResults)
+
+        return overscanResults
+
+    def prepareOverscanRegions(self, ccdExposure, ampPlan):
+        """Select the regions of an amplifier to overscan correct, and mask
+        the overscan pixels that deviate from its median.
 
-        if ((self.config.overscanBiasJump
-             and self.config.overscanBiasJumpLocation)
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure to have overscan correction performed.
+        ampPlan : `lsst.ip.isr.AmplifierPlan`
+            Geometry of the amplifier.
+
+        Returns
+        -------
+        regions : `list` [`tuple`] or `None`
+            ``(ampImage, overscanImage)`` masked image views of each
+            subregion of the amplifier and its overscan, or `None` if
+            the amplifier has no overscan.  Pixels of ``overscanImage``
+            deviating by more than ``config.overscanMaxDev`` are masked
+            as ``SAT``.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the exposure is from a device with a bias jump and
+            ``config.overscanBiasJumpLocation`` is outside the amplifier.
+        """
+        if not ampPlan.hasOverscan:
+            self.log.info("ISR_OSCAN: No overscan region.  Not performing overscan correction.")
+            return None
+
+        # Determine if we need to work on subregions of the amplifier and overscan.
+        if ((ampPlan.jumpImageBBoxes is not None or ampPlan.jumpError is not None)
             and (ccdExposure.getMetadata().exists(self.config.overscanBiasJumpKeyword)
                  and ccdExposure.getMetadata().getScalar(self.config.overscanBiasJumpKeyword) in
                  self.config.overscanBiasJumpDevices)):
-            if amp.getReadoutCorner() in (ReadoutCorner.LL, ReadoutCorner.LR):
-                yLower = self.config.overscanBiasJumpLocation
-                yUpper = dataBBox.getHeight() - yLower
-            else:
-                yUpper = self.config.overscanBiasJumpLocation
-                yLower = dataBBox.getHeight() - yUpper
-
-            imageBBoxes.append(lsst.geom.Box2I(dataBBox.getBegin(),
-                                               lsst.geom.Extent2I(dataBBox.getWidth(), yLower)))
-            overscanBBoxes.append(lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, 0),
-                                                  lsst.geom.Extent2I(oscanBBox.getWidth() - dx0 + dx1,
-                                                                     yLower)))
-
-            imageBBoxes.append(lsst.geom.Box2I(dataBBox.getBegin() + lsst.geom.Extent2I(0, yLower),
-                                               lsst.geom.Extent2I(dataBBox.getWidth(), yUpper)))
-            overscanBBoxes.append(lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, yLower),
-                                                  lsst.geom.Extent2I(oscanBBox.getWidth() - dx0 + dx1,
-                                                                     yUpper)))
+            if ampPlan.jumpError is not None:
+                raise RuntimeError(ampPlan.jumpError)
+            imageBBoxes = ampPlan.jumpImageBBoxes
+            overscanBBoxes = ampPlan.jumpOverscanBBoxes
         else:
-            imageBBoxes.append(lsst.geom.Box2I(dataBBox.getBegin(),
-                                               lsst.geom.Extent2I(dataBBox.getWidth(), dataBBox.getHeight())))
-            overscanBBoxes.append(lsst.geom.Box2I(oscanBBox.getBegin() + lsst.geom.Extent2I(dx0, 0),
-                                                  lsst.geom.Extent2I(oscanBBox.getWidth() - dx0 + dx1,
-                                                                     oscanBBox.getHeight())))
+            imageBBoxes = ampPlan.imageBBoxes
+            overscanBBoxes = ampPlan.overscanBBoxes
 
-        # Perform overscan correction on subregions, ensuring saturated pixels are masked.
+        # Ensure saturated pixels are masked.
+        regions = []
         for imageBBox, overscanBBox in zip(imageBBoxes, overscanBBoxes):
             ampImage = ccdExposure.maskedImage[imageBBox]
             overscanImage = ccdExposure.maskedImage[overscanBBox]
@@ -2017,32 +2672,115 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             median = numpy.ma.median(numpy.ma.masked_where(overscanImage.mask.array, overscanArray))
             bad = numpy.where(numpy.abs(overscanArray - median) > self.config.overscanMaxDev)
             overscanImage.mask.array[bad] = overscanImage.mask.getPlaneBitMask("SAT")
+            regions.append((ampImage, overscanImage))
+        return regions
 
-            statControl = afwMath.StatisticsControl()
-            statControl.setAndMask(ccdExposure.mask.getPlaneBitMask("SAT"))
+    def batchOverscanCorrection(self, regionLists, amps):
+        """Apply overscan correction to the amplifiers of a detector with a
+        single vectorized measurement.
 
-            overscanResults = self.overscan.run(ampImage.getImage(), overscanImage, amp)
+        Parameters
+        ----------
+        regionLists : `list` [`list` [`tuple`] or `None`]
+            Result of `prepareOverscanRegions` for each amplifier.
+        amps : `list` [`lsst.afw.cameraGeom.Amplifier`]
+            The amplifiers, in the same order as ``regionLists``.
 
-            # Measure average overscan levels and record them in the metadata.
-            levelStat = afwMath.MEDIAN
-            sigmaStat = afwMath.STDEVCLIP
-
-            sctrl = afwMath.StatisticsControl(self.config.qa.flatness.clipSigma,
-                                              self.config.qa.flatness.nIter)
-            metadata = ccdExposure.getMetadata()
-            ampNum = amp.getName()
-            # if self.config.overscanFitType in ("MEDIAN", "MEAN", "MEANCLIP"):
-            if isinstance(overscanResults.overscanFit, float):
-                metadata.set("ISR_OSCAN_LEVEL%s" % ampNum, overscanResults.overscanFit)
-                metadata.set("ISR_OSCAN_SIGMA%s" % ampNum, 0.0)
-            else:
-                stats = afwMath.makeStatistics(overscanResults.overscanFit, levelStat | sigmaStat, sctrl)
-                metadata.set("ISR_OSCAN_LEVEL%s" % ampNum, stats.getValue(levelStat))
-                metadata.set("ISR_OSCAN_SIGMA%s" % ampNum, stats.getValue(sigmaStat))
+        Returns
+        -------
+        overscanResults : `list` [`lsst.pipe.base.Struct` or `None`]
+            Result of `overscanCorrection` for each amplifier, or `None`
+            for those without regions to correct.
 
+        See Also
+        --------
+        lsst.ip.isr.OverscanCorrectionTask.runDetector
+        """
+        ampImages = []
+        overscanImages = []
+        owners = []
+        for index, regions in enumerate(regionLists):
+            for ampImage, overscanImage in regions or []:
+                ampImages.append(ampImage.getImage())
+                overscanImages.append(overscanImage)
+                owners.append(index)
+
+        results = self.overscan.runDetector(ampImages, overscanImages, [amps[index] for index in owners])
+
+        # As in overscanCorrection, the last subregion of an amplifier
+        # provides its result.
+        overscanResults = [None]*len(regionLists)
+        for index, result in zip(owners, results):
+            overscanResults[index] = result
         return overscanResults
 
-    def updateVariance(self, ampExposure, amp, overscanImage=None):
+    def setOverscanMetadata(self, ccdExposure, amp, overscanResults):
+        """Record the average overscan level and sigma in the metadata.
+
+        The statistics are measured on the image of the overscan fit,
+        which is built here if the fit is an `lsst.ip.isr.OverscanModel`.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure whose metadata will be updated.
+        amp : `lsst.afw.cameraGeom.Amplifer`
+            The amplifier that was overscan corrected.
+        overscanResults : `lsst.pipe.base.Struct`
+            Result of `overscanCorrection` for this amplifier.
+        """
+        fitStats = self.getOverscanStatistics(overscanResults).getFitStatistics(self.getOverscanStatControl())
+        metadata = ccdExposure.getMetadata()
+        ampNum = amp.getName()
+        metadata.set("ISR_OSCAN_LEVEL%s" % ampNum, fitStats.median)
+        metadata.set("ISR_OSCAN_SIGMA%s" % ampNum, fitStats.stdev)
+
+    def getOverscanStatistics(self, overscanResults):
+        """Return the statistics of an overscan correction.
+
+        Parameters
+        ----------
+        overscanResults : `lsst.pipe.base.Struct`
+            Result of `overscanCorrection`.
+
+        Returns
+        -------
+        statistics : `lsst.ip.isr.OverscanStatistics`
+            Statistics shared by the overscan metadata, the QA metadata
+            and the empirical read noise, so that each is measured once
+            per statistics control.
+        """
+        statistics = getattr(overscanResults, "statistics", None)
+        if statistics is None:
+            statistics = OverscanStatistics(overscanResults.overscanFit, overscanResults.overscanImage)
+            overscanResults.statistics = statistics
+        return statistics
+
+    def getOverscanStatControl(self):
+        """Return the statistics control used to measure overscan fits.
+
+        Returns
+        -------
+        statControl : `lsst.afw.math.StatisticsControl`
+            Statistics control clipping as the QA flatness statistics.
+        """
+        return afwMath.StatisticsControl(self.config.qa.flatness.clipSigma, self.config.qa.flatness.nIter)
+
+    def getReadNoiseStatControl(self):
+        """Return the statistics control used to measure the corrected
+        overscan.
+
+        Returns
+        -------
+        statControl : `lsst.afw.math.StatisticsControl`
+            Statistics control rejecting saturated and suspect pixels.
+        """
+        statControl = afwMath.StatisticsControl()
+        statControl.setAndMask(afwImage.Mask.getPlaneBitMask([self.config.saturatedMaskName,
+                                                              self.config.suspectMaskName]))
+        return statControl
+
+    def updateVariance(self, ampExposure, amp, overscanImage=None, overscanResults=None):
         """Set the variance plane using the amplifier gain and read noise
 
         The read noise is calculated from the ``overscanImage`` if the
@@ -2057,12 +2795,44 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             Amplifier detector data.
         overscanImage : `lsst.afw.image.MaskedImage`, optional.
             Image of overscan, required only for empirical read noise.
+        overscanResults : `lsst.pipe.base.Struct`, optional
+            Result of `overscanCorrection`, used instead of
+            ``overscanImage`` to reuse its statistics.
 
         See also
         --------
         lsst.ip.isr.isrFunctions.updateVariance
         """
-        maskPlanes = [self.config.saturatedMaskName, self.config.suspectMaskName]
+        gain, readNoise = self.getVarianceParameters(amp, overscanImage=overscanImage,
+                                                     overscanResults=overscanResults)
+
+        isrFunctions.updateVariance(
+            maskedImage=ampExposure.getMaskedImage(),
+            gain=gain,
+            readNoise=readNoise,
+        )
+
+    def getVarianceParameters(self, amp, overscanImage=None, overscanResults=None):
+        """Determine the gain and read noise used to build the variance.
+
+        Parameters
+        ----------
+        amp : `lsst.afw.table.AmpInfoRecord` or `FakeAmp`
+            Amplifier detector data.
+        overscanImage : `lsst.afw.image.MaskedImage`, optional.
+            Image of overscan, required only for empirical read noise.
+        overscanResults : `lsst.pipe.base.Struct`, optional
+            Result of `overscanCorrection`, used instead of
+            ``overscanImage`` to reuse its statistics.
+
+        Returns
+        -------
+        gain : `float`
+            The amplifier gain in electrons/ADU.  Invalid gains are
+            replaced by 1.0.
+        readNoise : `float`
+            The amplifier read noise in ADU/pixel.
+        """
         gain = amp.getGain()
 
         if math.isnan(gain):
@@ -2074,23 +2844,24 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
                           amp.getName(), gain, patchedGain)
             gain = patchedGain
 
-        if self.config.doEmpiricalReadNoise and overscanImage is None:
+        if overscanResults is not None:
+            statistics = self.getOverscanStatistics(overscanResults)
+        elif overscanImage is not None:
+            statistics = OverscanStatistics(None, overscanImage)
+        else:
+            statistics = None
+
+        if self.config.doEmpiricalReadNoise and statistics is None:
             self.log.info("Overscan is none for EmpiricalReadNoise.")
 
-        if self.config.doEmpiricalReadNoise and overscanImage is not None:
-            stats = afwMath.StatisticsControl()
-            stats.setAndMask(overscanImage.mask.getPlaneBitMask(maskPlanes))
-            readNoise = afwMath.makeStatistics(overscanImage, afwMath.STDEVCLIP, stats).getValue()
+        if self.config.doEmpiricalReadNoise and statistics is not None:
+            readNoise = statistics.getResidualStatistics(self.getReadNoiseStatControl()).stdev
             self.log.info("Calculated empirical read noise for amp %s: %f.",
                           amp.getName(), readNoise)
         else:
             readNoise = amp.getReadNoise()
 
-        isrFunctions.updateVariance(
-            maskedImage=ampExposure.getMaskedImage(),
-            gain=gain,
-            readNoise=readNoise,
-        )
+        return gain, readNoise
 
     def darkCorrection(self, exposure, darkExposure, invert=False):
         """Apply dark correction in place.
@@ -2114,6 +2885,39 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         --------
         lsst.ip.isr.isrFunctions.darkCorrection
         """
+        expScale, darkScale = self.getDarkScales(exposure, darkExposure)
+
+        isrFunctions.darkCorrection(
+            maskedImage=exposure.getMaskedImage(),
+            darkMaskedImage=darkExposure.getMaskedImage(),
+            expScale=expScale,
+            darkScale=darkScale,
+            invert=invert,
+            trimToFit=self.config.doTrimToMatchCalib
+        )
+
+    def getDarkScales(self, exposure, darkExposure):
+        """Determine the dark times used to scale the dark.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure to process.
+        darkExposure : `lsst.afw.image.Exposure`
+            Dark exposure.
+
+        Returns
+        -------
+        expScale : `float`
+            Dark time of ``exposure``.
+        darkScale : `float`
+            Dark time of ``darkExposure``, or 1.0 if it is not defined.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if ``exposure`` does not have its dark time defined.
+        """
         expScale = exposure.getInfo().getVisitInfo().getDarkTime()
         if math.isnan(expScale):
             raise RuntimeError("Exposure darktime is NAN.")
@@ -2125,15 +2929,7 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             #           so getDarkTime() does not exist.
             self.log.warn("darkExposure.getInfo().getVisitInfo() does not exist. Using darkScale = 1.0.")
             darkScale = 1.0
-
-        isrFunctions.darkCorrection(
-            maskedImage=exposure.getMaskedImage(),
-            darkMaskedImage=darkExposure.getMaskedImage(),
-            expScale=expScale,
-            darkScale=darkScale,
-            invert=invert,
-            trimToFit=self.config.doTrimToMatchCalib
-        )
+        return expScale, darkScale
 
     def doLinearize(self, detector):
         """Check if linearization is needed for the detector cameraGeom.
@@ -2179,6 +2975,155 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             trimToFit=self.config.doTrimToMatchCalib
         )
 
+    def canFuseDetrend(self, detector, exposure=None):
+        """Check if the bias, dark and flat corrections can be fused.
+
+        The fused correction replaces the bias, variance, dark, flat
+        and NaN masking steps of `run`, and so can only be used if none
+        of the steps between them use or modify the intermediate image.
+
+        Parameters
+        ----------
+        detector : `lsst.afw.cameraGeom.Detector`
+            Detector to get linearity type from.
+        exposure : `lsst.afw.image.Exposure`, optional
+            Exposure to correct.  If ``config.doVariance`` is set, the
+            correction is applied amplifier by amplifier, and so can
+            only be fused if the amplifiers cover the whole exposure.
+
+        Returns
+        -------
+        canFuse : `Bool`
+            If True, `detrendCorrection` may be used.
+
+        Notes
+        -----
+        The mask-only steps (defect, edge and saturation trail masking)
+        do not prevent the fused correction.  NaN masking is done within
+        the fused correction, before the dark and flat are applied, as
+        it is when the corrections are applied in turn.  The variance
+        statistics saved when ``config.qa.saveStats`` is set are
+        measured before the dark and flat are applied, and so the
+        variance cannot be fused with them.
+        """
+        config = self.config
+        if not (config.doBias or config.doDark or config.doFlat):
+            return False
+        if config.doBias and config.doBiasBeforeOverscan:
+            return False
+        if config.doTrimToMatchCalib:
+            return False
+        if self.doLinearize(detector):
+            return False
+        if config.doCrosstalk and not config.doCrosstalkBeforeAssemble:
+            return False
+        if config.doCameraSpecificMasking or config.doBrighterFatter or config.doStrayLight:
+            return False
+        if config.doFringe and not config.fringeAfterFlat:
+            return False
+        if config.doVariance and config.qa is not None and config.qa.saveStats is True:
+            return False
+        if config.doVariance and exposure is not None:
+            exposureBBox = exposure.getBBox()
+            ampArea = sum(ampPlan.bbox.getArea() for ampPlan in getDetectorPlan(detector, config)
+                          if exposureBBox.contains(ampPlan.bbox))
+            if ampArea != exposureBBox.getArea():
+                return False
+        return True
+
+    def detrendCorrection(self, ccdExposure, ccd, overscans, bias=None, dark=None, flat=None,
+                          nanMaskVal=None):
+        """Apply fused bias, variance, dark and flat corrections in place.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure to process.
+        ccd : `lsst.afw.cameraGeom.Detector` or `list` [`FakeAmp`]
+            Amplifiers of the exposure.
+        overscans : `list` [`lsst.pipe.base.Struct` or `None`]
+            Overscan results for each amplifier, used for the empirical
+            read noise.
+        bias : `lsst.afw.image.Exposure`, optional
+            Bias exposure of the same size as ``ccdExposure``.
+        dark : `lsst.afw.image.Exposure`, optional
+            Dark exposure of the same size as ``ccdExposure``.
+        flat : `lsst.afw.image.Exposure`, optional
+            Flat exposure of the same size as ``ccdExposure``.
+        nanMaskVal : `int`, optional
+            Mask value to set for the non-finite pixels of the
+            bias-corrected image; see
+            `lsst.ip.isr.isrFunctions.detrendCorrection`.
+
+        Returns
+        -------
+        numNans : `int`
+            Number of pixels masked with ``nanMaskVal``.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the calibrations do not match the size of
+            ``ccdExposure``, or if the exposure dark time is not
+            defined.
+
+        Notes
+        -----
+        If ``config.doVariance`` is set, only the amplifiers contained in
+        ``ccdExposure`` are corrected; `canFuseDetrend` checks that they
+        cover it.
+
+        See Also
+        --------
+        lsst.ip.isr.isrFunctions.detrendCorrection
+        """
+        maskedImage = ccdExposure.getMaskedImage()
+        calibs = dict(biasMaskedImage=bias, darkMaskedImage=dark, flatMaskedImage=flat)
+        for name, calib in calibs.items():
+            if calib is not None:
+                calibs[name] = calib.getMaskedImage()
+                if calibs[name].getBBox(afwImage.LOCAL) != maskedImage.getBBox(afwImage.LOCAL):
+                    raise RuntimeError("maskedImage bbox %s != %s bbox %s" %
+                                       (maskedImage.getBBox(afwImage.LOCAL), name,
+                                        calibs[name].getBBox(afwImage.LOCAL)))
+
+        expScale, darkScale = 1.0, 1.0
+        if dark is not None:
+            expScale, darkScale = self.getDarkScales(ccdExposure, dark)
+        flatScale = 1.0
+        if flat is not None:
+            flatScale = isrFunctions.computeFlatScale(calibs['flatMaskedImage'],
+                                                      self.config.flatScalingType,
+                                                      userScale=self.config.flatUserScale)
+
+        if not self.config.doVariance:
+            return isrFunctions.detrendCorrection(maskedImage, expScale=expScale, darkScale=darkScale,
+                                                  flatScale=flatScale,
+                                                  rowsPerChunk=self.config.fusedDetrendRowsPerChunk,
+                                                  nanMaskVal=nanMaskVal, **calibs)
+
+        numNans = 0
+        offset = lsst.geom.Extent2I(ccdExposure.getXY0())
+        ampsByName = {amp.getName(): amp for amp in ccd}
+        for ampPlan, overscanResults in zip(getDetectorPlan(ccd, self.config), overscans):
+            amp = ampsByName[ampPlan.name]
+            if not ccdExposure.getBBox().contains(ampPlan.bbox):
+                continue
+            self.log.debug("Applying fused correction for amplifer %s.", amp.getName())
+            ampExposure = ccdExposure.Factory(ccdExposure, ampPlan.bbox)
+            localBBox = lsst.geom.Box2I(ampPlan.bbox.getMin() - offset, ampPlan.bbox.getDimensions())
+            ampCalibs = {name: (calib.Factory(calib, localBBox, afwImage.LOCAL)
+                                if calib is not None else None)
+                         for name, calib in calibs.items()}
+            gain, readNoise = self.getVarianceParameters(amp, overscanResults=overscanResults)
+
+            numNans += isrFunctions.detrendCorrection(ampExposure.getMaskedImage(), expScale=expScale,
+                                                      darkScale=darkScale, flatScale=flatScale,
+                                                      gain=gain, readNoise=readNoise,
+                                                      rowsPerChunk=self.config.fusedDetrendRowsPerChunk,
+                                                      nanMaskVal=nanMaskVal, **ampCalibs)
+        return numNans
+
     def saturationDetection(self, exposure, amp):
         """Detect saturated pixels and mask them using mask plane config.saturatedMaskName, in place.
 
@@ -2307,11 +3252,12 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
             if level == 'DETECTOR':
                 boxes = [maskedImage.getBBox()]
             elif level == 'AMP':
-                boxes = [amp.getBBox() for amp in exposure.getDetector()]
+                boxes = [ampPlan.bbox for ampPlan in getDetectorPlan(exposure.getDetector(), self.config)]
 
             for box in boxes:
                 # This makes a bbox numEdgeSuspect pixels smaller than the image on each side
                 subImage = maskedImage[box]
+                box = lsst.geom.Box2I(box)
                 box.grow(-numEdgePixels)
                 # Mask pixels outside box
                 SourceDetectionTask.setEdgeBits(
@@ -2501,6 +3447,122 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
         validPolygon = Polygon(ccdPoints)
         ccdExposure.getInfo().setValidPolygon(validPolygon)
 
+    def brighterFatterCorrection(self, ccdExposure, flat, dark, bfKernel, bfGains):
+        """Apply the brighter fatter correction in place.
+
+        The correction is measured on a clone of the exposure in which
+        the masked pixels have been interpolated (with the dark and flat
+        applied while interpolating), and the change due to the
+        correction is then added to ``ccdExposure``.  If
+        ``config.brighterFatterLowMemory`` is set this is done by
+        `lowMemoryBrighterFatterCorrection`.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure to correct.
+        flat : `lsst.afw.image.Exposure`
+            Flat exposure the same size as ``ccdExposure``.
+        dark : `lsst.afw.image.Exposure`
+            Dark exposure the same size as ``ccdExposure``.
+        bfKernel : `numpy.ndarray`
+            Brighter-fatter kernel to apply.
+        bfGains : `dict` [`str`, `float`]
+            Gains to use, keyed by amplifier name.
+
+        Returns
+        -------
+        diff : `float`
+            Final difference between iterations achieved in correction.
+        iteration : `int`
+            Number of iterations used to calculate correction.
+        """
+        if self.config.brighterFatterLowMemory:
+            return self.lowMemoryBrighterFatterCorrection(ccdExposure, flat, dark, bfKernel, bfGains)
+
+        interpExp = ccdExposure.clone()
+        with self.flatContext(interpExp, flat, dark):
+            isrFunctions.interpolateFromMask(
+                maskedImage=interpExp.getMaskedImage(),
+                fwhm=self.config.fwhm,
+                growSaturatedFootprints=self.config.growSaturationFootprintSize,
+                maskNameList=self.config.maskListToInterpolate
+            )
+        bfExp = interpExp.clone()
+
+        bfResults = isrFunctions.brighterFatterCorrection(bfExp, bfKernel,
+                                                          self.config.brighterFatterMaxIter,
+                                                          self.config.brighterFatterThreshold,
+                                                          self.config.brighterFatterApplyGain,
+                                                          bfGains)
+        image = ccdExposure.getMaskedImage().getImage()
+        bfCorr = bfExp.getMaskedImage().getImage()
+        bfCorr -= interpExp.getMaskedImage().getImage()
+        image += bfCorr
+
+        return bfResults
+
+    def lowMemoryBrighterFatterCorrection(self, ccdExposure, flat, dark, bfKernel, bfGains):
+        """Apply the brighter fatter correction in place, using as little
+        temporary memory as possible.
+
+        The correction is measured on a copy of the image in which the
+        masked pixels have been interpolated (with the dark and flat
+        applied while interpolating, as for `flatContext`), and the
+        change due to the correction is then added to ``ccdExposure``.
+        Only a copy of the image and mask planes, and one image-sized
+        scratch buffer, are allocated, compared to two full clones of
+        the exposure.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            Exposure to correct.
+        flat : `lsst.afw.image.Exposure`
+            Flat exposure the same size as ``ccdExposure``.
+        dark : `lsst.afw.image.Exposure`
+            Dark exposure the same size as ``ccdExposure``.
+        bfKernel : `numpy.ndarray`
+            Brighter-fatter kernel to apply.
+        bfGains : `dict` [`str`, `float`]
+            Gains to use, keyed by amplifier name.
+
+        Returns
+        -------
+        diff : `float`
+            Final difference between iterations achieved in correction.
+        iteration : `int`
+            Number of iterations used to calculate correction.
+        """
+        image = ccdExposure.getMaskedImage().getImage()
+        interpImage = image.clone()
+        # The scratch image serves as the (unused) variance plane while
+        # interpolating, and then holds the brighter fatter corrected image.
+        scratch = afwImage.ImageF(image.getBBox())
+        interpExp = afwImage.makeExposure(
+            afwImage.makeMaskedImage(interpImage, ccdExposure.getMask().clone(), scratch))
+        interpExp.getInfo().setVisitInfo(ccdExposure.getInfo().getVisitInfo())
+
+        with self.flatContext(interpExp, flat, dark):
+            isrFunctions.interpolateFromMask(
+                maskedImage=interpExp.getMaskedImage(),
+                fwhm=self.config.fwhm,
+                growSaturatedFootprints=self.config.growSaturationFootprintSize,
+                maskNameList=self.config.maskListToInterpolate
+            )
+        del interpExp
+
+        scratch.assign(interpImage)
+        bfResults = isrFunctions.brighterFatterCorrection(ccdExposure, bfKernel,
+                                                          self.config.brighterFatterMaxIter,
+                                                          self.config.brighterFatterThreshold,
+                                                          self.config.brighterFatterApplyGain,
+                                                          bfGains, image=scratch)
+        scratch -= interpImage
+        image += scratch
+
+        return bfResults
+
     @contextmanager
     def flatContext(self, exp, flat, dark=None):
         """Context manager that applies and removes flats and darks,
@@ -2554,6 +3616,25 @@ class IsrTask(pipeBase.PipelineTask, pipeBase.CmdLineTask):
                     break
 
 
+_batchTask = None
+_batchCalibs = None
+
+
+def _initBatchWorker(taskClass, config, calibs):
+    """Construct the task and calibrations used by a `IsrTask.runBatch`
+    worker process.
+    """
+    global _batchTask, _batchCalibs
+    _batchTask = taskClass(config=config)
+    _batchCalibs = calibs
+
+
+def _runBatchWorker(index, exposure):
+    """Process one exposure in a `IsrTask.runBatch` worker process.
+    """
+    return index, _batchTask.run(exposure, **_batchCalibs)
+
+
 class FakeAmp(object):
     """A Detector-like object that supports returning gain and saturation level
 
@@ -2574,15 +3655,24 @@ class FakeAmp(object):
         self._readNoise = config.readNoise
         self._saturation = config.saturation
 
+    def getName(self):
+        return ""
+
     def getBBox(self):
         return self._bbox
 
     def getRawBBox(self):
         return self._bbox
 
+    def getRawDataBBox(self):
+        return self._bbox
+
     def getRawHorizontalOverscanBBox(self):
         return self._RawHorizontalOverscanBBox
 
+    def getRawPrescanBBox(self):
+        return self._RawHorizontalOverscanBBox
+
     def getGain(self):
         return self._gain
 
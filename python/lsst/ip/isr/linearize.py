@@ -30,7 +30,7 @@ from lsst.geom import Box2I, Point2I, Extent2I
 from .applyLookupTable import applyLookupTable
 from .calibType import IsrCalib
 
-__all__ = ["Linearizer",
+__all__ = ["Linearizer", "LinearityPlan",
            "LinearizeBase", "LinearizeLookupTable", "LinearizeSquared",
            "LinearizeProportional", "LinearizePolynomial", "LinearizeSpline", "LinearizeNone"]
 
@@ -110,6 +110,8 @@ class Linearizer(IsrCalib):
         self.fitChiSq = dict()
 
         self.tableData = None
+        self._validatedDetector = None
+        self._linearityPlan = None
         if table is not None:
             if len(table.shape) != 2:
                 raise RuntimeError("table shape = %s; must have two dimensions" % (table.shape,))
@@ -161,6 +163,8 @@ class Linearizer(IsrCalib):
         self._detectorSerial = detector.getSerial()
         self._detectorId = detector.getId()
         self.hasLinearity = True
+        self._validatedDetector = None
+        self._linearityPlan = None
 
         # Do not translate Threshold, Maximum, Units.
         for amp in detector.getAmplifiers():
@@ -425,6 +429,108 @@ class Linearizer(IsrCalib):
                     raise RuntimeError("Amplifier %s coeffs %s does not match saved value %s" %
                                        (ampName, amp.getLinearityCoeffs(), self.linearityCoeffs[ampName]))
 
+        if detector and not amplifier:
+            self._validatedDetector = self._detectorKey(detector)
+
+    @staticmethod
+    def _detectorKey(detector):
+        """Return the identifiers of a detector checked by `validate`.
+
+        Parameters
+        ----------
+        detector : `lsst.afw.cameraGeom.Detector`
+            Detector to identify.
+
+        Returns
+        -------
+        key : `tuple`
+            Detector name, id and serial number.
+        """
+        return (detector.getName(), int(detector.getId()), detector.getSerial())
+
+    def isValidated(self, detector):
+        """Check whether this linearizer has already been validated
+        against a detector.
+
+        Parameters
+        ----------
+        detector : `lsst.afw.cameraGeom.Detector`
+            Detector to check.
+
+        Returns
+        -------
+        validated : `bool`
+            True if `validate` has succeeded for this detector since the
+            linearity parameters were last read from a detector.
+        """
+        return detector is not None and self._validatedDetector == self._detectorKey(detector)
+
+    def getLinearityPlan(self, detector=None):
+        """Return the linearity plan of this linearizer for a detector.
+
+        Parameters
+        ----------
+        detector : `lsst.afw.cameraGeom.Detector`, optional
+            Detector the plan is used for.
+
+        Returns
+        -------
+        plan : `LinearityPlan`
+            The plan, built once per detector.  It is rebuilt when the
+            linearity parameters are read from a detector, or when the
+            linearity types, boxes or coefficients, or the lookup table,
+            are assigned or edited.
+        """
+        detectorKey = self._detectorKey(detector) if detector is not None else None
+        parameterKey = self._parameterKey()
+        plan = self._linearityPlan
+        if (plan is None or plan.detectorKey != detectorKey or plan.parameterKey != parameterKey
+                or not np.array_equal(plan.coeffValues, self._coeffValues(), equal_nan=True)):
+            self._linearityPlan = LinearityPlan(self, detectorKey=detectorKey)
+        return self._linearityPlan
+
+    def _parameterKey(self):
+        """Return the identities of the linearity parameters a
+        `LinearityPlan` is built from.
+
+        Returns
+        -------
+        key : `tuple`
+            Linearity type of each amplifier, and the identities of the
+            boxes, of the coefficient arrays and of the lookup table.
+            The plan holds these objects, so their identities are not
+            reused while it exists.  Edits of the coefficients in place
+            are found by `_coeffValues`; the plan uses the boxes and
+            views of the table rows themselves, so their edits in place
+            need not be tracked.
+        """
+        return (tuple(self.linearityType.items()), tuple(map(id, self.linearityBBox.values())),
+                tuple(map(id, self.linearityCoeffs.values())), id(self.tableData))
+
+    def _coeffValues(self):
+        """Return the linearity coefficients of all the amplifiers.
+
+        Returns
+        -------
+        values : `numpy.ndarray`
+            Coefficients of each amplifier, concatenated in a single
+            array.
+        """
+        if not self.linearityCoeffs:
+            return np.zeros(0)
+        return np.asarray(np.concatenate(list(self.linearityCoeffs.values()), axis=None), dtype=float)
+
+    def __getstate__(self):
+        # The plan holds interpolators that cannot be pickled; it is
+        # rebuilt when needed.
+        state = super().__getstate__()
+        state.pop("_linearityPlan", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._linearityPlan = None
+
     def applyLinearity(self, image, detector=None, log=None):
         """Apply the linearity to an image.
 
@@ -440,25 +546,114 @@ class Linearizer(IsrCalib):
             populated.
         log : `~lsst.log.Log`, optional
             Log object to use for logging.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Results, with attributes:
+
+            ``numAmps``
+                Number of amplifiers considered (`int`).
+            ``numLinearized``
+                Number of amplifiers linearized (`int`).
+            ``numOutOfRange``
+                Number of pixels out of range of a lookup table (`int`).
+
+        Notes
+        -----
+        The corrections are applied by a `LinearityPlan`, built once per
+        detector and rebuilt when the linearity parameters change.
         """
         if log is None:
             log = self.log
         if detector and not self.hasLinearity:
             self.fromDetector(detector)
 
-        self.validate(detector)
+        if not self.isValidated(detector):
+            self.validate(detector)
 
-        numAmps = 0
+        return self.getLinearityPlan(detector).apply(image, log=log, tableLog=self.log)
+
+
+class LinearityPlan:
+    """Linearity parameters of the amplifiers of a detector, grouped by
+    linearity type.
+
+    The per-amplifier work of `Linearizer.applyLinearity` (finding the
+    linearity class, checking the coefficients, building interpolators
+    and table rows) is done once, by `LinearizeBase.prepare`.  Each
+    amplifier is then corrected by `LinearizeBase.correct` of a single
+    functor per linearity type.
+
+    Parameters
+    ----------
+    linearizer : `Linearizer`
+        Linearizer to plan.
+    detectorKey : `tuple`, optional
+        Identifiers of the detector the plan is built for.
+
+    Raises
+    ------
+    RuntimeError :
+        Raised if a lookup table row index is out of the table bounds.
+
+    Notes
+    -----
+    ``groups`` maps the name of each linearity type to a
+    `lsst.pipe.base.Struct` with the ``ampNames``, ``bboxes``, ``coeffs``
+    and prepared ``params`` of its amplifiers, and the ``linearity``
+    functor of the type.  Amplifiers of unknown type are counted but not
+    corrected.
+    """
+
+    def __init__(self, linearizer, detectorKey=None):
+        self.detectorKey = detectorKey
+        self.parameterKey = linearizer._parameterKey()
+        self.coeffValues = linearizer._coeffValues()
+        # Held so that the identities in ``parameterKey`` are not reused
+        # while the plan exists.
+        self.tableData = linearizer.tableData
+        self.linearityBBox = list(linearizer.linearityBBox.values())
+        self.linearityCoeffs = list(linearizer.linearityCoeffs.values())
+        self.numAmps = len(linearizer.linearityType)
+        self.groups = dict()
+        for ampName, linearityTypeName in linearizer.linearityType.items():
+            linearityType = linearizer.getLinearityTypeByName(linearityTypeName)
+            if linearityType is None:
+                continue
+            group = self.groups.get(linearityType.LinearityType)
+            if group is None:
+                group = Struct(ampNames=[], bboxes=[], coeffs=[], params=[], linearity=linearityType())
+                self.groups[linearityType.LinearityType] = group
+            coeffs = linearizer.linearityCoeffs[ampName]
+            group.ampNames.append(ampName)
+            group.bboxes.append(linearizer.linearityBBox[ampName])
+            group.coeffs.append(coeffs)
+            group.params.append(group.linearity.prepare(coeffs, table=linearizer.tableData))
+
+    def apply(self, image, log=None, tableLog=None):
+        """Correct the non-linearity of an image in place.
+
+        Parameters
+        ----------
+        image : `lsst.afw.image.Image`
+            Image to correct.
+        log : `lsst.log.Log`, optional
+            Log for the amplifiers that did not linearize.
+        tableLog : `lsst.log.Log`, optional
+            Log for the pixels out of range of a lookup table.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Results, as returned by `Linearizer.applyLinearity`.
+        """
         numLinearized = 0
         numOutOfRange = 0
-        for ampName in self.linearityType.keys():
-            linearizer = self.getLinearityTypeByName(self.linearityType[ampName])
-            numAmps += 1
-            if linearizer is not None:
-                ampView = image.Factory(image, self.linearityBBox[ampName])
-                success, outOfRange = linearizer()(ampView, **{'coeffs': self.linearityCoeffs[ampName],
-                                                               'table': self.tableData,
-                                                               'log': self.log})
+        for group in self.groups.values():
+            for ampName, bbox, params in zip(group.ampNames, group.bboxes, group.params):
+                ampView = image.Factory(image, bbox)
+                success, outOfRange = group.linearity.correct(ampView, params, log=tableLog)
                 numOutOfRange += outOfRange
                 if success:
                     numLinearized += 1
@@ -466,7 +661,7 @@ class Linearizer(IsrCalib):
                     log.warn("Amplifier %s did not linearize.",
                              ampName)
         return Struct(
-            numAmps=numAmps,
+            numAmps=self.numAmps,
             numLinearized=numLinearized,
             numOutOfRange=numOutOfRange
         )
@@ -477,7 +672,10 @@ class LinearizeBase(metaclass=abc.ABCMeta):
 
     Subclasses must define __call__ and set class variable
     LinearityType to a string that will be used for linearity type in
-    the cameraGeom.Amplifier.linearityType field.
+    the cameraGeom.Amplifier.linearityType field.  The correction is
+    split between `prepare`, which computes the parameters of an
+    amplifier once, and `correct`, which applies them to an image;
+    `LinearityPlan` calls these directly.
 
     All linearity corrections should be defined in terms of an
     additive correction, such that:
@@ -516,6 +714,44 @@ class LinearizeBase(metaclass=abc.ABCMeta):
         """
         pass
 
+    def prepare(self, coeffs, table=None):
+        """Compute the parameters of the correction of one amplifier.
+
+        Parameters
+        ----------
+        coeffs : `list` or `numpy.array`
+            Coefficient vector of the amplifier.
+        table : `numpy.array`, optional
+            Lookup table data.
+
+        Returns
+        -------
+        params : `object`
+            Parameters for `correct`.
+        """
+        return coeffs
+
+    def correct(self, image, params, log=None):
+        """Correct non-linearity with parameters from `prepare`.
+
+        Parameters
+        ----------
+        image : `lsst.afw.image.Image`
+            Image to be corrected.
+        params : `object`
+            Parameters returned by `prepare`.
+        log : `lsst.log.Log`, optional
+            Logger to handle messages.
+
+        Returns
+        -------
+        output : `tuple` [`bool`, `int`]
+            If true, a correction was applied successfully.  The
+            integer indicates the number of pixels that were
+            uncorrectable by being out of range.
+        """
+        return True, 0
+
 
 class LinearizeLookupTable(LinearizeBase):
     """Correct non-linearity with a persisted lookup table.
@@ -568,19 +804,34 @@ class LinearizeLookupTable(LinearizeBase):
             Raised if the requested row index is out of the table
             bounds.
         """
-        numOutOfRange = 0
+        return self.correct(image, self.prepare(kwargs['coeffs'], table=kwargs['table']),
+                            log=kwargs['log'])
 
-        rowInd, colIndOffset = kwargs['coeffs'][0:2]
-        table = kwargs['table']
-        log = kwargs['log']
+    def prepare(self, coeffs, table=None):
+        """Select the table row of one amplifier.
+
+        Returns
+        -------
+        params : `tuple` [`numpy.array`, `float`]
+            Table row and column index offset.
 
+        Raises
+        ------
+        RuntimeError:
+            Raised if the requested row index is out of the table
+            bounds.
+        """
+        rowInd, colIndOffset = coeffs[0:2]
         numTableRows = table.shape[0]
         rowInd = int(rowInd)
         if rowInd < 0 or rowInd > numTableRows:
             raise RuntimeError("LinearizeLookupTable rowInd=%s not in range[0, %s)" %
                                (rowInd, numTableRows))
-        tableRow = table[rowInd, :]
-        numOutOfRange += applyLookupTable(image, tableRow, colIndOffset)
+        return table[rowInd, :], colIndOffset
+
+    def correct(self, image, params, log=None):
+        tableRow, colIndOffset = params
+        numOutOfRange = applyLookupTable(image, tableRow, colIndOffset)
 
         if numOutOfRange > 0 and log is not None:
             log.warn("%s pixels were out of range of the linearization table",
@@ -632,14 +883,30 @@ class LinearizePolynomial(LinearizeBase):
             integer indicates the number of pixels that were
             uncorrectable by being out of range.
         """
-        if not np.any(np.isfinite(kwargs['coeffs'])):
-            return False, 0
-        if not np.any(kwargs['coeffs']):
+        return self.correct(image, self.prepare(kwargs['coeffs']), log=kwargs.get('log'))
+
+    def prepare(self, coeffs, table=None):
+        """Check whether the coefficients of one amplifier correct anything.
+
+        Returns
+        -------
+        params : `list` or `numpy.array` or `None`
+            The coefficients, or `None` if they are all zero or not
+            finite.
+        """
+        if not np.any(np.isfinite(coeffs)):
+            return None
+        if not np.any(coeffs):
+            return None
+        return coeffs
+
+    def correct(self, image, params, log=None):
+        if params is None:
             return False, 0
 
         ampArray = image.getArray()
         correction = np.zeros_like(ampArray)
-        for order, coeff in enumerate(kwargs['coeffs'], start=2):
+        for order, coeff in enumerate(params, start=2):
             correction += coeff * np.power(ampArray, order)
         ampArray += correction
 
@@ -677,7 +944,15 @@ class LinearizeSquared(LinearizeBase):
             uncorrectable by being out of range.
         """
 
-        sqCoeff = kwargs['coeffs'][0]
+        return self.correct(image, self.prepare(kwargs['coeffs']), log=kwargs.get('log'))
+
+    def prepare(self, coeffs, table=None):
+        """Return the squared coefficient of one amplifier.
+        """
+        return coeffs[0]
+
+    def correct(self, image, params, log=None):
+        sqCoeff = params
         if sqCoeff != 0:
             ampArr = image.getArray()
             ampArr *= (1 + sqCoeff*ampArr)
@@ -722,11 +997,22 @@ class LinearizeSpline(LinearizeBase):
             integer indicates the number of pixels that were
             uncorrectable by being out of range.
         """
-        splineCoeff = kwargs['coeffs']
-        centers, values = np.split(splineCoeff, 2)
-        interp = afwMath.makeInterpolate(centers.tolist(), values.tolist(),
-                                         afwMath.stringToInterpStyle("AKIMA_SPLINE"))
+        return self.correct(image, self.prepare(kwargs['coeffs']), log=kwargs.get('log'))
+
+    def prepare(self, coeffs, table=None):
+        """Build the interpolator of one amplifier.
+
+        Returns
+        -------
+        params : `lsst.afw.math.Interpolate`
+            Spline of the correction.
+        """
+        centers, values = np.split(coeffs, 2)
+        return afwMath.makeInterpolate(centers.tolist(), values.tolist(),
+                                       afwMath.stringToInterpStyle("AKIMA_SPLINE"))
 
+    def correct(self, image, params, log=None):
+        interp = params
         ampArr = image.getArray()
         delta = interp.interpolate(ampArr.flatten())
         ampArr -= np.array(delta).reshape(ampArr.shape)
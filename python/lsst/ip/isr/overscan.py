@@ -19,13 +19,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import threading
+
 import numpy as np
 import lsst.afw.math as afwMath
 import lsst.afw.image as afwImage
 import lsst.pipe.base as pipeBase
 import lsst.pex.config as pexConfig
 
-__all__ = ["OverscanCorrectionTaskConfig", "OverscanCorrectionTask"]
+from .ampStatistics import _controlKey
+from .isr import computeRowStatistics
+
+__all__ = ["OverscanCorrectionTaskConfig", "OverscanCorrectionTask", "OverscanStatistics",
+           "OverscanCorrectionStream", "OverscanFitOperator", "getFitOperator",
+           "OverscanModel"]
 
 
 class OverscanCorrectionTaskConfig(pexConfig.Config):
@@ -70,6 +77,331 @@ class OverscanCorrectionTaskConfig(pexConfig.Config):
             " and fitType=MEDIAN_PER_ROW.",
         default=True,
     )
+    streamWindowRows = pexConfig.Field(
+        dtype=int,
+        doc="Number of most recent overscan rows fit by the polynomial and spline fit types when "
+            "correcting an amplifier in row blocks as it is read out; see `OverscanCorrectionStream`.",
+        default=500, check=lambda x: x > 0
+    )
+    doInPlaceSubtraction = pexConfig.Field(
+        dtype=bool,
+        doc="Subtract the vector fit types directly from the image arrays, rather than through "
+            "amplifier-sized model images, and only build the model images if they are requested.  "
+            "The ``imageFit`` and ``overscanFit`` results are then `OverscanModel` objects.  "
+            "IsrTask requests the overscan-sized model of every amplifier to measure the "
+            "ISR_OSCAN_LEVEL and ISR_OSCAN_SIGMA metadata, so only the amplifier-sized model is "
+            "avoided there.",
+        default=False,
+    )
+    numRowStatisticsThreads = pexConfig.Field(
+        dtype=int,
+        doc="Number of threads used by the compiled row-statistics kernel to collapse the overscan "
+            "for the polynomial and spline fit types; 0 uses the numpy implementation.  Unlike the "
+            "numpy implementation, the kernel excludes non-finite pixels from the row means.",
+        default=0, check=lambda x: x >= 0
+    )
+
+
+class OverscanFitOperator:
+    """Precomputed least-squares operator for the polynomial and spline
+    fits of collapsed overscan vectors of one length.
+
+    Polynomial fits are reduced to a matrix-vector product with the
+    pseudo-inverse of the Vandermonde matrix, and spline fits to sums
+    over precomputed bin memberships, so that repeated fits of
+    overscan regions with the same number of rows do not repeat the
+    setup of the solution.
+
+    Parameters
+    ----------
+    fitType : `str`
+        Overscan fit type; one of ``POLY``, ``CHEB``, ``LEG``,
+        ``NATURAL_SPLINE``, ``CUBIC_SPLINE`` or ``AKIMA_SPLINE``.
+    num : `int`
+        Number of rows of the collapsed overscan vector.
+    order : `int`
+        Polynomial order, or number of spline bins.
+    """
+    polyFitTypes = {
+        'POLY': np.polynomial.polynomial.polyvander,
+        'CHEB': np.polynomial.chebyshev.chebvander,
+        'LEG': np.polynomial.legendre.legvander,
+    }
+    splineFitTypes = ('NATURAL_SPLINE', 'CUBIC_SPLINE', 'AKIMA_SPLINE')
+
+    def __init__(self, fitType, num, order):
+        self.fitType = fitType
+        self.num = num
+        self.order = order
+        self.indices = 2.0*np.arange(num)/float(num) - 1.0
+
+        if fitType in self.polyFitTypes:
+            self.vander = self.polyFitTypes[fitType](self.indices, order)
+            # Scale the columns to improve the conditioning, as the
+            # numpy.polynomial fitters do.
+            scale = np.sqrt(np.square(self.vander).sum(axis=0))
+            scale[scale == 0] = 1
+            pseudoInverse = np.linalg.pinv(self.vander/scale, rcond=num*np.finfo(float).eps)
+            self.pseudoInverse = pseudoInverse/scale[:, np.newaxis]
+        elif fitType in self.splineFitTypes:
+            # Equal-width bins over the index range, with the last bin
+            # closed on the right, as in `numpy.histogram`.
+            binEdges = np.histogram_bin_edges(self.indices, bins=order)
+            self.binIndex = np.clip(np.searchsorted(binEdges, self.indices, side="right") - 1, 0, order - 1)
+            # The bin populations of a fully unmasked vector are reused
+            # for every such vector.
+            self.numPerBin = np.bincount(self.binIndex, minlength=order).astype(float)
+            self.binCenters = np.bincount(self.binIndex, weights=self.indices, minlength=order)/self.numPerBin
+            self.interpStyle = afwMath.stringToInterpStyle(fitType)
+        else:
+            raise RuntimeError(f"No fit operator for overscan fit type {fitType}.")
+
+    def fitPolynomial(self, collapsed):
+        """Fit and evaluate the polynomial of collapsed overscan vectors.
+
+        Parameters
+        ----------
+        collapsed : `numpy.ndarray`
+            Collapsed overscan values, of shape ``(num,)``, or
+            ``(num, K)`` to fit ``K`` vectors at once.
+
+        Returns
+        -------
+        overscanValue : `numpy.ndarray`
+            Fit evaluated at each row, with the shape of ``collapsed``.
+
+        Notes
+        -----
+        As for the `numpy.polynomial` fitters, masked rows are not
+        excluded from the fit.
+        """
+        return self.vander @ (self.pseudoInverse @ collapsed)
+
+    def fitSpline(self, collapsed, collapsedMask=None):
+        """Fit and evaluate the spline of a collapsed overscan vector.
+
+        Parameters
+        ----------
+        collapsed : `numpy.ndarray`, (num,)
+            Collapsed overscan values.
+        collapsedMask : `numpy.ndarray`, (num,), optional
+            Rows to exclude from the fit.
+
+        Returns
+        -------
+        overscanValue : `numpy.ndarray`
+            Spline evaluated at each row.
+
+        Notes
+        -----
+        The spline is fit to the mean value and position of the
+        unmasked rows of each bin, as in
+        `OverscanCorrectionTask.splineFit`.  The bin populations are
+        only recomputed if rows are masked.
+        """
+        if collapsedMask is None or not collapsedMask.any():
+            numPerBin = self.numPerBin
+            binCenters = self.binCenters
+            values = np.bincount(self.binIndex, weights=collapsed, minlength=self.order)/numPerBin
+        else:
+            good = ~collapsedMask
+            numPerBin = np.bincount(self.binIndex, weights=good, minlength=self.order)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.bincount(self.binIndex, weights=collapsed*good, minlength=self.order)/numPerBin
+                binCenters = np.bincount(self.binIndex, weights=self.indices*good,
+                                         minlength=self.order)/numPerBin
+        populated = numPerBin > 0
+        interp = afwMath.makeInterpolate(binCenters[populated], values[populated], self.interpStyle)
+        return np.array(interp.interpolate(self.indices))
+
+
+_fitOperatorCache = dict()
+_fitOperatorCacheLock = threading.Lock()
+_maxCachedFitOperators = 64
+
+
+def getFitOperator(fitType, num, order):
+    """Return the fit operator for collapsed overscan vectors of one
+    length, reusing the operators of earlier fits.
+
+    Parameters
+    ----------
+    fitType : `str`
+        Overscan fit type.
+    num : `int`
+        Number of rows of the collapsed overscan vector.
+    order : `int`
+        Polynomial order, or number of spline bins.
+
+    Returns
+    -------
+    operator : `lsst.ip.isr.OverscanFitOperator`
+        Fit operator.
+    """
+    key = (fitType, num, order)
+    with _fitOperatorCacheLock:
+        operator = _fitOperatorCache.get(key)
+    if operator is None:
+        operator = OverscanFitOperator(fitType, num, order)
+        with _fitOperatorCacheLock:
+            if len(_fitOperatorCache) >= _maxCachedFitOperators:
+                _fitOperatorCache.pop(next(iter(_fitOperatorCache)))
+            _fitOperatorCache[key] = operator
+    return operator
+
+
+class OverscanModel:
+    """Overscan fit of the vector fit types, broadcast over an image only
+    when it is requested.
+
+    Parameters
+    ----------
+    overscanValue : `numpy.ndarray`
+        Overscan value of each row (or of each column, if
+        ``isTransposed``) of the image.
+    dimensions : `lsst.geom.Extent2I`
+        Dimensions of the image the fit was subtracted from.
+    isTransposed : `bool`
+        Whether ``overscanValue`` runs along the columns of the image.
+
+    Notes
+    -----
+    `OverscanStatistics` measures the fit on the image from `getImage`,
+    so that the statistics are identical to those of a fit image.
+    Recording the overscan level in the metadata therefore builds the
+    image of the overscan fit.
+    """
+    def __init__(self, overscanValue, dimensions, isTransposed):
+        self.overscanValue = overscanValue
+        self.dimensions = dimensions
+        self.isTransposed = isTransposed
+        self._image = None
+
+    def getDimensions(self):
+        """Return the dimensions of the image the fit was subtracted
+        from.
+
+        Returns
+        -------
+        dimensions : `lsst.geom.Extent2I`
+            Image dimensions.
+        """
+        return self.dimensions
+
+    def getArray(self):
+        """Return the fit as a read-only array, without copying it.
+
+        Returns
+        -------
+        array : `numpy.ndarray`
+            Broadcast view of the overscan values, with the shape of the
+            image.
+        """
+        shape = (self.dimensions.getY(), self.dimensions.getX())
+        if self.isTransposed:
+            return np.broadcast_to(self.overscanValue[np.newaxis, :], shape)
+        return np.broadcast_to(self.overscanValue[:, np.newaxis], shape)
+
+    def getImage(self):
+        """Return the fit as an image, building it on the first call.
+
+        Returns
+        -------
+        image : `lsst.afw.image.ImageF`
+            Image of the overscan fit.
+        """
+        if self._image is None:
+            self._image = afwImage.ImageF(self.dimensions)
+            self._image.getArray()[:, :] = self.getArray()
+        return self._image
+
+
+class OverscanStatistics:
+    """Summary statistics of the overscan correction of one amplifier.
+
+    The median and clipped standard deviation of the overscan fit and
+    of the corrected overscan are each measured in a single pass the
+    first time they are requested, and reused by every later request
+    with an identical statistics control.
+
+    Parameters
+    ----------
+    overscanFit : `float`, `lsst.afw.image.Image` or `OverscanModel`
+        Value or fit subtracted from the overscan image data.
+    overscanImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Image of the overscan region with the overscan correction
+        applied.
+    """
+    def __init__(self, overscanFit, overscanImage):
+        self.overscanFit = overscanFit
+        self.overscanImage = overscanImage
+        self._cache = dict()
+
+    def _measure(self, name, image, statControl):
+        """Measure the median and clipped standard deviation of an image.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the image, used to cache the results.
+        image : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+            Image to measure.
+        statControl : `lsst.afw.math.StatisticsControl`
+            Statistics control object.
+
+        Returns
+        -------
+        statistics : `lsst.pipe.base.Struct`
+            Result struct with components:
+            - ``median`` : median of the image (`float`).
+            - ``stdev`` : clipped standard deviation of the image
+              (`float`).
+        """
+        key = (name, _controlKey(statControl))
+        statistics = self._cache.get(key)
+        if statistics is None:
+            if isinstance(image, OverscanModel):
+                image = image.getImage()
+            stats = afwMath.makeStatistics(image, afwMath.MEDIAN | afwMath.STDEVCLIP, statControl)
+            statistics = pipeBase.Struct(median=stats.getValue(afwMath.MEDIAN),
+                                         stdev=stats.getValue(afwMath.STDEVCLIP))
+            self._cache[key] = statistics
+        return statistics
+
+    def getFitStatistics(self, statControl):
+        """Return the statistics of the overscan fit.
+
+        Parameters
+        ----------
+        statControl : `lsst.afw.math.StatisticsControl`
+            Statistics control object.
+
+        Returns
+        -------
+        statistics : `lsst.pipe.base.Struct`
+            Median (``median``) and clipped standard deviation
+            (``stdev``) of the fit.  A constant fit has a standard
+            deviation of zero.
+        """
+        if isinstance(self.overscanFit, float):
+            return pipeBase.Struct(median=self.overscanFit, stdev=0.0)
+        return self._measure("fit", self.overscanFit, statControl)
+
+    def getResidualStatistics(self, statControl):
+        """Return the statistics of the corrected overscan.
+
+        Parameters
+        ----------
+        statControl : `lsst.afw.math.StatisticsControl`
+            Statistics control object.
+
+        Returns
+        -------
+        statistics : `lsst.pipe.base.Struct`
+            Median (``median``) and clipped standard deviation
+            (``stdev``) of the overscan after correction.
+        """
+        return self._measure("residual", self.overscanImage, statControl)
 
 
 class OverscanCorrectionTask(pipeBase.Task):
@@ -87,6 +419,10 @@ class OverscanCorrectionTask(pipeBase.Task):
     ConfigClass = OverscanCorrectionTaskConfig
     _DefaultName = "overscan"
 
+    constantFitTypes = ('MEAN', 'MEANCLIP', 'MEDIAN')
+    vectorFitTypes = ('MEDIAN_PER_ROW', 'POLY', 'CHEB', 'LEG',
+                      'NATURAL_SPLINE', 'CUBIC_SPLINE', 'AKIMA_SPLINE')
+
     def __init__(self, statControl=None, **kwargs):
         super().__init__(**kwargs)
         self.allowDebug = True
@@ -117,15 +453,23 @@ class OverscanCorrectionTask(pipeBase.Task):
 
             ``imageFit``
                 Value or fit subtracted from the amplifier image data
-                (scalar or `lsst.afw.image.Image`).
+                (scalar, `lsst.afw.image.Image` or `OverscanModel`).
             ``overscanFit``
                 Value or fit subtracted from the overscan image data
-                (scalar or `lsst.afw.image.Image`).
+                (scalar, `lsst.afw.image.Image` or `OverscanModel`).
             ``overscanImage``
                 Image of the overscan region with the overscan
                 correction applied (`lsst.afw.image.Image`). This
                 quantity is used to estimate the amplifier read noise
                 empirically.
+            ``edgeMask``
+                Mask of the ``SUSPECT`` pixels at extrapolated edges
+                (`lsst.afw.image.Mask` or `None`; with
+                ``config.doInPlaceSubtraction``, a boolean
+                `numpy.ndarray` of the masked rows or columns).
+            ``statistics``
+                Statistics of the fit and of the corrected overscan,
+                measured on demand (`OverscanStatistics`).
 
         Raises
         ------
@@ -133,16 +477,102 @@ class OverscanCorrectionTask(pipeBase.Task):
             Raised if an invalid overscan type is set.
 
         """
-        if self.config.fitType in ('MEAN', 'MEANCLIP', 'MEDIAN'):
+        if self.config.fitType in self.constantFitTypes:
             overscanResult = self.measureConstantOverscan(overscanImage)
-            overscanValue = overscanResult.overscanValue
+        elif self.config.fitType in self.vectorFitTypes:
+            overscanResult = self.measureVectorOverscan(overscanImage)
+        else:
+            raise RuntimeError('%s : %s an invalid overscan type' %
+                               ("overscanCorrection", self.config.fitType))
+        return self.applyOverscan(ampImage, overscanImage, overscanResult, amp)
+
+    def runDetector(self, ampImages, overscanImages, amps=None):
+        """Measure and remove the overscans of all the amplifiers of a
+        detector.
+
+        The vector overscans of amplifiers with the same overscan
+        geometry are stacked and measured together, so the outlier
+        rejection, collapse and polynomial fit are each done once per
+        detector rather than once per amplifier.
+
+        Parameters
+        ----------
+        ampImages : `list` [`lsst.afw.image.Image`]
+            Image data that will have the overscans removed.
+        overscanImages : `list` [`lsst.afw.image.Image`]
+            Overscan data that the overscans are measured from, in the
+            same order as ``ampImages``.
+        amps : `list` [`lsst.afw.cameraGeom.Amplifier`], optional
+            Amplifiers to use for debugging purposes.
+
+        Returns
+        -------
+        overscanResults : `list` [`lsst.pipe.base.Struct`]
+            Result of `run` for each amplifier, in the same order as
+            ``ampImages``.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if an invalid overscan type is set.
+        """
+        if amps is None:
+            amps = [None]*len(ampImages)
+        if self.config.fitType in self.constantFitTypes:
+            measurements = [self.measureConstantOverscan(image) for image in overscanImages]
+        elif self.config.fitType in self.vectorFitTypes:
+            measurements = self.measureVectorOverscans(overscanImages)
+        else:
+            raise RuntimeError('%s : %s an invalid overscan type' %
+                               ("overscanCorrection", self.config.fitType))
+        return [self.applyOverscan(ampImage, overscanImage, overscanResult, amp)
+                for ampImage, overscanImage, overscanResult, amp
+                in zip(ampImages, overscanImages, measurements, amps)]
+
+    def makeStream(self, amp=None):
+        """Start correcting an amplifier in row blocks as it is read out.
+
+        Parameters
+        ----------
+        amp : `lsst.afw.cameraGeom.Amplifier`, optional
+            Amplifier being read out, used in log messages.
+
+        Returns
+        -------
+        stream : `OverscanCorrectionStream`
+            Streaming overscan correction of the amplifier.
+        """
+        return OverscanCorrectionStream(self, amp=amp)
+
+    def applyOverscan(self, ampImage, overscanImage, overscanResult, amp=None):
+        """Remove a measured overscan from an amplifier image.
+
+        Parameters
+        ----------
+        ampImage : `lsst.afw.image.Image`
+            Image data that will have the overscan removed.
+        overscanImage : `lsst.afw.image.Image`
+            Overscan data that the overscan was measured from.
+        overscanResult : `lsst.pipe.base.Struct`
+            Result of `measureConstantOverscan` or
+            `measureVectorOverscan`.
+        amp : `lsst.afw.cameraGeom.Amplifier`, optional
+            Amplifier to use for debugging purposes.
+
+        Returns
+        -------
+        overscanResults : `lsst.pipe.base.Struct`
+            Result struct; see `run`.
+        """
+        overscanValue = overscanResult.overscanValue
+        if overscanResult.maskArray is not None and self.config.doInPlaceSubtraction:
+            return self.applyOverscanInPlace(ampImage, overscanImage, overscanResult, amp=amp)
+
+        if overscanResult.maskArray is None:
             offImage = overscanValue
             overscanModel = overscanValue
             maskSuspect = None
-        elif self.config.fitType in ('MEDIAN_PER_ROW', 'POLY', 'CHEB', 'LEG',
-                                     'NATURAL_SPLINE', 'CUBIC_SPLINE', 'AKIMA_SPLINE'):
-            overscanResult = self.measureVectorOverscan(overscanImage)
-            overscanValue = overscanResult.overscanValue
+        else:
             maskArray = overscanResult.maskArray
             isTransposed = overscanResult.isTransposed
 
@@ -166,9 +596,6 @@ class OverscanCorrectionTask(pipeBase.Task):
                 overscanArray[:, :] = overscanValue[:, np.newaxis]
                 if maskSuspect:
                     maskSuspect.getArray()[maskArray, :] |= ampImage.getMask().getPlaneBitMask("SUSPECT")
-        else:
-            raise RuntimeError('%s : %s an invalid overscan type' %
-                               ("overscanCorrection", self.config.fitType))
 
         self.debugView(overscanImage, overscanValue, amp)
 
@@ -179,7 +606,65 @@ class OverscanCorrectionTask(pipeBase.Task):
         return pipeBase.Struct(imageFit=offImage,
                                overscanFit=overscanModel,
                                overscanImage=overscanImage,
-                               edgeMask=maskSuspect)
+                               edgeMask=maskSuspect,
+                               statistics=OverscanStatistics(overscanModel, overscanImage))
+
+    def applyOverscanInPlace(self, ampImage, overscanImage, overscanResult, amp=None):
+        """Remove a measured vector overscan from an amplifier image
+        without building images of the fit.
+
+        Parameters
+        ----------
+        ampImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+            Image data that will have the overscan removed.
+        overscanImage : `lsst.afw.image.Image`
+            Overscan data that the overscan was measured from.
+        overscanResult : `lsst.pipe.base.Struct`
+            Result of `measureVectorOverscan`.
+        amp : `lsst.afw.cameraGeom.Amplifier`, optional
+            Amplifier to use for debugging purposes.
+
+        Returns
+        -------
+        overscanResults : `lsst.pipe.base.Struct`
+            Result struct; see `run`.  ``imageFit`` and ``overscanFit``
+            are `OverscanModel` objects.
+        """
+        # The fit images used to be single precision, so round the fit
+        # the same way to subtract identical values.
+        overscanValue = np.asarray(overscanResult.overscanValue, dtype=np.float32)
+        maskArray = overscanResult.maskArray
+        isTransposed = overscanResult.isTransposed
+
+        self.debugView(overscanImage, overscanResult.overscanValue, amp)
+
+        ampArray = ampImage.getImage().getArray() if hasattr(ampImage, 'getImage') else ampImage.getArray()
+        if hasattr(overscanImage, 'getImage'):
+            overscanArray = overscanImage.getImage().getArray()
+        else:
+            overscanArray = overscanImage.getArray()
+        broadcastValue = overscanValue[np.newaxis, :] if isTransposed else overscanValue[:, np.newaxis]
+        ampArray -= broadcastValue
+        overscanArray -= broadcastValue
+
+        edgeMask = None
+        if hasattr(ampImage, 'getMask'):
+            edgeMask = np.asarray(maskArray, dtype=bool)
+            # Only the rows or columns of the extrapolated edges change.
+            if edgeMask.any():
+                suspect = ampImage.getMask().getPlaneBitMask("SUSPECT")
+                maskPlane = ampImage.getMask().getArray()
+                if isTransposed:
+                    maskPlane[:, edgeMask] |= suspect
+                else:
+                    maskPlane[edgeMask, :] |= suspect
+
+        overscanModel = OverscanModel(overscanValue, overscanImage.getDimensions(), isTransposed)
+        return pipeBase.Struct(imageFit=OverscanModel(overscanValue, ampImage.getDimensions(), isTransposed),
+                               overscanFit=overscanModel,
+                               overscanImage=overscanImage,
+                               edgeMask=edgeMask,
+                               statistics=OverscanStatistics(overscanModel, overscanImage))
 
     @staticmethod
     def integerConvert(image):
@@ -264,6 +749,29 @@ class OverscanCorrectionTask(pipeBase.Task):
             calcImage = image.getArray()
         return calcImage
 
+    def getImageArrayAndMask(self, image):
+        """Extract the numpy array and the rejected pixels from the input
+        image.
+
+        Parameters
+        ----------
+        image : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+            Image data to pull array from.
+
+        Returns
+        -------
+        calcImage : `numpy.ndarray`
+            Image data array for numpy operating.
+        calcMask : `numpy.ndarray` or `None`
+            Boolean array, True for pixels with any of the
+            ``config.maskPlanes`` set, or `None` if ``image`` has no
+            mask.
+        """
+        if hasattr(image, "getImage"):
+            calcMask = (image.getMask().getArray() & self.statControl.getAndMask()) != 0
+            return image.getImage().getArray(), calcMask
+        return image.getArray(), None
+
     @staticmethod
     def transpose(imageArray):
         """Transpose input numpy array if necessary.
@@ -285,13 +793,76 @@ class OverscanCorrectionTask(pipeBase.Task):
         else:
             return imageArray, False
 
+    @staticmethod
+    def computeQuartiles(imageArray):
+        """Compute the quartiles of each row of an array.
+
+        Parameters
+        ----------
+        imageArray : `numpy.ndarray`, (N, M)
+            Image data to measure along numpy axis=1.
+
+        Returns
+        -------
+        quartiles : `numpy.ndarray`, (3, N)
+            Lower quartile, median and upper quartile of each row,
+            interpolated as `numpy.percentile` does.
+
+        Notes
+        -----
+        The data are partitioned once around all the order statistics
+        needed, rather than sorted.  Rows containing NaN give NaN.
+        """
+        num = imageArray.shape[1]
+        positions = np.array([0.25, 0.5, 0.75])*(num - 1)
+        low = np.floor(positions).astype(int)
+        high = np.minimum(low + 1, num - 1)
+        weights = positions - low
+
+        partitioned = np.partition(imageArray, np.union1d(low, high), axis=1)
+        lowValues = partitioned[:, low].T
+        highValues = partitioned[:, high].T
+        diff = highValues - lowValues
+        quartiles = lowValues + diff*weights[:, np.newaxis]
+        upper = weights >= 0.5
+        quartiles[upper] = highValues[upper] - diff[upper]*(1.0 - weights[upper, np.newaxis])
+        # NaN values are partitioned to the end of each row.
+        quartiles[:, np.isnan(partitioned[:, high.max():]).any(axis=1)] = np.nan
+        return quartiles
+
+    def computeOutlierMask(self, imageArray, mask=None):
+        """Find outliers in the rows of overscan data from a robust sigma
+        clipping procedure.
+
+        Parameters
+        ----------
+        imageArray : `numpy.ndarray`
+            Image to filter along numpy axis=1.
+        mask : `numpy.ndarray`, optional
+            Boolean array of pixels that are already rejected.  These
+            do not affect the clipping thresholds.
+
+        Returns
+        -------
+        outlierMask : `numpy.ndarray`
+            Boolean array, True for outliers and for pixels in ``mask``.
+        """
+        lq, median, uq = self.computeQuartiles(imageArray)
+        axisStdev = 0.74*(uq - lq)  # robust stdev
+
+        diff = np.abs(imageArray - median[:, np.newaxis])
+        outlierMask = diff > self.statControl.getNumSigmaClip()*axisStdev[:, np.newaxis]
+        if mask is not None:
+            outlierMask |= mask
+        return outlierMask
+
     def maskOutliers(self, imageArray):
         """Mask  outliers in  a  row  of overscan  data  from  a robust  sigma
         clipping procedure.
 
         Parameters
         ----------
-        imageArray : `numpy.ndarray`
+        imageArray : `numpy.ndarray` or `numpy.ma.masked_array`
             Image to filter along numpy axis=1.
 
         Returns
@@ -299,13 +870,8 @@ class OverscanCorrectionTask(pipeBase.Task):
         maskedArray : `numpy.ma.masked_array`
             Masked image marking outliers.
         """
-        lq, median, uq = np.percentile(imageArray, [25.0, 50.0, 75.0], axis=1)
-        axisMedians = median
-        axisStdev = 0.74*(uq - lq)  # robust stdev
-
-        diff = np.abs(imageArray - axisMedians[:, np.newaxis])
-        return np.ma.masked_where(diff > self.statControl.getNumSigmaClip()
-                                  * axisStdev[:, np.newaxis], imageArray)
+        data = np.ma.getdata(imageArray)
+        return np.ma.masked_array(data, mask=self.computeOutlierMask(data, np.ma.getmaskarray(imageArray)))
 
     @staticmethod
     def collapseArray(maskedArray):
@@ -326,6 +892,72 @@ class OverscanCorrectionTask(pipeBase.Task):
             collapsed.data[collapsed.mask] = np.mean(maskedArray.data[collapsed.mask], axis=1)
         return collapsed
 
+    @staticmethod
+    def collapseMaskedArray(imageArray, mask):
+        """Collapse overscan array and mask to a 1-D vector of values.
+
+        Parameters
+        ----------
+        imageArray : `numpy.ndarray`, (N, M)
+            Overscan data.
+        mask : `numpy.ndarray`, (N, M)
+            Boolean array, True for the pixels to exclude.
+
+        Returns
+        -------
+        collapsed : `numpy.ndarray`, (N,)
+            Mean of the unmasked values of each row.  Rows with no
+            unmasked values use the mean of all their values.
+        collapsedMask : `numpy.ndarray`, (N,)
+            Boolean array, True for the rows with no unmasked values.
+        """
+        filled = imageArray.copy(order="K")
+        np.copyto(filled, 0, where=mask)
+        count = mask.shape[1] - np.count_nonzero(mask, axis=1)
+        collapsedMask = count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            collapsed = np.sum(filled, axis=1)/count
+        if collapsedMask.any():
+            collapsed[collapsedMask] = np.mean(imageArray[collapsedMask], axis=1)
+        return collapsed, collapsedMask
+
+    def collapseRows(self, imageArray, mask):
+        """Collapse overscan array and mask to a 1-D vector of row means,
+        using the compiled row-statistics kernel if configured.
+
+        Parameters
+        ----------
+        imageArray : `numpy.ndarray`, (N, M)
+            Overscan data.
+        mask : `numpy.ndarray`, (N, M)
+            Boolean array, True for the pixels to exclude.
+
+        Returns
+        -------
+        collapsed : `numpy.ndarray`, (N,)
+            Mean of the unmasked values of each row.  Rows with no
+            unmasked values use the mean of all their values.
+        collapsedMask : `numpy.ndarray`, (N,)
+            Boolean array, True for the rows with no unmasked values.
+
+        See Also
+        --------
+        collapseMaskedArray
+        """
+        numThreads = self.config.numRowStatisticsThreads
+        if numThreads == 0:
+            return self.collapseMaskedArray(imageArray, mask)
+
+        if imageArray.dtype not in (np.float32, np.float64):
+            imageArray = imageArray.astype(np.float64)
+        imageArray = np.require(imageArray, requirements="C")
+        mask = np.require(mask, requirements="C")
+        collapsed, _, count = computeRowStatistics(imageArray, mask.view(np.uint8), 1, numThreads)
+        collapsedMask = count == 0
+        if collapsedMask.any():
+            collapsed[collapsedMask] = np.mean(imageArray[collapsedMask], axis=1)
+        return collapsed, collapsedMask
+
     def collapseArrayMedian(self, maskedArray):
         """Collapse overscan array (and mask) to a 1-D vector of using the
         correct integer median of row-values.
@@ -341,18 +973,44 @@ class OverscanCorrectionTask(pipeBase.Task):
             Single dimensional overscan data, combined with the afwMath median.
         """
         integerMI = self.integerConvert(maskedArray)
+        return self.maskedRowMedian(np.ma.getdata(integerMI), np.ma.getmaskarray(integerMI))
 
-        collapsed = []
-        fitType = afwMath.stringToStatisticsProperty('MEDIAN')
-        for row in integerMI:
-            newRow = row.compressed()
-            if len(newRow) > 0:
-                rowMedian = afwMath.makeStatistics(newRow, fitType, self.statControl).getValue()
-            else:
-                rowMedian = np.nan
-            collapsed.append(rowMedian)
+    @staticmethod
+    def maskedRowMedian(data, mask):
+        """Compute the median of the unmasked values in each row of an
+        array.
 
-        return np.array(collapsed)
+        Parameters
+        ----------
+        data : `numpy.ndarray`, (N, M)
+            Values to combine along numpy axis=1.
+        mask : `numpy.ndarray`, (N, M)
+            Boolean array, True for the values to exclude.
+
+        Returns
+        -------
+        medians : `numpy.ndarray`, (N,)
+            Median of each row, or NaN for rows with no unmasked
+            values.
+
+        Notes
+        -----
+        The medians are identical to those of `lsst.afw.math`: for an
+        even number of values, the two central values are averaged as
+        ``0.5*low + 0.5*high`` in double precision.  All the rows are
+        sorted at once, with the masked values moved to the end.
+        """
+        values = np.where(mask, np.inf, data.astype(np.float64))
+        values.sort(axis=1)
+        numGood = mask.shape[1] - np.count_nonzero(mask, axis=1)
+
+        rows = np.arange(values.shape[0])
+        low = values[rows, np.maximum(numGood - 1, 0)//2]
+        high = values[rows, numGood//2]
+        with np.errstate(invalid="ignore"):
+            medians = 0.5*low + 0.5*high
+        medians[numGood == 0] = np.nan
+        return medians
 
     def splineFit(self, indices, collapsed, numBins):
         """Wrapper function to match spline fit API to polynomial fit API.
@@ -420,19 +1078,35 @@ class OverscanCorrectionTask(pipeBase.Task):
         maskArray : `numpy.ndarray`
             Boolean numpy array of pixels to mask.
         """
-        maskArray = np.full_like(collapsed, False, dtype=bool)
         if np.ma.is_masked(collapsed):
-            num = len(collapsed)
-            for low in range(num):
-                if not collapsed.mask[low]:
-                    break
-            if low > 0:
-                maskArray[:low] = True
-            for high in range(1, num):
-                if not collapsed.mask[-high]:
-                    break
-            if high > 1:
-                maskArray[-high:] = True
+            return OverscanCorrectionTask.maskExtrapolatedEdges(collapsed.mask)
+        return np.full_like(collapsed, False, dtype=bool)
+
+    @staticmethod
+    def maskExtrapolatedEdges(collapsedMask):
+        """Create mask if edges are extrapolated, from the mask of the
+        collapsed overscan values.
+
+        Parameters
+        ----------
+        collapsedMask : `numpy.ndarray`
+            Boolean array, True for values with no data.
+
+        Returns
+        -------
+        maskArray : `numpy.ndarray`
+            Boolean numpy array of pixels to mask.
+        """
+        if collapsedMask.all():
+            return np.ones_like(collapsedMask, dtype=bool)
+        maskArray = np.zeros_like(collapsedMask, dtype=bool)
+        numLow = np.argmin(collapsedMask)
+        maskArray[:numLow] = True
+        numHigh = np.argmin(collapsedMask[::-1])
+        if numHigh > 0:
+            # The trailing run includes the last unmasked value, as it
+            # always has.
+            maskArray[-(numHigh + 1):] = True
         return maskArray
 
     def measureVectorOverscan(self, image):
@@ -456,37 +1130,93 @@ class OverscanCorrectionTask(pipeBase.Task):
                calcuation, noting along which axis the overscan should be
                subtracted.
         """
-        calcImage = self.getImageArray(image)
+        return self.measureVectorOverscans([image])[0]
 
-        # operate on numpy-arrays from here
-        calcImage, isTransposed = self.transpose(calcImage)
-        masked = self.maskOutliers(calcImage)
+    def measureVectorOverscans(self, images):
+        """Calculate the 1-d vector overscans of several overscan images.
+
+        Overscans with the same dimensions are stacked into a single
+        3-d array and measured together.
+
+        Parameters
+        ----------
+        images : `list` [`lsst.afw.image.MaskedImage`]
+            Images containing the overscan data.
+
+        Returns
+        -------
+        results : `list` [`lsst.pipe.base.Struct`]
+            Overscan results for each image, in the same order as
+            ``images``; see `measureVectorOverscan`.
+        """
+        arrays = [self.getImageArrayAndMask(image) for image in images]
+        groups = dict()
+        for index, (calcImage, calcMask) in enumerate(arrays):
+            groups.setdefault(calcImage.shape, []).append(index)
+
+        results = [None]*len(images)
+        for shape, indices in groups.items():
+            calcImage = np.stack([arrays[index][0] for index in indices])
+            if all(arrays[index][1] is None for index in indices):
+                calcMask = None
+            else:
+                calcMask = np.stack([arrays[index][1] if arrays[index][1] is not None
+                                     else np.zeros(shape, dtype=bool) for index in indices])
+            for index, result in zip(indices, self.measureVectorOverscanStack(calcImage, calcMask)):
+                results[index] = result
+        return results
+
+    def measureVectorOverscanStack(self, calcImage, calcMask=None):
+        """Calculate the 1-d vector overscans of a stack of overscan arrays.
+
+        Parameters
+        ----------
+        calcImage : `numpy.ndarray`, (K, N, M)
+            Overscan data of ``K`` amplifiers with the same overscan
+            dimensions.
+        calcMask : `numpy.ndarray`, (K, N, M), optional
+            Boolean array, True for the pixels to exclude.
+
+        Returns
+        -------
+        results : `list` [`lsst.pipe.base.Struct`]
+            Overscan results for each amplifier; see
+            `measureVectorOverscan`.
+        """
+        # The overscan is collapsed along its shortest axis.
+        isTransposed = bool(np.argmin(calcImage.shape[1:]) == 0)
+        if isTransposed:
+            calcImage = np.transpose(calcImage, (0, 2, 1))
+            if calcMask is not None:
+                calcMask = np.transpose(calcMask, (0, 2, 1))
+        numAmps, num, width = calcImage.shape
+
+        # The rows of all the amplifiers are processed together.
+        rowImage = calcImage.reshape(numAmps*num, width)
+        rowMask = calcMask.reshape(numAmps*num, width) if calcMask is not None else None
+        mask = self.computeOutlierMask(rowImage, rowMask)
 
         if self.config.fitType == 'MEDIAN_PER_ROW':
-            overscanVector = self.collapseArrayMedian(masked)
-            maskArray = self.maskExtrapolated(overscanVector)
+            overscanVectors = self.maskedRowMedian(self.integerConvert(rowImage), mask).reshape(numAmps, num)
+            maskArrays = np.zeros((numAmps, num), dtype=bool)
         else:
-            collapsed = self.collapseArray(masked)
-
-            num = len(collapsed)
-            indices = 2.0*np.arange(num)/float(num) - 1.0
-
-            poly = np.polynomial
-            fitter, evaler = {
-                'POLY': (poly.polynomial.polyfit, poly.polynomial.polyval),
-                'CHEB': (poly.chebyshev.chebfit, poly.chebyshev.chebval),
-                'LEG': (poly.legendre.legfit, poly.legendre.legval),
-                'NATURAL_SPLINE': (self.splineFit, self.splineEval),
-                'CUBIC_SPLINE': (self.splineFit, self.splineEval),
-                'AKIMA_SPLINE': (self.splineFit, self.splineEval)
-            }[self.config.fitType]
-
-            coeffs = fitter(indices, collapsed, self.config.order)
-            overscanVector = evaler(indices, coeffs)
-            maskArray = self.maskExtrapolated(collapsed)
-        return pipeBase.Struct(overscanValue=np.array(overscanVector),
-                               maskArray=maskArray,
-                               isTransposed=isTransposed)
+            collapsed, collapsedMask = self.collapseRows(rowImage, mask)
+            collapsed = collapsed.reshape(numAmps, num)
+            collapsedMask = collapsedMask.reshape(numAmps, num)
+
+            operator = getFitOperator(self.config.fitType, num, self.config.order)
+            if self.config.fitType in operator.splineFitTypes:
+                overscanVectors = [operator.fitSpline(ampCollapsed, ampMask)
+                                   for ampCollapsed, ampMask in zip(collapsed, collapsedMask)]
+            else:
+                # Each column of the transposed array is fit separately.
+                overscanVectors = operator.fitPolynomial(collapsed.T).T
+            maskArrays = [self.maskExtrapolatedEdges(ampMask) for ampMask in collapsedMask]
+
+        return [pipeBase.Struct(overscanValue=np.array(overscanVector),
+                                maskArray=maskArray,
+                                isTransposed=isTransposed)
+                for overscanVector, maskArray in zip(overscanVectors, maskArrays)]
 
     def debugView(self, image, model, amp=None):
         """Debug display for the final overscan solution.
@@ -556,3 +1286,193 @@ class OverscanCorrectionTask(pipeBase.Task):
             elif ans in ("h", ):
                 print("[h]elp [c]ontinue [p]db e[x]itDebug")
         plot.close()
+
+
+class OverscanCorrectionStream:
+    """Overscan correction of an amplifier applied in row blocks, as the
+    amplifier is read out.
+
+    Each block of rows of the amplifier data is corrected using the
+    serial overscan of the same rows.  ``MEDIAN_PER_ROW`` only uses the
+    overscan of each row, and so gives the same result as correcting the
+    whole amplifier at once.  The polynomial and spline fit types are
+    fit to the collapsed overscan of the most recent
+    ``config.streamWindowRows`` rows, which can differ from the fit to
+    the whole amplifier; `finalize` reports the difference.
+
+    Parameters
+    ----------
+    task : `OverscanCorrectionTask`
+        Task providing the configuration and the overscan kernels.
+    amp : `lsst.afw.cameraGeom.Amplifier`, optional
+        Amplifier being read out, used in log messages.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the overscan fit type is not a vector type.
+    """
+    def __init__(self, task, amp=None):
+        if task.config.fitType not in task.vectorFitTypes:
+            raise RuntimeError(f"Overscan fit type {task.config.fitType} cannot be streamed; "
+                               "it needs the overscan of the whole amplifier.")
+        self.task = task
+        self.amp = amp
+        self._overscanArrays = []
+        self._overscanMasks = []
+        self._collapsed = []
+        self._collapsedMask = []
+        self._overscanValues = []
+        self._numLeadingMasked = 0
+
+    @property
+    def numRows(self):
+        """Number of rows corrected so far (`int`).
+        """
+        return sum(len(values) for values in self._overscanValues)
+
+    def addRows(self, ampImage, overscanImage):
+        """Correct the next block of rows of the amplifier in place.
+
+        Parameters
+        ----------
+        ampImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+            Rows of the amplifier image data.
+        overscanImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+            Serial overscan of the same rows.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            Result struct with components:
+            - ``ampImage`` : the corrected rows of the amplifier.
+            - ``overscanImage`` : the corrected overscan rows.
+            - ``overscanValue`` : overscan subtracted from each row
+              (`numpy.ndarray`).
+            - ``edgeMask`` : rows masked as ``SUSPECT`` because no
+              overscan has been measured yet (`numpy.ndarray` [`bool`]).
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the amplifier and overscan blocks have different
+            numbers of rows.
+        """
+        task = self.task
+        calcImage, calcMask = task.getImageArrayAndMask(overscanImage)
+        numRows = calcImage.shape[0]
+        if ampImage.getHeight() != numRows:
+            raise RuntimeError(f"Amplifier block has {ampImage.getHeight()} rows, "
+                               f"but its overscan has {numRows}.")
+        if calcMask is None:
+            calcMask = np.zeros(calcImage.shape, dtype=bool)
+        self._overscanArrays.append(calcImage.copy())
+        self._overscanMasks.append(calcMask.copy())
+
+        mask = task.computeOutlierMask(calcImage, calcMask)
+        if task.config.fitType == 'MEDIAN_PER_ROW':
+            overscanValue = task.maskedRowMedian(task.integerConvert(calcImage), mask)
+            collapsedMask = np.zeros(numRows, dtype=bool)
+        else:
+            collapsed, collapsedMask = task.collapseRows(calcImage, mask)
+            self._collapsed.append(collapsed)
+            self._collapsedMask.append(collapsedMask)
+            overscanValue = self._fitWindow(numRows)
+        self._overscanValues.append(overscanValue)
+
+        # Rows before the first measured overscan row are extrapolated.
+        edgeMask = np.zeros(numRows, dtype=bool)
+        if self._numLeadingMasked == self.numRows - numRows:
+            numMasked = numRows if collapsedMask.all() else int(np.argmin(collapsedMask))
+            edgeMask[:numMasked] = True
+            self._numLeadingMasked += numMasked
+
+        offset = overscanValue.astype(np.float32)[:, np.newaxis]
+        if hasattr(ampImage, "getImage"):
+            ampImage.getImage().getArray()[:, :] -= offset
+            if edgeMask.any():
+                ampImage.getMask().getArray()[edgeMask, :] |= ampImage.getMask().getPlaneBitMask("SUSPECT")
+        else:
+            ampImage.getArray()[:, :] -= offset
+        calcImage[:, :] -= offset
+
+        return pipeBase.Struct(ampImage=ampImage,
+                               overscanImage=overscanImage,
+                               overscanValue=overscanValue,
+                               edgeMask=edgeMask)
+
+    def _fitWindow(self, numRows):
+        """Fit the most recent collapsed overscan rows.
+
+        Parameters
+        ----------
+        numRows : `int`
+            Number of rows at the end of the window to evaluate the fit
+            at.
+
+        Returns
+        -------
+        overscanValue : `numpy.ndarray`
+            Fit evaluated at the last ``numRows`` rows.
+        """
+        task = self.task
+        windowRows = max(task.config.streamWindowRows, numRows)
+        collapsed = np.concatenate(self._collapsed)[-windowRows:]
+        collapsedMask = np.concatenate(self._collapsedMask)[-windowRows:]
+        num = len(collapsed)
+
+        if task.config.fitType in OverscanFitOperator.splineFitTypes:
+            operator = getFitOperator(task.config.fitType, num, min(task.config.order, num))
+            overscanValue = operator.fitSpline(collapsed, collapsedMask)
+        else:
+            # The first blocks may have too few rows for the full order.
+            operator = getFitOperator(task.config.fitType, num, min(task.config.order, num - 1))
+            overscanValue = operator.fitPolynomial(collapsed)
+        return np.array(overscanValue[-numRows:])
+
+    def finalize(self):
+        """Compare the streamed correction with the correction of the whole
+        amplifier.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            Result struct with components:
+            - ``overscanValue`` : overscan subtracted from each row by
+              the stream (`numpy.ndarray`).
+            - ``batchOverscanValue`` : overscan that
+              `OverscanCorrectionTask.run` would have subtracted
+              (`numpy.ndarray`).
+            - ``difference`` : ``overscanValue - batchOverscanValue``
+              (`numpy.ndarray`).
+            - ``maxDifference`` : largest absolute difference (`float`).
+            - ``maskArray`` : rows that `OverscanCorrectionTask.run`
+              would have masked as ``SUSPECT`` (`numpy.ndarray`).
+
+        Raises
+        ------
+        RuntimeError
+            Raised if no rows have been corrected.
+        """
+        if not self._overscanValues:
+            raise RuntimeError("No overscan rows have been streamed.")
+        overscanValue = np.concatenate(self._overscanValues)
+        calcImage = np.concatenate(self._overscanArrays)
+        calcMask = np.concatenate(self._overscanMasks)
+        batch = self.task.measureVectorOverscanStack(calcImage[np.newaxis], calcMask[np.newaxis])[0]
+        if batch.isTransposed:
+            raise RuntimeError("Streamed overscan has fewer rows than columns; "
+                               "it cannot be compared with the whole amplifier.")
+
+        difference = overscanValue - batch.overscanValue
+        maxDifference = float(np.nanmax(np.abs(difference))) if np.isfinite(difference).any() else 0.0
+        if maxDifference > 0.0:
+            self.task.log.info("Streamed overscan correction%s differs from the whole-amplifier "
+                               "correction by up to %g.",
+                               f" of amplifier {self.amp.getName()}" if self.amp is not None else "",
+                               maxDifference)
+        return pipeBase.Struct(overscanValue=overscanValue,
+                               batchOverscanValue=batch.overscanValue,
+                               difference=difference,
+                               maxDifference=maxDifference,
+                               maskArray=batch.maskArray)
@@ -0,0 +1,207 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Timing and memory instrumentation of ISR processing stages.
+"""
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+__all__ = ["StageTimer", "measureStage", "getMaxRss"]
+
+
+def getMaxRss():
+    """Return the peak resident set size of this process.
+
+    Returns
+    -------
+    maxRss : `int`
+        Peak resident set size, in bytes.
+    """
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return maxRss if sys.platform == "darwin" else maxRss*1024
+
+
+@contextmanager
+def measureStage(stage, threadCpu=False):
+    """Measure the resources used by a block of code.
+
+    Parameters
+    ----------
+    stage : `str`
+        Name of the stage being measured.
+    threadCpu : `bool`, optional
+        Measure the CPU time of the calling thread only, rather than of
+        the whole process, and no memory use.  Use this for stages run
+        in worker threads: the peak resident set size and the
+        `tracemalloc` peak are process-wide, so concurrent stages would
+        reset and share each other's peaks.
+
+    Yields
+    ------
+    record : `dict`
+        Measurement record, filled in when the block exits, with keys:
+        - ``stage`` : name of the stage (`str`).
+        - ``wallTime`` : elapsed wall clock time in seconds (`float`).
+        - ``cpuTime`` : CPU time in seconds (`float`).
+        - ``maxRssDelta`` : increase of the peak resident set size of
+          the process during the stage, in bytes (`int`).  Not present
+          if ``threadCpu`` is set.
+        - ``peakAlloc`` : increase of the peak Python/numpy memory
+          traced by `tracemalloc` during the stage, in bytes (`int`).
+          Only present if `tracemalloc` is tracing and ``threadCpu`` is
+          not set.
+
+    Notes
+    -----
+    The `tracemalloc` peak is not reset, so that callers tracing memory
+    around the stage keep their own peak.  Like ``maxRssDelta``,
+    ``peakAlloc`` is therefore the amount by which the stage raised the
+    high water mark, and is zero for stages that fit within memory
+    traced earlier.
+    """
+    cpuTimer = time.thread_time if threadCpu else time.process_time
+    record = {"stage": stage}
+
+    measureMemory = not threadCpu
+    tracing = measureMemory and tracemalloc.is_tracing()
+    if tracing:
+        startPeak = tracemalloc.get_traced_memory()[1]
+    if measureMemory:
+        startRss = getMaxRss()
+    startCpu = cpuTimer()
+    startWall = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["wallTime"] = time.perf_counter() - startWall
+        record["cpuTime"] = cpuTimer() - startCpu
+        if measureMemory:
+            record["maxRssDelta"] = getMaxRss() - startRss
+        if tracing:
+            record["peakAlloc"] = tracemalloc.get_traced_memory()[1] - startPeak
+
+
+class StageTimer:
+    """Collect the resource usage of a sequence of processing stages.
+
+    Parameters
+    ----------
+    enabled : `bool`, optional
+        Measure the stages?  If not, nothing is measured or recorded.
+
+    Notes
+    -----
+    The peak resident set size of a process can only grow, so
+    ``maxRssDelta`` is the amount by which a stage raised the high
+    water mark, and is zero for stages that fit within memory already
+    used.  Start Python with ``-X tracemalloc`` (or call
+    `tracemalloc.start`) to also record the increase of the peak traced
+    allocations of each stage; these cover allocations made by numpy,
+    but not by C++ code.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+
+    @contextmanager
+    def time(self, stage):
+        """Measure a stage and record the result.
+
+        Parameters
+        ----------
+        stage : `str`
+            Name of the stage being measured.
+
+        Yields
+        ------
+        record : `dict`
+            Measurement record; see `measureStage`.  Only the stage
+            name is set if the timer is not enabled.
+        """
+        if not self.enabled:
+            yield {"stage": stage}
+            return
+        with measureStage(stage) as record:
+            yield record
+        self.records.append(record)
+
+    def add(self, record):
+        """Add a record measured elsewhere, e.g. in a worker thread.
+
+        Parameters
+        ----------
+        record : `dict` or `None`
+            Measurement record from `measureStage`.  `None` is ignored.
+        """
+        if self.enabled and record is not None:
+            self.records.append(record)
+
+    def setMetadata(self, metadata):
+        """Record the measurements in task metadata.
+
+        Parameters
+        ----------
+        metadata : `lsst.daf.base.PropertyList`
+            Metadata to update.  Values are stored under the keys
+            ``ISR STAGE <stage> WALLTIME``, ``CPUTIME``,
+            ``MAXRSSDELTA`` and ``PEAKALLOC``.
+        """
+        for record in self.records:
+            for key, value in record.items():
+                if key != "stage":
+                    metadata.set(f"ISR STAGE {record['stage']} {key.upper()}", value)
+
+    def toDict(self, **kwargs):
+        """Return the measurements as a dictionary.
+
+        Parameters
+        ----------
+        **kwargs
+            Additional entries to include, identifying the exposure.
+
+        Returns
+        -------
+        timing : `dict`
+            Dictionary of ``kwargs`` plus a ``stages`` list of the
+            measurement records, in the order they were recorded.
+        """
+        timing = dict(kwargs)
+        timing["stages"] = list(self.records)
+        return timing
+
+    def writeJson(self, filename, **kwargs):
+        """Write the measurements to a JSON file.
+
+        Parameters
+        ----------
+        filename : `str`
+            Name of the file to write.
+        **kwargs
+            Additional entries to include, identifying the exposure.
+        """
+        with open(filename, "w") as outFile:
+            json.dump(self.toDict(**kwargs), outFile, indent=2)
@@ -22,7 +22,11 @@
  * see <http://www.lsstcorp.org/LegalNotices/>.
  */
 
+#include <algorithm>
 #include <cmath>
+#include <cstdint>
+#include <limits>
+#include <thread>
 
 #include "lsst/geom.h"
 #include "lsst/afw/math.h"
@@ -49,41 +53,138 @@ size_t maskNans(afw::image::MaskedImage<PixelT> const& mi, afw::image::MaskPixel
     return nPix;
 }
 
+namespace {
+
+// Minimum number of pixels for each thread of computeRowStatistics;
+// smaller images are not worth the cost of starting threads.
+std::size_t const minPixelsPerThread = 1 << 16;
+
+template <typename ImagePixelT, typename MaskPixelT>
+void reduceRows(
+    ImagePixelT const* image, std::ptrdiff_t imageStride,
+    MaskPixelT const* mask, std::ptrdiff_t maskStride,
+    int width, MaskPixelT badMask, int begin, int end,
+    double* means, double* stdevs, double* counts
+) {
+    double const nan = std::numeric_limits<double>::quiet_NaN();
+    for (int y = begin; y < end; ++y) {
+        ImagePixelT const* imageRow = image + y*imageStride;
+        MaskPixelT const* maskRow = mask + y*maskStride;
+
+        double sum = 0.0;
+        std::size_t num = 0;
+        for (int x = 0; x < width; ++x) {
+            double const value = imageRow[x];
+            if (!(maskRow[x] & badMask) && std::isfinite(value)) {
+                sum += value;
+                ++num;
+            }
+        }
+        double const mean = (num > 0) ? sum/num : nan;
+
+        // The row is still in cache, so a second pass for the variance is cheap.
+        double sumSq = 0.0;
+        for (int x = 0; x < width; ++x) {
+            double const value = imageRow[x];
+            if (!(maskRow[x] & badMask) && std::isfinite(value)) {
+                sumSq += (value - mean)*(value - mean);
+            }
+        }
+
+        means[y] = mean;
+        stdevs[y] = (num > 1) ? std::sqrt(sumSq/(num - 1)) : nan;
+        counts[y] = num;
+    }
+}
+
+}  // namespace lsst::ip::isr::<anonymous>
+
+template <typename ImagePixelT, typename MaskPixelT>
+ndarray::Array<double, 2, 2> computeRowStatistics(
+    ndarray::Array<ImagePixelT const, 2, 1> const& image,
+    ndarray::Array<MaskPixelT const, 2, 1> const& mask,
+    MaskPixelT badMask,
+    int nThreads
+) {
+    if (image.template getSize<0>() != mask.template getSize<0>() ||
+        image.template getSize<1>() != mask.template getSize<1>()) {
+        throw LSST_EXCEPT(pex::exceptions::LengthError, "Image and mask arrays have different shapes");
+    }
+    int const height = image.template getSize<0>();
+    int const width = image.template getSize<1>();
+
+    ndarray::Array<double, 2, 2> result = ndarray::allocate(3, height);
+    double* means = result.getData();
+    double* stdevs = means + height;
+    double* counts = stdevs + height;
+
+    if (nThreads <= 0) {
+        nThreads = std::max(1U, std::thread::hardware_concurrency());
+    }
+    std::size_t const numPixels = static_cast<std::size_t>(height)*width;
+    nThreads = std::min({nThreads, height, static_cast<int>(numPixels/minPixelsPerThread)});
+
+    ImagePixelT const* imageData = image.getData();
+    std::ptrdiff_t const imageStride = image.template getStride<0>();
+    MaskPixelT const* maskData = mask.getData();
+    std::ptrdiff_t const maskStride = mask.template getStride<0>();
+
+    if (nThreads <= 1) {
+        reduceRows(imageData, imageStride, maskData, maskStride, width, badMask, 0, height,
+                   means, stdevs, counts);
+        return result;
+    }
+
+    // Each thread reduces a contiguous block of rows, and writes to its
+    // own part of the output.
+    int const rowsPerThread = (height + nThreads - 1)/nThreads;
+    std::vector<std::thread> threads;
+    threads.reserve(nThreads);
+    for (int begin = 0; begin < height; begin += rowsPerThread) {
+        int const end = std::min(begin + rowsPerThread, height);
+        threads.emplace_back(reduceRows<ImagePixelT, MaskPixelT>, imageData, imageStride,
+                             maskData, maskStride, width, badMask, begin, end, means, stdevs, counts);
+    }
+    for (auto& thread : threads) {
+        thread.join();
+    }
+    return result;
+}
+
+template <typename ImagePixelT>
+ndarray::Array<double, 2, 2> computeRowStatistics(
+    afw::image::MaskedImage<ImagePixelT> const& image,
+    afw::image::MaskPixel badMask,
+    int nThreads
+) {
+    return computeRowStatistics<ImagePixelT, afw::image::MaskPixel>(
+        image.getImage()->getArray(), image.getMask()->getArray(), badMask, nThreads);
+}
+
 template<typename ImagePixelT, typename FunctionT>
 void fitOverscanImage(
     std::shared_ptr< afw::math::Function1<FunctionT> > &overscanFunction,
     afw::image::MaskedImage<ImagePixelT> const& overscan,
     double ssize,
-    int sigma
+    int sigma,
+    afw::image::MaskPixel badMask,
+    int nThreads
 ) {
-    typedef afw::image::MaskedImage<ImagePixelT> MaskedImage;
-
-
     const int height = overscan.getHeight();
-    const int width  = overscan.getWidth();
-    std::vector<double> values(height);
-    std::vector<double> errors(height);
     std::vector<double> positions(height);
 
     std::vector<double> parameters(overscanFunction->getNParameters(), 0.);
     std::vector<double> stepsize(overscanFunction->getNParameters(), ssize);
 
+    // The mean and standard deviation of all rows are measured in a
+    // single sweep over the overscan.
+    ndarray::Array<double, 2, 2> rowStatistics = computeRowStatistics(overscan, badMask, nThreads);
+    std::vector<double> values(rowStatistics[0].begin(), rowStatistics[0].end());
+    std::vector<double> errors(rowStatistics[1].begin(), rowStatistics[1].end());
     for (int y = 0; y < height; ++y) {
-        /**
-        geom::Box2I bbox       = geom::Box2I( geom::Point2I(0, y),
-                                              geom::Point2I(0, width) );
-        The above was how this was defined before ticket #1556.  As I understand it
-        the following is the new way to do this
-        **/
-        geom::Box2I bbox = geom::Box2I(geom::Point2I(0,y), geom::Point2I(width,y));
-        MaskedImage mi         = MaskedImage(overscan, bbox);
-        afw::math::Statistics stats = afw::math::makeStatistics(*(mi.getImage()), afw::math::MEAN | afw::math::STDEV);
-
-        values[y]    = stats.getValue(afw::math::MEAN);
-        errors[y]    = stats.getValue(afw::math::STDEV);
         positions[y] = y;
-
     }
+
     afw::math::FitResults fitResults = afw::math::minimize(
         *overscanFunction,
         parameters,
@@ -119,14 +220,33 @@ void fitOverscanImage(
      std::shared_ptr<afw::math::Function1<double> > &overscanFunction,
     afw::image::MaskedImage<float> const& overscan,
     double ssize,
-    int sigma);
+    int sigma,
+    afw::image::MaskPixel badMask,
+    int nThreads);
 
 template
 void fitOverscanImage(
      std::shared_ptr<afw::math::Function1<double> > &overscanFunction,
     afw::image::MaskedImage<double> const& overscan,
     double ssize,
-    int sigma);
+    int sigma,
+    afw::image::MaskPixel badMask,
+    int nThreads);
+
+#define INSTANTIATE_ROW_STATISTICS(IMAGE_T, MASK_T) \
+    template ndarray::Array<double, 2, 2> computeRowStatistics<IMAGE_T, MASK_T>( \
+        ndarray::Array<IMAGE_T const, 2, 1> const&, ndarray::Array<MASK_T const, 2, 1> const&, \
+        MASK_T, int);
+
+INSTANTIATE_ROW_STATISTICS(float, afw::image::MaskPixel)
+INSTANTIATE_ROW_STATISTICS(float, std::uint8_t)
+INSTANTIATE_ROW_STATISTICS(double, afw::image::MaskPixel)
+INSTANTIATE_ROW_STATISTICS(double, std::uint8_t)
+
+template ndarray::Array<double, 2, 2> computeRowStatistics<float>(
+    afw::image::MaskedImage<float> const&, afw::image::MaskPixel, int);
+template ndarray::Array<double, 2, 2> computeRowStatistics<double>(
+    afw::image::MaskedImage<double> const&, afw::image::MaskPixel, int);
 
 template class CountMaskedPixels<float>;
 template class CountMaskedPixels<double>;
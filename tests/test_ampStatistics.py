@@ -0,0 +1,113 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+
+import lsst.geom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+import lsst.utils.tests
+import lsst.ip.isr.isrMock as isrMock
+from lsst.ip.isr import AmpStatisticsCache, applyGains
+
+
+class AmpStatisticsCacheTestCase(lsst.utils.tests.TestCase):
+    def setUp(self):
+        self.maskedImage = afwImage.MaskedImageF(lsst.geom.Extent2I(20, 10))
+        rng = np.random.RandomState(12345)
+        self.maskedImage.image.array[:, :] = rng.normal(100.0, 5.0, (10, 20))
+        self.maskedImage.variance.array[:, :] = 25.0
+        self.left = lsst.geom.Box2I(lsst.geom.Point2I(0, 0), lsst.geom.Extent2I(10, 10))
+        self.right = lsst.geom.Box2I(lsst.geom.Point2I(10, 0), lsst.geom.Extent2I(10, 10))
+
+    def test_caching(self):
+        """Expect each statistic to be computed once per state of the
+        pixels.
+        """
+        cache = AmpStatisticsCache(self.maskedImage)
+        flags = afwMath.MEDIAN | afwMath.STDEVCLIP
+        stats = cache.getStatistics(flags, bbox=self.left, plane="image")
+        expected = afwMath.makeStatistics(self.maskedImage[self.left].image, flags)
+        self.assertEqual(stats.getValue(afwMath.MEDIAN), expected.getValue(afwMath.MEDIAN))
+        self.assertIs(cache.getStatistics(flags, bbox=self.left, plane="image"), stats)
+        cache.getStatistics(flags, bbox=self.right, plane="image")
+        cache.getStatistics(flags, bbox=self.left, plane="variance")
+        self.assertEqual(cache.numComputed, 3)
+
+        # Only statistics of the modified plane and region are discarded.
+        self.maskedImage[self.left].image.array[:, :] += 1.0
+        cache.invalidate(planes=["image"], bbox=self.left)
+        self.assertEqual(cache.getStatistics(flags, bbox=self.left, plane="image").getValue(afwMath.MEDIAN),
+                         expected.getValue(afwMath.MEDIAN) + 1.0)
+        cache.getStatistics(flags, bbox=self.right, plane="image")
+        cache.getStatistics(flags, bbox=self.left, plane="variance")
+        self.assertEqual(cache.numComputed, 4)
+
+        cache.setState(1)
+        self.assertEqual(cache.getArrayMedian(self.right),
+                         np.median(self.maskedImage[self.right].image.array))
+        self.assertEqual(cache.numComputed, 5)
+
+        # Controls share statistics only if all their settings agree.
+        control = afwMath.StatisticsControl()
+        weighted = afwMath.StatisticsControl()
+        weighted.setWeighted(True)
+        stats = cache.getStatistics(flags, bbox=self.left, statControl=control)
+        self.assertIs(cache.getStatistics(flags, bbox=self.left, statControl=afwMath.StatisticsControl()),
+                      stats)
+        self.assertIsNot(cache.getStatistics(flags, bbox=self.left, statControl=weighted), stats)
+        self.assertEqual(cache.numComputed, 7)
+
+    def test_applyGains(self):
+        """Expect gain normalization to be unchanged when drawing the
+        amplifier medians from the cache.
+        """
+        exposure = isrMock.TrimmedRawMock().run()
+        expected = exposure.clone()
+        ccdImage = expected.getMaskedImage()
+        medians = []
+        for amp in expected.getDetector():
+            sim = ccdImage[amp.getBBox()]
+            sim *= amp.getGain()
+            medians.append(np.median(sim.image.array))
+        for amp, ampMedian in zip(expected.getDetector(), medians):
+            sim = ccdImage[amp.getBBox()]
+            sim *= np.median(medians)/ampMedian
+
+        cache = AmpStatisticsCache(exposure.getMaskedImage())
+        applyGains(exposure, normalizeGains=True, ampStatistics=cache)
+        self.assertMaskedImagesAlmostEqual(exposure.getMaskedImage(), expected.getMaskedImage())
+        self.assertEqual(cache.numComputed, len(exposure.getDetector()))
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,143 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+
+import lsst.geom
+import lsst.afw.image as afwImage
+import lsst.utils.tests
+from lsst.daf.base import PropertyList
+from lsst.ip.isr import CalibCache, estimateCalibSize, getCalibCache
+
+
+class CalibCacheTestCase(lsst.utils.tests.TestCase):
+    """Test the calibration cache."""
+
+    def setUp(self):
+        self.reads = []
+
+    def makeReader(self, value):
+        def reader():
+            self.reads.append(value)
+            return value
+        return reader
+
+    def test_estimateCalibSize(self):
+        """Expect pixel data to be counted exactly."""
+        exposure = afwImage.ExposureF(lsst.geom.Box2I(lsst.geom.Point2I(0, 0),
+                                                      lsst.geom.Extent2I(10, 20)))
+        self.assertEqual(estimateCalibSize(exposure), 200*(4 + 4 + 4))
+        self.assertEqual(estimateCalibSize(np.zeros(100)), 800)
+
+    def test_hitsAndMisses(self):
+        """Expect a product to be read once per key."""
+        cache = CalibCache(10000)
+        array = np.zeros(10)
+        for _ in range(3):
+            self.assertIs(cache.get("bias", self.makeReader(array)), array)
+        self.assertEqual(len(self.reads), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertEqual(cache.nBytes, array.nbytes)
+        self.assertIs(cache.find("bias"), array)
+        self.assertIsNone(cache.find("dark"))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        # Products that cannot be identified are never cached.
+        cache.get(None, self.makeReader(array))
+        cache.get(None, self.makeReader(array))
+        self.assertEqual(len(self.reads), 3)
+
+        metadata = PropertyList()
+        cache.setMetadata(metadata)
+        self.assertEqual(metadata.getScalar("CALIB CACHE HITS"), 3)
+        self.assertEqual(metadata.getScalar("CALIB CACHE MISSES"), 3)
+
+        # Counters taken earlier are recorded as they were.
+        counters = cache.getCounters()
+        cache.get("bias", self.makeReader(array))
+        cache.setMetadata(metadata, counters=counters)
+        self.assertEqual(metadata.getScalar("CALIB CACHE HITS"), 3)
+        self.assertEqual(cache.hits, 4)
+
+    def test_lruEviction(self):
+        """Expect the least recently used products to be evicted to stay
+        within the budget."""
+        cache = CalibCache(2000)
+        for key in ("bias", "dark"):
+            cache.get(key, self.makeReader(np.zeros(100)))
+        cache.get("bias", self.makeReader(None))
+        cache.get("flat", self.makeReader(np.zeros(100)))
+        self.assertIn("bias", cache)
+        self.assertIn("flat", cache)
+        self.assertNotIn("dark", cache)
+        self.assertLessEqual(cache.nBytes, cache.maxBytes)
+
+        # Products larger than the budget are not stored.
+        cache.get("fringe", self.makeReader(np.zeros(1000)))
+        self.assertNotIn("fringe", cache)
+
+        cache.setMaxBytes(0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nBytes, 0)
+
+    def test_copyProducts(self):
+        """Expect copied products to leave the cached product unchanged."""
+        cache = CalibCache(10000, copyProducts=True)
+        exposure = afwImage.ExposureF(lsst.geom.Box2I(lsst.geom.Point2I(0, 0),
+                                                      lsst.geom.Extent2I(10, 20)))
+        for _ in range(2):
+            calib = cache.get("bias", self.makeReader(exposure))
+            self.assertIsNot(calib, exposure)
+            calib.image.array[:, :] = 1.0
+        self.assertEqual(len(self.reads), 1)
+        self.assertFloatsEqual(exposure.image.array, 0.0)
+
+        array = np.zeros(10)
+        cache.get("dark", self.makeReader(array))[:] = 1.0
+        self.assertFloatsEqual(array, 0.0)
+
+    def test_processCacheBudget(self):
+        """Expect the process cache budget to be raised but never lowered
+        by a new caller."""
+        cache = getCalibCache()
+        oldMaxBytes = cache.maxBytes
+        try:
+            self.assertIs(getCalibCache(oldMaxBytes + 1000), cache)
+            self.assertEqual(cache.maxBytes, oldMaxBytes + 1000)
+            getCalibCache(0)
+            self.assertEqual(cache.maxBytes, oldMaxBytes + 1000)
+        finally:
+            cache.setMaxBytes(oldMaxBytes)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
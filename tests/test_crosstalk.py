@@ -32,7 +32,8 @@ import lsst.afw.table
 import lsst.afw.cameraGeom as cameraGeom
 
 from lsst.pipe.base import Struct
-from lsst.ip.isr import IsrTask, CrosstalkCalib, CrosstalkTask, NullCrosstalkTask
+from lsst.ip.isr import (IsrTask, CrosstalkCalib, CrosstalkConfig, CrosstalkTask, FocalPlaneCrosstalk,
+                         NullCrosstalkTask)
 
 try:
     display
@@ -193,6 +194,130 @@ class CrosstalkTestCase(lsst.utils.tests.TestCase):
         outPath += '.yaml'
         calib.writeText(outPath)
 
+    def testMatrixSubtraction(self):
+        """Test that the matrix correction matches the pairwise correction"""
+        calib = CrosstalkCalib()
+        calib.coeffs = np.array(self.crosstalk).transpose()
+        expected = self.exposure.clone()
+        for exposure, useMatrix in ((expected, False), (self.exposure, True)):
+            calib.subtractCrosstalk(exposure, crosstalkCoeffs=calib.coeffs,
+                                    minPixelToMask=self.value - 1,
+                                    crosstalkStr=self.crosstalkStr, backgroundMethod="AMP",
+                                    useMatrix=useMatrix)
+        self.checkSubtracted(self.exposure)
+        self.assertMaskedImagesAlmostEqual(self.exposure.getMaskedImage(), expected.getMaskedImage(),
+                                           atol=1e-3, rtol=1e-6)
+
+    def testTiledSubtraction(self):
+        """Test that the tiled correction subtracts the crosstalk and sets
+        the same mask as the pairwise correction"""
+        calib = CrosstalkCalib()
+        calib.coeffs = np.array(self.crosstalk).transpose()
+        expected = self.exposure.clone()
+        for exposure, useTiles in ((expected, False), (self.exposure, True)):
+            calib.subtractCrosstalk(exposure, crosstalkCoeffs=calib.coeffs,
+                                    minPixelToMask=self.value - 1,
+                                    crosstalkStr=self.crosstalkStr, useTiles=useTiles)
+        self.checkSubtracted(self.exposure)
+        self.assertImagesAlmostEqual(self.exposure.getImage(), expected.getImage(), atol=1e-3, rtol=1e-6)
+        self.assertMasksEqual(self.exposure.getMask(), expected.getMask())
+        self.assertImagesAlmostEqual(self.exposure.getVariance(), expected.getVariance(), rtol=1e-6)
+
+    def testInterChipEngines(self):
+        """Test that the pairwise, matrix and tiled corrections agree for
+        inter-detector crosstalk"""
+        calib = CrosstalkCalib()
+        calib.coeffs = np.array(self.crosstalk).transpose()
+        source = self.exposure.clone()
+        source.getImage().getArray()[:] = source.getImage().getArray()[::-1, ::-1]
+        results = []
+        for useMatrix, useTiles in ((False, False), (True, False), (False, True)):
+            exposure = self.exposure.clone()
+            calib.subtractCrosstalk(exposure, sourceExposure=source, crosstalkCoeffs=calib.coeffs,
+                                    minPixelToMask=self.value - 1, crosstalkStr=self.crosstalkStr,
+                                    useMatrix=useMatrix, useTiles=useTiles)
+            results.append(exposure)
+        for exposure in results[1:]:
+            self.assertImagesAlmostEqual(exposure.getImage(), results[0].getImage(), atol=1e-3, rtol=1e-6)
+            self.assertMasksEqual(exposure.getMask(), results[0].getMask())
+            self.assertImagesAlmostEqual(exposure.getVariance(), results[0].getVariance(), rtol=1e-6)
+
+    def testPruneCoeffs(self):
+        """Test that pruned terms are reported, round-trip, and are not
+        corrected"""
+        calib = CrosstalkCalib().fromDetector(self.exposure.getDetector(),
+                                              coeffVector=np.array(self.crosstalk).transpose())
+        calib.coeffErr = np.full_like(calib.coeffs, 1e-5)
+        calib.coeffNum = np.full_like(calib.coeffs, 100, dtype=int)
+        calib.coeffValid = np.ones_like(calib.coeffs, dtype=bool)
+        calib.interChip = {'other': calib.coeffs.copy()}
+
+        pruning = calib.pruneCoeffs(minCoeff=2.5e-4)
+        self.assertEqual(pruning.numDropped, 2*4)
+        self.assertEqual(pruning.numRetained, 2*8)
+        self.assertFloatsAlmostEqual(pruning.maxErrorBound, 3e-4)
+        terms = calib.getSparseCoeffs(calib.coeffs, calib.coeffRetained)
+        self.assertEqual([source for source, _ in terms[0]], [3])
+        self.assertEqual([source for source, _ in terms[1]], [0])
+
+        for newCalib in (CrosstalkCalib.fromDict(calib.toDict()), CrosstalkCalib.fromTable(calib.toTable())):
+            np.testing.assert_array_equal(newCalib.coeffRetained, calib.coeffRetained)
+            np.testing.assert_array_equal(newCalib.interChipRetained['other'],
+                                          calib.interChipRetained['other'])
+
+        # Correcting only the retained terms matches zeroing the others.
+        expected = self.exposure.clone()
+        calib.subtractCrosstalk(self.exposure, crosstalkCoeffs=calib.coeffs,
+                                minPixelToMask=self.value - 1, crosstalkStr=self.crosstalkStr,
+                                coeffRetained=calib.coeffRetained)
+        calib.subtractCrosstalk(expected, crosstalkCoeffs=np.where(calib.coeffRetained, calib.coeffs, 0.0),
+                                minPixelToMask=self.value - 1, crosstalkStr=self.crosstalkStr)
+        self.assertMaskedImagesEqual(self.exposure.getMaskedImage(), expected.getMaskedImage())
+
+    def testFocalPlaneCrosstalk(self):
+        """Test that the focal plane correction stacks each source once
+        and matches the matrix correction"""
+        coeffs = np.array(self.crosstalk).transpose()
+        calib = CrosstalkCalib().fromDetector(self.exposure.getDetector(), coeffVector=coeffs)
+        # The detector is its own inter-detector source here, so the
+        # correction is that of doubled coefficients.
+        calib.interChip = {self.exposure.getDetector().getName(): coeffs}
+        config = CrosstalkConfig()
+        config.minPixelToMask = self.value - 1
+        config.crosstalkMaskPlane = self.crosstalkStr
+        focalPlane = FocalPlaneCrosstalk(config=config)
+        self.exposure.getInfo().setVisitInfo(lsst.afw.image.VisitInfo(exposureId=1))
+        uncorrected = self.exposure.clone()
+
+        expected = self.exposure.clone()
+        calib.subtractCrosstalk(expected, crosstalkCoeffs=2*coeffs, minPixelToMask=self.value - 1,
+                                crosstalkStr=self.crosstalkStr, useMatrix=True)
+        for exposure in (self.exposure, self.exposure.clone()):
+            focalPlane.run(exposure, calib, crosstalkSources=[exposure])
+            self.assertImagesAlmostEqual(exposure.getImage(), expected.getImage(), atol=1e-3, rtol=1e-6)
+            self.assertMasksEqual(exposure.getMask(), expected.getMask())
+        self.assertEqual(focalPlane.numExtracted, 1)
+
+        # The sources of another exposure are not reused.
+        exposure = self.exposure.clone()
+        exposure.getInfo().setVisitInfo(lsst.afw.image.VisitInfo(exposureId=12345))
+        focalPlane.run(exposure, calib, crosstalkSources=[exposure])
+        self.assertEqual(focalPlane.numExtracted, 2)
+
+        # The sources of an exposure without an id are not cached.
+        for _ in range(2):
+            exposure = uncorrected.clone()
+            exposure.getInfo().setVisitInfo(lsst.afw.image.VisitInfo())
+            focalPlane.run(exposure, calib, crosstalkSources=[exposure])
+            self.assertImagesAlmostEqual(exposure.getImage(), expected.getImage(), atol=1e-3, rtol=1e-6)
+        self.assertEqual(focalPlane.numExtracted, 6)
+
+        # A source that cannot be cached must be listed.
+        config.sourceCacheSize = 0
+        focalPlane = FocalPlaneCrosstalk(config=config)
+        with self.assertRaises(RuntimeError):
+            focalPlane.run(self.exposure.clone(), calib)
+
     def testTaskAPI(self):
         """Test that the Tasks work
 
@@ -215,6 +340,31 @@ class CrosstalkTestCase(lsst.utils.tests.TestCase):
         isr.crosstalk.run(self.exposure, crosstalk=calib)
         self.checkSubtracted(self.exposure)
 
+    def testInterChipSources(self):
+        """Test that deferred sources are indexed by their detector
+        component and loaded only when applied"""
+        exposure = self.exposure.clone()
+
+        class SourceHandle:
+            def __init__(self):
+                self.reads = []
+
+            def get(self, component=None):
+                self.reads.append(component)
+                return exposure.getDetector() if component == "detector" else exposure
+
+        coeffs = np.array(self.crosstalk).transpose()
+        calib = CrosstalkCalib().fromDetector(self.exposure.getDetector(), coeffVector=coeffs)
+        calib.interChip = {'other': coeffs, self.exposure.getDetector().getName(): coeffs}
+        task = CrosstalkTask()
+        expected = self.exposure.clone()
+        handle = SourceHandle()
+        task.run(self.exposure, crosstalk=calib, crosstalkSources=[handle])
+        self.assertEqual(handle.reads, ["detector", None])
+
+        task.run(expected, crosstalk=calib, crosstalkSources=[exposure])
+        self.assertMaskedImagesEqual(self.exposure.getMaskedImage(), expected.getMaskedImage())
+
     def test_prepCrosstalk(self):
         """Test that prep crosstalk does not error when given a dataRef with no
         crosstalkSources to find.
@@ -0,0 +1,115 @@
+# This file is part of ip_isr.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from concurrent.futures import ThreadPoolExecutor
+
+import lsst.utils.tests
+from lsst.ip.isr.isrBenchmark import (IsrBenchmarkConfig, compareBenchmarks, main, makeBenchmarkData,
+                                      measureBrighterFatterMemory, runBenchmarks)
+
+
+class IsrBenchmarkTestCase(lsst.utils.tests.TestCase):
+    """Test the ISR benchmark suite on a small detector."""
+
+    def setUp(self):
+        self.config = IsrBenchmarkConfig()
+        self.config.nAmpX = 2
+        self.config.nAmpY = 1
+        self.config.ampWidth = 60
+        self.config.ampHeight = 50
+        self.config.numBadColumns = 2
+        self.config.numHotPixels = 10
+        self.config.numDefectBlobs = 1
+        self.config.repeat = 1
+
+    def test_runBenchmarks(self):
+        """Expect every benchmark to report its measurements."""
+        memory = dict(brighterFatterPeak=2, brighterFatterLowMemoryPeak=1, brighterFatterSaved=1)
+        with unittest.mock.patch("lsst.ip.isr.isrBenchmark.measureBrighterFatterMemory",
+                                 return_value=memory):
+            results = runBenchmarks(self.config)
+        self.assertEqual(results["metadata"]["nAmp"], 2)
+        benchmarks = results["benchmarks"]
+        for name in ("IsrTask.run", "IsrTask.run:CONVERT", "isrFunctions.overscanCorrection",
+                     "IsrTask.lowMemoryBrighterFatterCorrection"):
+            self.assertIn(name, benchmarks)
+        for record in benchmarks.values():
+            self.assertGreaterEqual(record["wallTime"], 0.0)
+            self.assertGreaterEqual(record["cpuTime"], 0.0)
+            self.assertNotIn("maxRssDelta", record)
+        self.assertEqual(results["memory"], memory)
+
+    def test_brighterFatterMemory(self):
+        """Expect the memory use of both brighter fatter corrections to be
+        reported.
+
+        The saving itself depends on the allocator and operating system,
+        so it is reported by the benchmark script rather than tested here.
+        The corrections are run in threads instead of new processes.
+        """
+        def executor(max_workers, mp_context):
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        with unittest.mock.patch("lsst.ip.isr.isrBenchmark.ProcessPoolExecutor", executor):
+            memory = measureBrighterFatterMemory(self.config, makeBenchmarkData(self.config))
+        self.assertEqual(set(memory), {"brighterFatterPeak", "brighterFatterLowMemoryPeak",
+                                       "brighterFatterSaved"})
+        for value in memory.values():
+            self.assertIsInstance(value, int)
+        self.assertEqual(memory["brighterFatterSaved"],
+                         memory["brighterFatterPeak"] - memory["brighterFatterLowMemoryPeak"])
+
+    def test_compareBenchmarks(self):
+        """Expect only slowdowns beyond the threshold to be reported."""
+        baseline = dict(benchmarks={"a": dict(wallTime=1.0), "b": dict(wallTime=1.0),
+                                    "c": dict(wallTime=0.001), "d": dict(wallTime=1.0)})
+        results = dict(benchmarks={"a": dict(wallTime=1.05), "b": dict(wallTime=1.5),
+                                   "c": dict(wallTime=0.01), "e": dict(wallTime=1.0)})
+        self.assertEqual(compareBenchmarks(results, baseline, threshold=0.1), [("b", 1.0, 1.5, 0.5)])
+        self.assertEqual(len(compareBenchmarks(results, baseline, threshold=0.01)), 2)
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            resultsFile = os.path.join(tempDir, "results.json")
+            baselineFile = os.path.join(tempDir, "baseline.json")
+            for filename, data in ((resultsFile, results), (baselineFile, baseline)):
+                with open(filename, "w") as outFile:
+                    json.dump(data, outFile)
+            self.assertEqual(main(["compare", resultsFile, baselineFile]), 1)
+            self.assertEqual(main(["compare", resultsFile, baselineFile, "--threshold", "1.0"]), 0)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -238,6 +238,28 @@ class IsrFunctionsCases(lsst.utils.tests.TestCase):
         with self.assertRaises(RuntimeError):
             ipIsr.flatCorrection(self.mi, flatMi, "UNKNOWN", userScale=1.0, trimToFit=True)
 
+    def test_detrendCorrection(self):
+        """Expect the fused correction to match the individual corrections.
+        Expect RuntimeError if sizes are different.
+        """
+        biasMi = isrMock.BiasMock().run().getMaskedImage()
+        darkMi = isrMock.DarkMock().run().getMaskedImage()
+        flatMi = isrMock.FlatMock().run().getMaskedImage()
+
+        mi = self.mi.clone()
+        ipIsr.biasCorrection(mi, biasMi)
+        ipIsr.updateVariance(mi, 2.0, 5.0)
+        ipIsr.darkCorrection(mi, darkMi, 2.0, 1.0)
+        ipIsr.flatCorrection(mi, flatMi, 'USER', userScale=1.5)
+
+        ipIsr.detrendCorrection(self.mi, biasMi, darkMi, flatMi, expScale=2.0, darkScale=1.0,
+                                flatScale=1.5, gain=2.0, readNoise=5.0, rowsPerChunk=7)
+        self.assertMaskedImagesAlmostEqual(self.mi, mi, rtol=1e-5)
+
+        flatMi = flatMi[1:-1, 1:-1, afwImage.LOCAL]
+        with self.assertRaises(RuntimeError):
+            ipIsr.detrendCorrection(self.mi, flatMaskedImage=flatMi)
+
     def test_illumCorrection(self):
         """Expect larger median value after.
         Expect RuntimeError if sizes are different.
@@ -20,6 +20,7 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 
+import tracemalloc
 import unittest
 
 import lsst.afw.geom as afwGeom
@@ -28,6 +29,7 @@ import lsst.ip.isr.straylight as straylight
 import lsst.ip.isr.vignette as vignette
 import lsst.ip.isr.masking as masking
 import lsst.ip.isr.linearize as linearize
+from lsst.ip.isr.stageTimer import measureStage
 
 import lsst.ip.isr.isrMock as isrMock
 
@@ -84,6 +86,26 @@ class IsrMiscCases(lsst.utils.tests.TestCase):
         # DM-19707: ip_isr functionality not fully tested by unit tests
         self.assertIsNone(result)
 
+    def test_measureStage(self):
+        """Assert that measuring a stage keeps the tracemalloc peak of the
+        caller.
+        """
+        tracemalloc.start()
+        try:
+            data = bytearray(2**20)
+            del data
+            peak = tracemalloc.get_traced_memory()[1]
+            with measureStage("SMALL") as record:
+                data = bytearray(2**10)
+            self.assertEqual(tracemalloc.get_traced_memory()[1], peak)
+            self.assertEqual(record["peakAlloc"], 0)
+            with measureStage("LARGE") as record:
+                data = bytearray(2**21)
+            self.assertGreater(record["peakAlloc"], 0)
+            del data
+        finally:
+            tracemalloc.stop()
+
     def test_linearize(self):
         """Assert that the linearize task does not error when a linearity is requested.
         """
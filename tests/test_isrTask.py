@@ -20,12 +20,17 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 
+import json
 import unittest
 import numpy as np
 
+import lsst.geom
 import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+from lsst.afw.cameraGeom import ReadoutCorner
 import lsst.ip.isr.isrMock as isrMock
 import lsst.utils.tests
+from lsst.ip.isr.ampPlan import getDetectorPlan
 from lsst.ip.isr.isrTask import (IsrTask, IsrTaskConfig)
 from lsst.ip.isr.isrQa import IsrQaConfig
 from lsst.pipe.base import Struct
@@ -320,6 +325,31 @@ class IsrTaskUnTrimmedTestCases(lsst.utils.tests.TestCase):
         self.assertIsInstance(results.exposure, afwImage.Exposure)
         return results
 
+    def test_lazyConvertIntToFloat(self):
+        """Expect the lazy conversion, deferred to the amplifier processing,
+        to give the same pixels as converting the whole exposure.
+        """
+        rawExp = afwImage.ExposureI(self.inputExp.getBBox())
+        rawExp.image.array[:] = np.round(self.inputExp.image.array)
+        rawExp.setDetector(self.inputExp.getDetector())
+        plans = list(getDetectorPlan(rawExp.getDetector(), self.config))
+
+        expected = self.task.convertIntToFloat(rawExp)
+        self.task.processAmplifiers(expected, plans, None)
+
+        config = IsrTaskConfig()
+        config.doLazyConvertIntToFloat = True
+        task = IsrTask(config=config)
+        self.assertTrue(task.canDeferConversion(rawExp, plans))
+        self.assertFalse(task.canDeferConversion(rawExp, plans[1:]))
+        result = task.convertIntToFloat(rawExp, deferImage=True)
+        task.processAmplifiers(result, plans, None, rawExposure=rawExp)
+
+        self.assertImagesEqual(result.image, expected.image)
+        self.assertMasksEqual(result.mask, expected.mask)
+        self.assertEqual(np.count_nonzero(result.variance.array), 0)
+        self.assertEqual(result.getDetector().getName(), rawExp.getDetector().getName())
+
     def test_overscanCorrection(self):
         """Expect that this should reduce the image variance with a full fit.
         The default fitType of MEDIAN will reduce the median value.
@@ -357,6 +387,36 @@ class IsrTaskUnTrimmedTestCases(lsst.utils.tests.TestCase):
         statAfter = computeImageMedianAndStd(self.inputExp.image[self.amp.getRawDataBBox()])
         self.assertLess(statAfter[0], statBefore[0])
 
+    def test_overscanStatistics(self):
+        """Expect the overscan statistics to be measured once and shared by
+        the metadata and the empirical read noise.
+        """
+        self.config.overscan.fitType = 'POLY'
+        self.config.doEmpiricalReadNoise = True
+        oscanResults = self.task.overscanCorrection(self.inputExp, self.amp)
+        statistics = oscanResults.statistics
+
+        fitStats = afwMath.makeStatistics(oscanResults.overscanFit, afwMath.MEDIAN | afwMath.STDEVCLIP,
+                                          self.task.getOverscanStatControl())
+        metadata = self.inputExp.getMetadata()
+        self.assertEqual(metadata.get(f"ISR_OSCAN_LEVEL{self.amp.getName()}"),
+                         fitStats.getValue(afwMath.MEDIAN))
+        self.assertEqual(metadata.get(f"ISR_OSCAN_SIGMA{self.amp.getName()}"),
+                         fitStats.getValue(afwMath.STDEVCLIP))
+
+        gain, readNoise = self.task.getVarianceParameters(self.amp, overscanResults=oscanResults)
+        self.assertEqual(readNoise, self.task.getVarianceParameters(
+            self.amp, overscanImage=oscanResults.overscanImage)[1])
+        self.task.getVarianceParameters(self.amp, overscanResults=oscanResults)
+        self.assertEqual(len(statistics._cache), 2)
+
+        # Results are only shared between identical statistics controls.
+        residualStats = statistics.getResidualStatistics(afwMath.StatisticsControl())
+        expected = afwMath.makeStatistics(oscanResults.overscanImage, afwMath.MEDIAN | afwMath.STDEVCLIP)
+        self.assertEqual(residualStats.median, expected.getValue(afwMath.MEDIAN))
+        self.assertEqual(residualStats.stdev, expected.getValue(afwMath.STDEVCLIP))
+        self.assertEqual(len(statistics._cache), 3)
+
     def test_runDataRef(self):
         """Expect a dataRef to be handled correctly.
         """
@@ -368,6 +428,25 @@ class IsrTaskUnTrimmedTestCases(lsst.utils.tests.TestCase):
         self.assertIsInstance(results, Struct)
         self.assertIsInstance(results.exposure, afwImage.Exposure)
 
+    def test_runDataRefs(self):
+        """Expect each dataRef of a sequence to be processed in order with
+        reads and writes overlapping the processing.
+        """
+        self.config.doLinearize = False
+        self.config.doWrite = False
+        self.config.prefetchDepth = 2
+        self.task = IsrTask(config=self.config)
+
+        dataRefs = [isrMock.DataRefMock(config=self.mockConfig) for _ in range(4)]
+        results = list(self.task.runDataRefs(dataRefs))
+        expected = self.task.runDataRef(isrMock.DataRefMock(config=self.mockConfig))
+
+        self.assertEqual(len(results), len(dataRefs))
+        for result in results:
+            self.assertIsInstance(result.exposure, afwImage.Exposure)
+            self.assertMaskedImagesEqual(result.exposure.getMaskedImage(),
+                                         expected.exposure.getMaskedImage())
+
     def test_run_allTrue(self):
         """Expect successful run with expected outputs when all non-exclusive
         configuration options are on.
@@ -390,6 +469,175 @@ class IsrTaskUnTrimmedTestCases(lsst.utils.tests.TestCase):
         self.batchSetConfiguration(False)
         self.validateIsrResults()
 
+    def test_run_ampWorkers(self):
+        """Expect identical results and metadata when the amplifiers are
+        processed in parallel.
+        """
+        self.batchSetConfiguration(True)
+        serialResults = self.validateIsrResults()
+
+        self.inputExp = isrMock.RawMock(config=self.mockConfig).run()
+        self.config.numAmpWorkers = 4
+        parallelResults = self.validateIsrResults()
+
+        self.assertMaskedImagesEqual(serialResults.exposure.getMaskedImage(),
+                                     parallelResults.exposure.getMaskedImage())
+        self.assertEqual(serialResults.exposure.getMetadata().getOrderedNames(),
+                         parallelResults.exposure.getMetadata().getOrderedNames())
+
+    def test_detectorPlan(self):
+        """Expect the amplifier plans to reproduce the amplifier geometry,
+        to be reused, and to reject inconsistent overscan configurations.
+        """
+        detector = self.inputExp.getDetector()
+        self.config.overscanNumLeadingColumnsToSkip = 2
+        plan = getDetectorPlan(detector, self.config)
+        self.assertIs(getDetectorPlan(detector, self.config), plan)
+        self.assertIs(getDetectorPlan(detector.rebuild().finish(), self.config), plan)
+        self.assertEqual(len(plan), len(detector))
+
+        for amp in detector:
+            ampPlan = plan[amp.getName()]
+            self.assertEqual(ampPlan.bbox, amp.getBBox())
+            self.assertEqual(ampPlan.rawDataBBox, amp.getRawDataBBox())
+            self.assertEqual(ampPlan.imageBBoxes, [amp.getRawDataBBox()])
+            self.assertEqual(ampPlan.overscanBBoxes[0].getWidth(),
+                             amp.getRawHorizontalOverscanBBox().getWidth() - 2)
+
+            xy0 = self.inputExp.getXY0()
+            slices = ampPlan.getArraySlices("rawDataBBox", xy0)
+            rawData = self.inputExp.getImage()[amp.getRawDataBBox()]
+            np.testing.assert_array_equal(self.inputExp.getImage().getArray()[slices], rawData.getArray())
+
+        # Changing the amplifier readout, with the same boxes, gives a new
+        # plan.
+        detBuilder = detector.rebuild()
+        for ampBuilder in detBuilder.getAmplifiers():
+            ampBuilder.setReadoutCorner(ReadoutCorner.UR if ampBuilder.getReadoutCorner() == ReadoutCorner.LL
+                                        else ReadoutCorner.LL)
+        self.assertIsNot(getDetectorPlan(detBuilder.finish(), self.config), plan)
+
+        # A bias jump outside the amplifiers is only an error for devices
+        # with a bias jump.
+        self.config.overscanBiasJump = True
+        self.config.overscanBiasJumpLocation = 100000
+        self.config.overscanBiasJumpKeyword = "DEVICE"
+        self.config.overscanBiasJumpDevices = ["JUMPY"]
+        task = IsrTask(config=self.config)
+        ampPlan = getDetectorPlan(detector, self.config)[self.amp.getName()]
+        self.assertIsNotNone(ampPlan.jumpError)
+        task.prepareOverscanRegions(self.inputExp, ampPlan)
+        self.inputExp.getMetadata().set("DEVICE", "JUMPY")
+        with self.assertRaises(RuntimeError):
+            task.prepareOverscanRegions(self.inputExp, ampPlan)
+        self.config.overscanBiasJump = False
+
+        self.config.overscanNumTrailingColumnsToSkip = self.amp.getRawHorizontalOverscanBBox().getWidth()
+        with self.assertRaises(RuntimeError):
+            getDetectorPlan(detector, self.config)
+
+    def test_runBatch(self):
+        """Expect the batch interface to give the same results as `run`
+        for each exposure, serially and in a process pool.
+        """
+        self.batchSetConfiguration(True)
+        expected = self.validateIsrResults()
+
+        calibs = dict(camera=self.camera,
+                      bias=self.dataRef.get("bias"),
+                      dark=self.dataRef.get("dark"),
+                      flat=self.dataRef.get("flat"),
+                      bfKernel=self.dataRef.get("bfKernel"),
+                      defects=self.dataRef.get("defects"),
+                      fringes=Struct(fringes=self.dataRef.get("fringe"), seed=1234),
+                      opticsTransmission=self.dataRef.get("transmission_"),
+                      filterTransmission=self.dataRef.get("transmission_"),
+                      sensorTransmission=self.dataRef.get("transmission_"),
+                      atmosphereTransmission=self.dataRef.get("transmission_"))
+        for numProcesses in (1, 2):
+            with self.subTest(numProcesses=numProcesses):
+                exposures = (isrMock.RawMock(config=self.mockConfig).run() for _ in range(3))
+                results = dict(self.task.runBatch(exposures, numProcesses=numProcesses, **calibs))
+                self.assertEqual(sorted(results), [0, 1, 2])
+                for result in results.values():
+                    self.assertMaskedImagesEqual(result.exposure.getMaskedImage(),
+                                                 expected.exposure.getMaskedImage())
+
+    def test_run_brighterFatterLowMemory(self):
+        """Expect the low memory brighter fatter correction to give the
+        same image as the default correction.
+        """
+        self.batchSetConfiguration(True)
+        defaultResults = self.validateIsrResults()
+
+        self.inputExp = isrMock.RawMock(config=self.mockConfig).run()
+        self.config.brighterFatterLowMemory = True
+        lowMemoryResults = self.validateIsrResults()
+
+        self.assertImagesEqual(defaultResults.exposure.getImage(),
+                               lowMemoryResults.exposure.getImage())
+        self.assertImagesEqual(defaultResults.exposure.getMask(),
+                               lowMemoryResults.exposure.getMask())
+
+    def test_run_fusedDetrend(self):
+        """Expect the fused detrend, with the variance, to match the
+        separate corrections.
+        """
+        self.batchSetConfiguration(False)
+        self.config.doApplyGains = False
+        for name in ("doConvertIntToFloat", "doOverscan", "doBias", "doVariance", "doDark", "doFlat",
+                     "doNanMasking"):
+            setattr(self.config, name, True)
+        expected = self.validateIsrResults()
+        self.assertTrue(self.task.canFuseDetrend(self.inputExp.getDetector(), exposure=expected.exposure))
+
+        self.inputExp = isrMock.RawMock(config=self.mockConfig).run()
+        self.config.doFusedDetrend = True
+        results = self.validateIsrResults()
+        self.assertMaskedImagesAlmostEqual(results.exposure.getMaskedImage(),
+                                           expected.exposure.getMaskedImage(), rtol=1e-5)
+        self.assertEqual(self.task.metadata.getScalar("NUMNANS"), 0)
+
+        ampBBox = self.amp.getBBox()
+        partial = expected.exposure[lsst.geom.Box2I(ampBBox.getMin(), ampBBox.getDimensions()
+                                                    - lsst.geom.Extent2I(1, 1))]
+        partial.setDetector(self.inputExp.getDetector())
+        self.assertFalse(self.task.canFuseDetrend(self.inputExp.getDetector(), exposure=partial))
+
+        self.config.qa.saveStats = True
+        self.assertFalse(self.task.canFuseDetrend(self.inputExp.getDetector(), exposure=expected.exposure))
+
+    def test_run_stageTiming(self):
+        """Expect per-stage resource usage in the metadata and JSON output.
+        """
+        self.batchSetConfiguration(True)
+        self.config.doStageTiming = True
+        with lsst.utils.tests.getTempFilePath(".json") as timingFile:
+            self.config.stageTimingFile = timingFile
+            self.validateIsrResults()
+
+            with open(timingFile) as inFile:
+                timing = json.load(inFile)
+
+        stages = [record["stage"] for record in timing["stages"]]
+        ampStages = {f"OVERSCAN {amp.getName()}" for amp in self.inputExp.getDetector()}
+        self.assertIn("BIAS", stages)
+        self.assertIn("FLAT", stages)
+        self.assertIn(f"OVERSCAN {self.amp.getName()}", stages)
+        for stage in stages:
+            for key in ("WALLTIME", "CPUTIME"):
+                self.assertTrue(self.task.metadata.exists(f"ISR STAGE {stage} {key}"))
+            # Memory use is process-wide, so it is not measured for the
+            # amplifiers, which may be processed concurrently.
+            self.assertEqual(self.task.metadata.exists(f"ISR STAGE {stage} MAXRSSDELTA"),
+                             stage not in ampStages)
+
+        self.inputExp = isrMock.RawMock(config=self.mockConfig).run()
+        self.config.doStageTiming = False
+        self.config.stageTimingFile = None
+        self.validateIsrResults()
+        self.assertFalse(self.task.metadata.exists("ISR STAGE BIAS WALLTIME"))
+
     def test_failCases(self):
         """Expect failure with crosstalk enabled.
 
@@ -30,7 +30,7 @@ import lsst.afw.image as afwImage
 import lsst.afw.cameraGeom as cameraGeom
 from lsst.afw.geom.testUtils import BoxGrid
 from lsst.afw.image.testUtils import makeRampImage
-from lsst.ip.isr import Linearizer
+from lsst.ip.isr import Linearizer, LinearizeSquared
 from lsst.log import Log
 
 
@@ -120,6 +120,46 @@ class LinearizeSquaredTestCase(lsst.utils.tests.TestCase):
             expect = np.array((-1 + linCoeff, 0, 1 + linCoeff, 2 + 4*linCoeff), dtype=imArr.dtype)
             self.assertFloatsAlmostEqual(imArr.flatten(), expect)
 
+    def testLinearityPlan(self):
+        """!Test that the linearity plan is reused and matches the functors
+        """
+        inImage = makeRampImage(bbox=self.bbox, start=-5, stop=2500)
+        linSq = Linearizer(detector=self.detector)
+        plan = linSq.getLinearityPlan(self.detector)
+        self.assertIs(linSq.getLinearityPlan(self.detector), plan)
+        self.assertEqual(plan.groups["Squared"].ampNames, linSq.ampNames)
+        self.assertIsInstance(plan.groups["Squared"].linearity, LinearizeSquared)
+
+        measImage = inImage.Factory(inImage, True)
+        linRes = linSq.applyLinearity(measImage, detector=self.detector)
+        self.assertIs(linSq.getLinearityPlan(self.detector), plan)
+
+        refImage = inImage.Factory(inImage, True)
+        refNumLinearized = 0
+        for ampName in linSq.ampNames:
+            success, _ = LinearizeSquared()(refImage.Factory(refImage, linSq.linearityBBox[ampName]),
+                                            coeffs=linSq.linearityCoeffs[ampName], log=None)
+            refNumLinearized += success
+        self.assertEqual(linRes.numLinearized, refNumLinearized)
+        self.assertEqual(linRes.numOutOfRange, 0)
+        self.assertImagesEqual(refImage, measImage)
+
+        linSq.fromDetector(self.detector)
+        self.assertIsNot(linSq.getLinearityPlan(self.detector), plan)
+
+        # Edits of the parameters in place also rebuild the plan.
+        plan = linSq.getLinearityPlan(self.detector)
+        ampName = linSq.ampNames[0]
+        linSq.linearityCoeffs[ampName][0] *= 2.0
+        newPlan = linSq.getLinearityPlan(self.detector)
+        self.assertIsNot(newPlan, plan)
+        self.assertEqual(newPlan.groups["Squared"].params[0], linSq.linearityCoeffs[ampName][0])
+        plan = newPlan
+        linSq.linearityBBox[ampName] = lsst.geom.Box2I(linSq.linearityBBox[ampName])
+        self.assertIsNot(linSq.getLinearityPlan(self.detector), plan)
+        linSq.linearityType[ampName] = "Polynomial"
+        self.assertNotIn(ampName, linSq.getLinearityPlan(self.detector).groups["Squared"].ampNames)
+
     def testPickle(self):
         """!Test that a LinearizeSquared can be pickled and unpickled
         """
@@ -26,6 +26,7 @@ import numpy as np
 import lsst.utils.tests
 import lsst.geom
 import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
 import lsst.ip.isr as ipIsr
 
 
@@ -181,6 +182,210 @@ class IsrTestCases(lsst.utils.tests.TestCase):
         self.checkOverscanCorrectionY(fitType="MEDIAN_PER_ROW")
         self.checkOverscanCorrectionSineWave(fitType="MEDIAN_PER_ROW")
 
+    def test_maskedRowMedian(self):
+        """Expect the vectorized row medians to match afwMath row by row.
+        """
+        rng = np.random.RandomState(12345)
+        data = rng.normal(1000.0, 30.0, (100, 31)).astype(int)
+        mask = rng.uniform(size=data.shape) < 0.3
+        mask[3, :] = True
+        mask[4, 1:] = True
+        mask[5, 2:] = True
+
+        medianType = afwMath.stringToStatisticsProperty("MEDIAN")
+        expected = []
+        for row, rowMask in zip(data, mask):
+            good = row[~rowMask]
+            expected.append(afwMath.makeStatistics(good, medianType).getValue() if len(good) else np.nan)
+
+        medians = ipIsr.OverscanCorrectionTask.maskedRowMedian(data, mask)
+        np.testing.assert_array_equal(medians, np.array(expected))
+        self.assertTrue(np.isnan(medians[3]))
+
+    def test_vectorOverscanKernels(self):
+        """Expect the plain-array kernels to reproduce numpy.percentile and
+        the masked-array collapse.
+        """
+        rng = np.random.RandomState(12345)
+        data = rng.normal(1000.0, 30.0, (50, 13)).astype(np.float32)
+        data[7, 3] = np.nan
+        quartiles = ipIsr.OverscanCorrectionTask.computeQuartiles(data)
+        np.testing.assert_allclose(quartiles, np.percentile(data, [25.0, 50.0, 75.0], axis=1), rtol=1e-6)
+
+        mask = rng.uniform(size=data.shape) < 0.3
+        mask[:3, :] = True
+        mask[-2:, :] = True
+        collapsed, collapsedMask = ipIsr.OverscanCorrectionTask.collapseMaskedArray(data, mask)
+        expected = ipIsr.OverscanCorrectionTask.collapseArray(np.ma.masked_array(data, mask))
+        np.testing.assert_allclose(collapsed, np.ma.getdata(expected), rtol=1e-6)
+        np.testing.assert_array_equal(collapsedMask, np.ma.getmaskarray(expected))
+
+        edgeMask = ipIsr.OverscanCorrectionTask.maskExtrapolatedEdges(collapsedMask)
+        self.assertEqual(edgeMask.sum(), 3 + 2 + 1)
+        self.assertTrue(np.all(edgeMask[:3]))
+        self.assertTrue(np.all(edgeMask[-3:]))
+
+    def test_fitOperator(self):
+        """Expect the cached fit operators to reproduce the numpy
+        polynomial fits and the spline fit of each bin.
+        """
+        rng = np.random.RandomState(12345)
+        num = 100
+        data = rng.normal(1000.0, 5.0, (num, 3))
+        poly = np.polynomial
+        for fitType, fitter, evaler in (('POLY', poly.polynomial.polyfit, poly.polynomial.polyval),
+                                        ('CHEB', poly.chebyshev.chebfit, poly.chebyshev.chebval),
+                                        ('LEG', poly.legendre.legfit, poly.legendre.legval)):
+            operator = ipIsr.getFitOperator(fitType, num, 3)
+            self.assertIs(ipIsr.getFitOperator(fitType, num, 3), operator)
+            expected = evaler(operator.indices, fitter(operator.indices, data, 3))
+            np.testing.assert_allclose(operator.fitPolynomial(data), expected.T, rtol=1e-12)
+
+        config = ipIsr.OverscanCorrectionTask.ConfigClass()
+        config.fitType = 'NATURAL_SPLINE'
+        config.order = 10
+        task = ipIsr.OverscanCorrectionTask(config=config)
+        operator = ipIsr.getFitOperator('NATURAL_SPLINE', num, 10)
+        for mask in (np.zeros(num, dtype=bool), rng.uniform(size=num) < 0.2):
+            interp = task.splineFit(operator.indices, np.ma.masked_array(data[:, 0], mask=mask), 10)
+            np.testing.assert_allclose(operator.fitSpline(data[:, 0], mask),
+                                       task.splineEval(operator.indices, interp), rtol=1e-12)
+
+    def test_computeRowStatistics(self):
+        """Expect the compiled row-statistics kernel to match numpy, with
+        and without threads.
+        """
+        rng = np.random.RandomState(12345)
+        maskedImage = afwImage.MaskedImageF(lsst.geom.Extent2I(64, 3000))
+        maskedImage.image.array[:, :] = rng.normal(1000.0, 5.0, (3000, 64))
+        bad = rng.uniform(size=(3000, 64)) < 0.1
+        bad[10, :] = True
+        maskedImage.mask.array[bad] = maskedImage.mask.getPlaneBitMask("BAD")
+        badMask = maskedImage.mask.getPlaneBitMask("BAD")
+
+        data = np.ma.masked_array(maskedImage.image.array, mask=bad)
+        for nThreads in (1, 4):
+            mean, stdev, count = ipIsr.computeRowStatistics(maskedImage, badMask, nThreads)
+            np.testing.assert_allclose(mean, np.ma.getdata(np.ma.mean(data, axis=1)), rtol=1e-10)
+            np.testing.assert_allclose(stdev, np.ma.getdata(np.ma.std(data, axis=1, ddof=1)), rtol=1e-10)
+            np.testing.assert_array_equal(count, 64 - bad.sum(axis=1))
+            self.assertTrue(np.isnan(mean[10]))
+
+        config = ipIsr.OverscanCorrectionTask.ConfigClass()
+        config.numRowStatisticsThreads = 2
+        task = ipIsr.OverscanCorrectionTask(config=config)
+        collapsed, collapsedMask = task.collapseRows(maskedImage.image.array, bad)
+        expected, expectedMask = task.collapseMaskedArray(maskedImage.image.array, bad)
+        np.testing.assert_allclose(collapsed, expected, rtol=1e-6)
+        np.testing.assert_array_equal(collapsedMask, expectedMask)
+
+    def test_inPlaceSubtraction(self):
+        """Expect the in-place subtraction to match the subtraction of
+        the fit images, and the lazy fits to match those images.
+        """
+        rng = np.random.RandomState(12345)
+        ampBBox = lsst.geom.Box2I(lsst.geom.Point2I(0, 0), lsst.geom.Extent2I(10, 20))
+        overscanBBox = lsst.geom.Box2I(lsst.geom.Point2I(10, 0), lsst.geom.Extent2I(4, 20))
+        maskedImage = afwImage.MaskedImageF(lsst.geom.Extent2I(14, 20))
+        maskedImage.image.array[:] = rng.normal(100.0, 1.0, (20, 14)) + 2.0*np.arange(20)[:, np.newaxis]
+        # Fully masked overscan rows are extrapolated and flagged SUSPECT.
+        maskedImage.mask.array[:2, 10:] = maskedImage.mask.getPlaneBitMask("SAT")
+
+        for fitType in ("POLY", "MEDIAN_PER_ROW"):
+            config = ipIsr.OverscanCorrectionTask.ConfigClass()
+            config.fitType = fitType
+            config.order = 3
+            expectedImage = maskedImage.clone()
+            expected = ipIsr.OverscanCorrectionTask(config=config).run(expectedImage[ampBBox],
+                                                                       expectedImage[overscanBBox])
+
+            config.doInPlaceSubtraction = True
+            image = maskedImage.clone()
+            result = ipIsr.OverscanCorrectionTask(config=config).run(image[ampBBox], image[overscanBBox])
+
+            self.assertMaskedImagesEqual(image, expectedImage)
+            self.assertIsInstance(result.imageFit, ipIsr.OverscanModel)
+            self.assertImagesEqual(result.imageFit.getImage(), expected.imageFit)
+            self.assertImagesEqual(result.overscanFit.getImage(), expected.overscanFit)
+            statControl = afwMath.StatisticsControl()
+            fitStats = result.statistics.getFitStatistics(statControl)
+            expectedStats = expected.statistics.getFitStatistics(statControl)
+            self.assertEqual(fitStats.median, expectedStats.median)
+            self.assertEqual(fitStats.stdev, expectedStats.stdev)
+
+    def test_runDetector(self):
+        """Expect the detector-level overscan correction to match the
+        correction of each amplifier in turn.
+        """
+        rng = np.random.RandomState(12345)
+        ampBBox = lsst.geom.Box2I(lsst.geom.Point2I(0, 0), lsst.geom.Extent2I(10, 20))
+        overscanBBox = lsst.geom.Box2I(lsst.geom.Point2I(10, 0), lsst.geom.Extent2I(4, 20))
+        for fitType in ("POLY", "MEDIAN_PER_ROW", "NATURAL_SPLINE", "MEDIAN"):
+            config = ipIsr.OverscanCorrectionTask.ConfigClass()
+            config.fitType = fitType
+            config.order = 3 if fitType == "POLY" else 5
+            task = ipIsr.OverscanCorrectionTask(config=config)
+
+            expected = []
+            images = []
+            for slope in (1.0, 2.0, -3.0):
+                maskedImage = afwImage.MaskedImageF(lsst.geom.Box2I(lsst.geom.Point2I(0, 0),
+                                                                    lsst.geom.Extent2I(14, 20)))
+                maskedImage.image.array[:] = (rng.normal(100.0, 1.0, (20, 14)).round()
+                                              + slope*np.arange(20)[:, np.newaxis])
+                clone = maskedImage.clone()
+                expected.append(task.run(clone[ampBBox].image, clone[overscanBBox]))
+                expected[-1].image = clone.image
+                images.append(maskedImage)
+
+            results = task.runDetector([image[ampBBox].image for image in images],
+                                       [image[overscanBBox] for image in images])
+            self.assertEqual(len(results), len(images))
+            for image, result, expect in zip(images, results, expected):
+                self.assertImagesAlmostEqual(image.image, expect.image, rtol=1e-6)
+                self.assertEqual(type(result.imageFit), type(expect.imageFit))
+
+    def test_streamingOverscanCorrection(self):
+        """Expect row-block streaming to reproduce the whole-amplifier
+        MEDIAN_PER_ROW correction, and finalize to report the differences
+        of the windowed polynomial fit.
+        """
+        ampBBox = lsst.geom.Box2I(lsst.geom.Point2I(0, 0), lsst.geom.Extent2I(10, 50))
+        overscanBBox = lsst.geom.Box2I(lsst.geom.Point2I(10, 0), lsst.geom.Extent2I(4, 50))
+        maskedImage = afwImage.MaskedImageF(lsst.geom.Box2I(lsst.geom.Point2I(0, 0),
+                                                            lsst.geom.Extent2I(14, 50)))
+        maskedImage.image.array[:] = 100.0 + 2.0*np.arange(50)[:, np.newaxis]
+
+        for fitType in ("MEDIAN_PER_ROW", "POLY"):
+            config = ipIsr.OverscanCorrectionTask.ConfigClass()
+            config.fitType = fitType
+            config.streamWindowRows = 20
+            task = ipIsr.OverscanCorrectionTask(config=config)
+
+            streamed = maskedImage.clone()
+            stream = task.makeStream()
+            for y0 in range(0, 50, 8):
+                height = min(8, 50 - y0)
+                ampRows = lsst.geom.Box2I(lsst.geom.Point2I(0, y0), lsst.geom.Extent2I(10, height))
+                overscanRows = lsst.geom.Box2I(lsst.geom.Point2I(10, y0), lsst.geom.Extent2I(4, height))
+                result = stream.addRows(streamed[ampRows], streamed[overscanRows])
+                self.assertEqual(len(result.overscanValue), height)
+            self.assertEqual(stream.numRows, 50)
+            final = stream.finalize()
+
+            expected = maskedImage.clone()
+            task.run(expected[ampBBox], expected[overscanBBox])
+            if fitType == "MEDIAN_PER_ROW":
+                self.assertEqual(final.maxDifference, 0.0)
+                self.assertImagesEqual(streamed.image, expected.image)
+            else:
+                self.assertLess(final.maxDifference, 1e-3)
+                self.assertImagesAlmostEqual(streamed.image, expected.image, atol=1e-3)
+
+        config.fitType = "MEDIAN"
+        with self.assertRaises(RuntimeError):
+            ipIsr.OverscanCorrectionTask(config=config).makeStream()
+
     def test_MedianOverscanCorrection(self):
         self.checkOverscanCorrectionY(fitType="MEDIAN")
         self.checkOverscanCorrectionX(fitType="MEDIAN")